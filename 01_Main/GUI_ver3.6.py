@@ -3,11 +3,16 @@ import numpy as np
 import matplotlib.pyplot as plt
 from PyQt5.QtWidgets import QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPlainTextEdit, QPushButton, QFileDialog, QSizePolicy, QToolBar, QListWidget, QMessageBox
 from PyQt5 import QtGui
-from PyQt5.QtGui import QPixmap
+from PyQt5.QtCore import QTimer, QEvent
 import json
-import os
 import pandas as pd
-import re
+import tas_store
+import delta_abs
+import plot_pixmap
+import channel_model
+
+# 入力が止まってからグラフを更新するまでの待ち時間 (ms)
+REFRESH_DELAY_MS = 150
 
 class DataGraphApp(QMainWindow):
     def __init__(self):
@@ -20,9 +25,12 @@ class DataGraphApp(QMainWindow):
         self.setWindowTitle("TAS_Grapher_ver3.6")
         # ウィンドウサイズをコンパクトにした
         self.resize(400, 500)
-        # パルスを保存する辞書
-        self.pulse_data = {}
-        self.original_data = {}  # 元のデータを保存する辞書
+        # パルスを保存する辞書 (ファイルから読んだものは参照時に読み込む)
+        self.pulse_data = tas_store.DatasetStore()
+        # 表示中のデータセットは配列で持ち、テキストボックスは表示用にする
+        self.channels = channel_model.ChannelModel()
+        self.lazy_labels = set()  # テキストをまだ表示していないラベル
+        self.delta_abs_cache = delta_abs.DeltaAbsCache(self.pulse_data)  # パルスごとのΔAbs
 
         # メインウィジェットとレイアウト
         main_widget = QWidget()
@@ -110,6 +118,7 @@ class DataGraphApp(QMainWindow):
         dark_layout = QVBoxLayout()
         self.text_boxes = {}        
         self.graph_widgets = {}
+        self.thumbnails = {}  # ラベルごとの使い回しのグラフ
         self.text_boxes['DARK_ref'], self.graph_widgets['DARK_ref'] = self.create_text_box_with_graph('DARK_ref', dark_layout)
         self.text_boxes['DARK_sig'], self.graph_widgets['DARK_sig'] = self.create_text_box_with_graph('DARK_sig', dark_layout)
 
@@ -131,9 +140,17 @@ class DataGraphApp(QMainWindow):
         self.abs_graph_widget.setFixedSize(500, 100)
         main_layout.addWidget(self.abs_graph_widget)
 
-        # テキストボックスの内容が変更されたときにグラフを更新する
-        for text_box in self.text_boxes.values():
-            text_box.textChanged.connect(self.update_graphs)
+        # テキストボックスの内容が変更されたときに、そのボックスのグラフだけを更新する
+        # 連続した変更は REFRESH_DELAY_MS 待ってからまとめて1回だけ処理する
+        self.refresh_timers = {}
+        for label, text_box in self.text_boxes.items():
+            timer = QTimer(self)
+            timer.setSingleShot(True)
+            timer.setInterval(REFRESH_DELAY_MS)
+            timer.timeout.connect(lambda label=label: self.update_channel(label))
+            text_box.textChanged.connect(timer.start)
+            text_box.installEventFilter(self)  # クリックされたらテキストを表示する
+            self.refresh_timers[label] = timer
     #def display_message(self, message):
         #self.message_display.appendPlainText(message)
 
@@ -148,6 +165,7 @@ class DataGraphApp(QMainWindow):
                 pulse_name = item.text()
                 if pulse_name in self.pulse_data:
                     del self.pulse_data[pulse_name]  # データ辞書から削除
+                    self.delta_abs_cache.invalidate(pulse_name)
                     self.pulse_list.takeItem(self.pulse_list.row(item))  # リストウィジェットから削除
 
             QMessageBox.information(self, "Success", "選択したリストが削除されました。")            
@@ -168,25 +186,62 @@ class DataGraphApp(QMainWindow):
         graph_widget = QLabel()
         graph_widget.setFixedSize(90, 100)
         h_layout.addWidget(graph_widget)
+        self.thumbnails[label] = plot_pixmap.Thumbnail(90, 100)
 
         layout.addLayout(h_layout)
         return text_box, graph_widget
 
     def update_graphs(self):
+        for label in self.text_boxes:
+            self.update_channel(label)
+
+    def update_channel(self, label):
+        text_box = self.text_boxes[label]
+        data = text_box.toPlainText()
+        # テキストを表示していないボックスは配列が正なので、空のテキストで上書きしない
+        if label not in self.lazy_labels or data:
+            self.lazy_labels.discard(label)
+            self.channels.set_text(label, data)  # 同じ内容なら再解析しない
+        self.update_graph(self.graph_widgets[label], *self.channels.xy(label), label)  # グラフを更新
+        self.update_modified_style(label)
+
+    def update_modified_style(self, label):
+        # 変更の有無は配列のハッシュで判定する
+        if self.channels.is_modified(label):  # 内容が変更された場合
+            self.text_boxes[label].setStyleSheet("color: red;")  # 変更されたことを示す色
+        else:
+            self.text_boxes[label].setStyleSheet("color: black;")  # 元の内容に戻った場合は黒に戻す
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.FocusIn:
+            for label, text_box in self.text_boxes.items():
+                if obj is text_box and label in self.lazy_labels:
+                    self.render_text(label)
+        return super().eventFilter(obj, event)
+
+    def render_text(self, label):
+        """配列をテキストにしてボックスに表示します。"""
+        text_box = self.text_boxes[label]
+        text_box.blockSignals(True)
+        text_box.setPlainText(self.channels.text(label))
+        text_box.blockSignals(False)
+        self.lazy_labels.discard(label)
+
+    def show_dataset(self, dataset, as_original=True):
+        """データセットを表示中にします。テキストはボックスがクリックされたときに作ります。"""
+        self.channels.load(dataset, as_original)
         for label, text_box in self.text_boxes.items():
-            data = text_box.toPlainText()
-            self.update_graph(self.graph_widgets[label], data)  # グラフを更新  
-    
-            if data != self.original_data.get(label, ""):  # 内容が変更された場合
-                text_box.setStyleSheet("color: red;")  # 変更されたことを示す色
-            else:
-                text_box.setStyleSheet("color: black;")  # 元の内容に戻った場合は黒に戻す
-
-    def update_graph(self, graph_widget, data):
-        plt.clf()
-        if data.strip():
-            x_values, y_values = self.parse_data(data)
-
+            self.refresh_timers[label].stop()
+            text_box.blockSignals(True)
+            text_box.clear()
+            text_box.setPlaceholderText(f"{self.channels.points(label)} 点 (クリックで表示)")
+            text_box.blockSignals(False)
+            self.lazy_labels.add(label)
+            self.update_graph(self.graph_widgets[label], *self.channels.xy(label), label)
+            self.update_modified_style(label)
+
+    def update_graph(self, graph_widget, x_values, y_values, label=None):
+        if len(x_values):
             if len(x_values) != len(y_values):
                 msg = QMessageBox()
                 msg.setIcon(QMessageBox.Warning)
@@ -196,52 +251,35 @@ class DataGraphApp(QMainWindow):
                 msg.exec_()
                 return
 
-            plt.figure(figsize=(1.5, 1))
-            plt.plot(x_values, y_values, color='k', alpha=0.7, linestyle='-', linewidth=1)
-            plt.grid()
-            plt.axis('off')
-            plt.xlim(350, 800 if x_values else 1)
-            plt.ylim(min(y_values), max(y_values) if y_values else 1)
-
-            temp_file_path = 'temp.png'
-            plt.savefig(temp_file_path, bbox_inches='tight', pad_inches=0)
-            plt.close()
-
-            graph_widget.setPixmap(QPixmap(temp_file_path))
-            os.remove(temp_file_path)
-
-    def parse_data(self, data):
-        x_values, y_values = [], []
-        for line in data.splitlines():
-            line = line.strip()
-            if not line:
-                continue
-
-            # 数値らしきものをすべて抽出する
-            nums = re.findall(r"[-+]?\d*\.\d+|[-+]?\d+", line)
-            if len(nums) >= 2:
-                try:
-                    x_values.append(float(nums[0]))
-                    y_values.append(float(nums[1]))
-                except ValueError:
-                    # 変換できない場合は無視する
-                    pass
-            else:
-                # 数値が2つ未満の場合は無視
-                continue
-
-        return x_values, y_values
+            # 図は作り直さず、線のデータだけ差し替えてメモリ上で描画する
+            thumbnail = self.thumbnails.get(label)
+            if thumbnail is None:
+                thumbnail = self.thumbnails[label] = plot_pixmap.Thumbnail(graph_widget.width(), graph_widget.height())
+            graph_widget.setPixmap(thumbnail.render(x_values, y_values))
+        else:
+            graph_widget.clear()
+
+    def sync_channel(self, label):
+        # 入力待ちの編集があれば先に配列へ反映する
+        if self.refresh_timers[label].isActive():
+            self.refresh_timers[label].stop()
+            self.update_channel(label)
+
+    def channel_data(self, label):
+        """表示中のチャンネルを (x, y) の配列で返します。"""
+        self.sync_channel(label)
+        return self.channels.xy(label)
 
     def plot_graph(self):
         selected_items = self.pulse_list.selectedItems()
         pulse_name = selected_items[0].text() if selected_items else "未選択"
 
-        x_dark_ref, y_dark_ref = self.parse_data(self.text_boxes['DARK_ref'].toPlainText())
-        _, y_dark_sig = self.parse_data(self.text_boxes['DARK_sig'].toPlainText())
-        _, y_ref = self.parse_data(self.text_boxes['ref'].toPlainText())
-        _, y_sig = self.parse_data(self.text_boxes['sig'].toPlainText())
-        _, y_ref_p = self.parse_data(self.text_boxes['ref_p'].toPlainText())
-        _, y_sig_p = self.parse_data(self.text_boxes['sig_p'].toPlainText())
+        x_dark_ref, y_dark_ref = self.channel_data('DARK_ref')
+        _, y_dark_sig = self.channel_data('DARK_sig')
+        _, y_ref = self.channel_data('ref')
+        _, y_sig = self.channel_data('sig')
+        _, y_ref_p = self.channel_data('ref_p')
+        _, y_sig_p = self.channel_data('sig_p')
 
         results = {
             'ref - DARK_ref': [ref - dark_ref for dark_ref, ref in zip(y_dark_ref, y_ref)],
@@ -262,13 +300,7 @@ class DataGraphApp(QMainWindow):
         results['Difference'] = [abs(value) for value in results['Difference']]
         results['Difference'] = [value / max(results['Difference']) for value in results['Difference']]
 
-        log_values = []
-        for ref_p_real, sig_real, sig_p_real, ref_real in zip(y_ref_p, y_sig, y_sig_p, y_ref):
-            if ref_real != 0 and sig_p_real != 0:
-                log_value = np.log((ref_p_real * sig_real) / (sig_p_real * ref_real))
-                log_values.append(log_value)
-            else:
-                log_values.append(np.nan)
+        log_values = delta_abs.compute(ref=y_ref, sig=y_sig, ref_p=y_ref_p, sig_p=y_sig_p)
         #移動平均の窓幅をfilter_widthに指定
         log_values = np.convolve(log_values, np.ones(filter_width)/filter_width, mode='same')
 
@@ -320,12 +352,12 @@ class DataGraphApp(QMainWindow):
         plt.show()
 
     def plot_abs(self):
-        x_dark_ref, y_dark_ref = self.parse_data(self.text_boxes['DARK_ref'].toPlainText())
-        _, y_dark_sig = self.parse_data(self.text_boxes['DARK_sig'].toPlainText())  
-        _, y_ref = self.parse_data(self.text_boxes['ref'].toPlainText())
-        _, y_ref_p = self.parse_data(self.text_boxes['ref_p'].toPlainText())
-        _, y_sig = self.parse_data(self.text_boxes['sig'].toPlainText())
-        _, y_sig_p = self.parse_data(self.text_boxes['sig_p'].toPlainText())
+        x_dark_ref, y_dark_ref = self.channel_data('DARK_ref')
+        _, y_dark_sig = self.channel_data('DARK_sig')  
+        _, y_ref = self.channel_data('ref')
+        _, y_ref_p = self.channel_data('ref_p')
+        _, y_sig = self.channel_data('sig')
+        _, y_sig_p = self.channel_data('sig_p')
 
         abs_ref = np.log((np.array(y_ref) - np.array(y_dark_ref)) / (np.array(y_ref_p) - np.array(y_dark_ref)))
         abs_sig = np.log((np.array(y_sig) - np.array(y_dark_sig)) / (np.array(y_sig_p) - np.array(y_dark_sig)))
@@ -345,38 +377,17 @@ class DataGraphApp(QMainWindow):
     def overlay_selected_pulses(self):
         selected_items = self.pulse_list.selectedItems()
         plt.figure(figsize=(6, 4))
-        
-        x_dark_ref, y_dark_ref = self.parse_data(self.text_boxes['DARK_ref'].toPlainText())
-        _, y_dark_sig = self.parse_data(self.text_boxes['DARK_sig'].toPlainText())
-        _, y_ref = self.parse_data(self.text_boxes['ref'].toPlainText())
-        _, y_sig = self.parse_data(self.text_boxes['sig'].toPlainText())
-        _, y_ref_p = self.parse_data(self.text_boxes['ref_p'].toPlainText())
-        _, y_sig_p = self.parse_data(self.text_boxes['sig_p'].toPlainText())
+
+        # 選択されたデータセットのΔAbsはキャッシュから取得
+        selected = [item.text() for item in selected_items]
 
         plt.grid(True)
-        for item in selected_items:
-            pulse_value = item.text()
-            if pulse_value in self.pulse_data:
-                pulse_data = self.pulse_data[pulse_value]
-                x_dark_ref_pulse, y_dark_ref = self.parse_data(pulse_data['DARK_ref'])
-                _, y_dark_sig = self.parse_data(pulse_data['DARK_sig'])
-                _, y_ref = self.parse_data(pulse_data['ref'])
-                _, y_sig = self.parse_data(pulse_data['sig'])
-                _, y_ref_p = self.parse_data(pulse_data['ref_p'])
-                _, y_sig_p = self.parse_data(pulse_data['sig_p'])
-
-                log_values = []
-                for ref_p_real, sig_real, sig_p_real, ref_real in zip(y_ref_p, y_sig, y_sig_p, y_ref):
-                    if ref_real != 0 and sig_p_real != 0:
-                        log_value = np.log((ref_p_real * sig_real) / (sig_p_real * ref_real))
-                        log_values.append(log_value)
-                    else:
-                        log_values.append(np.nan)
-                #移動平均の窓幅をfilter_widthに指定
-                #log_values = np.convolve(log_values, np.ones(filter_width)/filter_width, mode='same')
-                #color_deltaの値は追加順に薄くしていく。色はRGBで指定
-                color_deltaabs = (1-list(self.pulse_data.keys()).index(pulse_value) / len(self.pulse_data.keys()) * 0.9,0,0)
-                plt.plot(x_dark_ref_pulse, log_values, label=pulse_value, color=color_deltaabs, linestyle='-', linewidth=1.5)
+        for pulse_value, x_dark_ref_pulse, log_values in self.delta_abs_cache.rows(selected):
+            #移動平均の窓幅をfilter_widthに指定
+            #log_values = np.convolve(log_values, np.ones(filter_width)/filter_width, mode='same')
+            #color_deltaの値は追加順に薄くしていく。色はRGBで指定
+            color_deltaabs = (1-list(self.pulse_data.keys()).index(pulse_value) / len(self.pulse_data.keys()) * 0.9,0,0)
+            plt.plot(x_dark_ref_pulse, log_values, label=pulse_value, color=color_deltaabs, linestyle='-', linewidth=1.5)
 
         plt.xlabel('Wavelength / nm')
         plt.ylabel('ΔAbs')
@@ -386,7 +397,9 @@ class DataGraphApp(QMainWindow):
         plt.show()
 
     def save_data(self):
-        data = {label: self.text_boxes[label].toPlainText() for label in self.text_boxes}
+        for label in self.text_boxes:
+            self.sync_channel(label)
+        data = self.channels.snapshot().to_legacy()
         options = QFileDialog.Options()
         file_path, _ = QFileDialog.getSaveFileName(self, "データを保存", "", "JSON Files (*.json);;All Files (*)", options=options)
         
@@ -398,11 +411,11 @@ class DataGraphApp(QMainWindow):
 
     def save_all_data(self):
         options = QFileDialog.Options()
-        file_path, _ = QFileDialog.getSaveFileName(self, "All Dataを保存", "", "JSON Files (*.json);;All Files (*)", options=options)
+        file_path, _ = QFileDialog.getSaveFileName(self, "All Dataを保存", "", "TAS Files (*.tas);;JSON Files (*.json);;All Files (*)", options=options)
         
         if file_path:
-            with open(file_path, 'w') as f:
-                json.dump(self.pulse_data, f)
+            # .json なら旧形式、それ以外はバイナリ(.tas)で保存
+            self.pulse_data.save(file_path)
             print("すべてのパルスデータが保存されました:", file_path)
             #self.display_message(f"すべてのパルスデータが保存されました: {file_path}")
 
@@ -413,19 +426,20 @@ class DataGraphApp(QMainWindow):
         if file_path:
             with open(file_path, 'r') as f:
                 data = json.load(f)
-            for label, content in data.items():
-                if label in self.text_boxes:
-                    self.text_boxes[label].setPlainText(content)
+            dataset = tas_store.Dataset.from_legacy({label: content for label, content in data.items()
+                                                     if label in self.text_boxes})
+            self.show_dataset(dataset, as_original=False)
             print("データが読み込まれました:", file_path)
             #self.display_message(f"データが読み込まれました: {file_path}")
 
     def load_all_data(self):
         options = QFileDialog.Options()
-        file_path, _ = QFileDialog.getOpenFileName(self, "すべてのデータを読み込む", "", "JSON Files (*.json);;All Files (*)", options=options)
+        file_path, _ = QFileDialog.getOpenFileName(self, "すべてのデータを読み込む", "", "TAS Files (*.tas *.json);;All Files (*)", options=options)
         
         if file_path:
-            with open(file_path, 'r') as f:
-                self.pulse_data = json.load(f)
+            # 索引(データセット名)だけ読み、中身は選択されたときに読み込む
+            self.pulse_data = tas_store.DatasetStore(file_path)
+            self.delta_abs_cache.bind(self.pulse_data)
             self.update_pulse_list()
             print("すべてのパルスデータが読み込まれました:", file_path)
             #self.display_message(f"すべてのパルスデータが読み込まれました: {file_path}")
@@ -437,13 +451,15 @@ class DataGraphApp(QMainWindow):
         if file_path:
             with pd.ExcelWriter(file_path, engine='openpyxl') as writer:
                 matome_data = {'Wavelength': None}  # Matomeシート用のデータを収集する辞書
-                for pulse, data in self.pulse_data.items():
-                    x_dark_ref, y_dark_ref = self.parse_data(data['DARK_ref'])
-                    _, y_dark_sig = self.parse_data(data['DARK_sig'])
-                    _, y_ref = self.parse_data(data['ref'])
-                    _, y_sig = self.parse_data(data['sig'])
-                    _, y_ref_p = self.parse_data(data['ref_p'])
-                    _, y_sig_p = self.parse_data(data['sig_p'])
+                # 全データセットのΔAbsはキャッシュから取得
+                for pulse, _, log_values in self.delta_abs_cache.rows():
+                    data = self.pulse_data[pulse]
+                    x_dark_ref, y_dark_ref = data.xy('DARK_ref')
+                    y_dark_sig = data.y('DARK_sig')
+                    y_ref = data.y('ref')
+                    y_sig = data.y('sig')
+                    y_ref_p = data.y('ref_p')
+                    y_sig_p = data.y('sig_p')
                     #データフレームを作成
                     df = pd.DataFrame({
                         'Wavelength': x_dark_ref,
@@ -454,14 +470,6 @@ class DataGraphApp(QMainWindow):
                         'ref_p': y_ref_p,
                         'sig_p': y_sig_p
                     })
-                    #ΔAbsを計算
-                    log_values = []
-                    for ref_p_real, sig_real, sig_p_real, ref_real in zip(y_ref_p, y_sig, y_sig_p, y_ref):
-                        if ref_real != 0 and sig_p_real != 0:
-                            log_value = np.log((ref_p_real * sig_real) / (sig_p_real * ref_real))
-                            log_values.append(log_value)
-                        else:
-                            log_values.append(np.nan)
                     df['ΔAbs'] = log_values  # ΔAbsをデータフレームに追加
 
                     # Matomeシート用のデータを収集
@@ -483,12 +491,8 @@ class DataGraphApp(QMainWindow):
         if len(selected_items) == 1:  # 選択されたアイテムが1つだけの場合
             pulse_value = selected_items[0].text()  # 最初の選択されたアイテムのテキストを取得
             if pulse_value in self.pulse_data:
-                data = self.pulse_data[pulse_value]
-                for label, content in data.items():
-                    if label in self.text_boxes:
-                        self.text_boxes[label].setPlainText(content)  # テキストボックスにデータを設定
-                        self.text_boxes[label].setStyleSheet("color: black;")  # フォント色を黒に設定
-                        self.original_data[label] = content  # 元のデータを保持
+                # 配列をそのまま表示中にする (テキストへの変換はクリックされたときだけ)
+                self.show_dataset(self.pulse_data[pulse_value])
                 print(f"Pulse {pulse_value}のデータが読み込まれました。")
                 #self.display_message(f"Pulse {pulse_value}のデータが読み込まれました。")
 
@@ -501,14 +505,11 @@ class DataGraphApp(QMainWindow):
     def save_pulse_data(self):
         pulse_value = self.pulse_input.toPlainText().strip()
         if pulse_value:
-            self.pulse_data[pulse_value] = {
-                'DARK_ref': self.text_boxes['DARK_ref'].toPlainText(),
-                'DARK_sig': self.text_boxes['DARK_sig'].toPlainText(),
-                'ref': self.text_boxes['ref'].toPlainText(),
-                'sig': self.text_boxes['sig'].toPlainText(),
-                'ref_p': self.text_boxes['ref_p'].toPlainText(),
-                'sig_p': self.text_boxes['sig_p'].toPlainText()
-            }
+            # 表示中の配列をそのまま保存する
+            for label in self.text_boxes:
+                self.sync_channel(label)
+            self.pulse_data[pulse_value] = self.channels.snapshot()
+            self.delta_abs_cache.invalidate(pulse_value)  # このパルスの行だけ再計算する
             self.update_pulse_list()
             self.plot_delta_abs()  # ΔAbsのグラフを更新
             print(f"Pulse {pulse_value}が保存されました。")
@@ -522,23 +523,11 @@ class DataGraphApp(QMainWindow):
         plt.clf()
         
         # 保存されたすべてのパルスデータに対してΔAbsを計算
-        #グラフサイズをウィジェットに合わせる
-        plt.figure(figsize=(5, 2))
-        for pulse_name, data in self.pulse_data.items():
-            x_dark_ref, y_dark_ref = self.parse_data(data['DARK_ref'])
-            _, y_dark_sig = self.parse_data(data['DARK_sig'])
-            _, y_ref = self.parse_data(data['ref'])
-            _, y_ref_p = self.parse_data(data['ref_p'])
-            _, y_sig = self.parse_data(data['sig'])
-            _, y_sig_p = self.parse_data(data['sig_p'])
-
-            log_values = []
-            for ref_p_real, sig_real, sig_p_real, ref_real in zip(y_ref_p, y_sig, y_sig_p, y_ref):
-                if ref_real != 0 and sig_p_real != 0:
-                    log_value = np.log((ref_p_real * sig_real) / (sig_p_real * ref_real))
-                    log_values.append(log_value)
-                else:
-                    log_values.append(np.nan)
+        #グラフサイズをウィジェットに合わせる (ウィジェットのピクセル数をそのまま図の大きさにする)
+        dpi = 100
+        plt.figure(figsize=(self.abs_graph_widget.width() / dpi, self.abs_graph_widget.height() / dpi), dpi=dpi)
+        # 変更のあったパルスだけ再計算される
+        for pulse_name, x_dark_ref, log_values in self.delta_abs_cache.rows():
             #移動平均の窓幅をfilter_widthに指定
             #log_values = np.convolve(log_values, np.ones(filter_width)/filter_width, mode='same')
 
@@ -547,7 +536,9 @@ class DataGraphApp(QMainWindow):
             color_delta = (1 - list(self.pulse_data.keys()).index(pulse_name) / len(self.pulse_data.keys()) * 0.8, 0, 0)
             plt.plot(x_dark_ref, log_values, label=pulse_name, color=color_delta, alpha=0.7, linestyle='-', linewidth=1)
             plt.xlim(400,750)
-            plt.ylim(min(log_values)-0.02, max(log_values)+0.02 if len(log_values) > 0 else 1)            #目盛りのフォントサイズを変更
+            if np.isfinite(log_values).any():
+                plt.ylim(np.nanmin(log_values)-0.02, np.nanmax(log_values)+0.02)
+            #目盛りのフォントサイズを変更
             plt.tick_params(labelsize=8)
             #横軸の目盛りの位置を縦軸の0に合わせる
             plt.gca().spines['bottom'].set_position(('data', 0))
@@ -556,12 +547,10 @@ class DataGraphApp(QMainWindow):
 
         plt.grid()
         
-        # グラフをQLabelに表示
-        temp_file_path = 'temp_abs.png'
-        plt.savefig(temp_file_path, bbox_inches='tight', pad_inches=0)
-        plt.close()
-        self.abs_graph_widget.setPixmap(QPixmap(temp_file_path))
-        os.remove(temp_file_path)
+        # グラフをファイルを介さずにQLabelに表示
+        figure = plt.gcf()
+        self.abs_graph_widget.setPixmap(plot_pixmap.figure_to_pixmap(figure))
+        plt.close(figure)
 
 # アプリケーションの起動
 if __name__ == "__main__":
@@ -1,33 +1,49 @@
 import serial
 import serial.tools.list_ports
-import time
 import tkinter as tk
 from tkinter import messagebox, StringVar, ttk
 
+import instrument_broker
+import shutter_driver
+
+driver = None    # shutter_driver.ShutterDriver (接続後に作成)
+shutters = {}    # モーター番号 -> shutter_driver.Shutter
+
+# ファームウェア (aruduino/arduino_code) がつないでいるモーター
+# モーター2 (Pump) は配線を確認できていないので使わない (ファームウェアも ERR を返す)。
+# 配線したらファームウェアの MOTOR_COUNT と合わせて "2" を足す。
+MOTORS = ("1",)
+# 50度の回転で開閉 (White light は CCW, Pump は CW で開く)
+OPEN_DIRECTIONS = {"1": -1, "2": 1}
+
 def list_serial_ports():
     """接続されているシリアルポートのリストを取得します。"""
     ports = serial.tools.list_ports.comports()
     return [port.device for port in ports]
 
-def send_command(arduino, motor_num, steps, delay_time, direction):
-    command = f"{motor_num},{steps},{delay_time},{direction}\n"
-    arduino.write(command.encode())
-    time.sleep(delay_time)
-
-def operate_motor(arduino, motor_num, steps, direction):
-    try:
-        send_command(arduino, motor_num, steps, 2, direction)
-    except Exception as e:
-        messagebox.showerror("エラー", f"モーターの操作中にエラーが発生しました: {str(e)}")
+# 状態表示 (シャッターの状態は driver の応答で決まる)
+STATE_TEXT = {
+    shutter_driver.OPEN: ("OPEN !!", "red"),
+    shutter_driver.CLOSE: ("CLOSE", "blue"),
+    shutter_driver.MOVING: ("MOVING...", "gray"),
+    shutter_driver.UNKNOWN: ("UNKNOWN", "orange"),
+}
+pending = []  # 結果をまだ確認していない Future
+
+def operate_motor(motor_num, steps, direction):
+    """コマンドをワーカーに渡してすぐ戻ります (GUI は止まらない)。"""
+    if driver is None:
+        messagebox.showerror("エラー", "シリアルポートに接続してください。")
+        return
+    pending.append(driver.move(motor_num, steps, direction))
 
 def connect_serial_port(port):
     """Arduinoに接続します。"""
-    return serial.Serial(port, 9600, timeout=1)
+    return instrument_broker.open_serial(port, baudrate=9600, timeout=1)  # ポートはブローカーが持つ
 
 def angle_to_steps(angle):
     """角度をステップ数に変換します。"""
-    steps_per_degree = 512 / 360
-    return int(angle * steps_per_degree)
+    return shutter_driver.angle_to_steps(angle)
 
 def on_run_motor():
     try:
@@ -35,75 +51,54 @@ def on_run_motor():
         steps = angle_to_steps(angle)  # 角度をステップ数に変換
         direction = direction_var.get()
         motor_num = motor_var.get()  # モーターの選択
-        operate_motor(arduino, motor_num, steps, direction)
+        operate_motor(motor_num, steps, direction)
     except ValueError:
         messagebox.showerror("エラー", "モーターの角度は数値で入力してください。")
 
 def connect_to_selected_port():
-    global arduino
+    global driver, shutters
     try:
-        if 'arduino' in globals():
-            arduino.close()  # 以前の接続を閉じる
+        if driver is not None:
+            driver.close()  # 以前の接続を閉じる
+            driver = None
         selected_port = port_var.get()  # ドロップダウンからポートを取得
-        arduino = connect_serial_port(selected_port)
-        
+        driver = shutter_driver.ShutterDriver(connect_serial_port(selected_port))
+        shutters = {motor_num: shutter_driver.Shutter(driver, int(motor_num), open_direction=OPEN_DIRECTIONS[motor_num], angle=50)
+                    for motor_num in MOTORS}
+
         # 接続が成功したらテキストボックスに初期値50を設定
         steps_entry.delete(0, tk.END)  # 現在のテキストを削除
         steps_entry.insert(0, "50")  # 初期値として50を設定
     except Exception as e:
         messagebox.showerror("接続エラー", str(e))
 
+# シャッタースイッチの設定
+def shutter_switch(motor_num):
+    if motor_num not in shutters:
+        messagebox.showerror("エラー", "シリアルポートに接続してください。")
+        return
+    pending.append(shutters[motor_num].toggle())
+
 # シャッタースイッチの設定 (モーター1)
 def shutter_switch_motor1():
-    global shutter_state_motor1, direction_var_motor1
-
-    # 50度の回転
-    angle = 50
-    steps = angle_to_steps(angle)
-    motor_num = "1"  # モーター1
-
-    # 方向を切り替え
-    direction = direction_var_motor1.get()
-    operate_motor(arduino, motor_num, steps, direction)
-    
-    # 次の操作のために方向を切り替え
-    direction_var_motor1.set("1" if direction == "-1" else "-1")
-
-    # シャッター状態を切り替え
-    if shutter_state_motor1.get() == "CLOSE":
-        shutter_state_motor1.set("OPEN !!")
-        shutter_state_label_motor1.config(fg="red", font=("", 12, "bold"))
-    else:
-        shutter_state_motor1.set("CLOSE")
-        shutter_state_label_motor1.config(fg="blue", font=("", 12, "bold"))
-    
-    shutter_state_label_motor1.config(text=f"Shutter White light : {shutter_state_motor1.get()}")
+    shutter_switch("1")
 
 # シャッタースイッチの設定 (モーター2)
 def shutter_switch_motor2():
-    global shutter_state_motor2, direction_var_motor2
-
-    # 50度の回転
-    angle = 50
-    steps = angle_to_steps(angle)
-    motor_num = "2"  # モーター2
-
-    # 方向を切り替え
-    direction = direction_var_motor2.get()
-    operate_motor(arduino, motor_num, steps, direction)
-    
-    # 次の操作のために方向を切り替え
-    direction_var_motor2.set("1" if direction == "-1" else "-1")
-
-    # シャッター状態を切り替え
-    if shutter_state_motor2.get() == "CLOSE":
-        shutter_state_motor2.set("OPEN !!")
-        shutter_state_label_motor2.config(fg="red", font=("", 12, "bold"))
-    else:
-        shutter_state_motor2.set("CLOSE")
-        shutter_state_label_motor2.config(fg="blue", font=("", 12, "bold"))
-    
-    shutter_state_label_motor2.config(text=f"Shutter Pump : {shutter_state_motor2.get()}")
+    shutter_switch("2")
+
+# 表示の更新 (ワーカースレッドからは Tk を触らず、ここで状態を読む)
+def refresh_status():
+    for motor_num, label, name in (("1", shutter_state_label_motor1, "Shutter White light"),
+                                   ("2", shutter_state_label_motor2, "Shutter Pump")):
+        if motor_num in shutters:
+            text, color = STATE_TEXT[shutters[motor_num].state]
+            label.config(text=f"{name} : {text}", fg=color, font=("", 12, "bold"))
+    for future in [f for f in pending if f.done()]:
+        pending.remove(future)
+        if future.exception() is not None:
+            messagebox.showerror("エラー", f"モーターの操作中にエラーが発生しました: {future.exception()}")
+    root.after(100, refresh_status)
 
 # GUIの設定
 root = tk.Tk()
@@ -128,7 +123,8 @@ connect_button.grid(row=0, column=2)
 motor_var = StringVar(value="1")  # 初期値をモーター1に設定
 tk.Label(root, text="control:").grid(row=1, column=0)
 tk.Radiobutton(root, text="White light", variable=motor_var, value="1").grid(row=1, column=1)
-tk.Radiobutton(root, text="Pump", variable=motor_var, value="2").grid(row=1, column=2)
+tk.Radiobutton(root, text="Pump", variable=motor_var, value="2",
+               state=tk.NORMAL if "2" in MOTORS else tk.DISABLED).grid(row=1, column=2)
 
 # モーターの入力フィールド
 tk.Label(root, text="Angle:").grid(row=2, column=0)
@@ -136,8 +132,6 @@ steps_entry = tk.Entry(root)  # 角度入力用エントリ
 steps_entry.grid(row=2, column=1)
 
 direction_var = StringVar(value="1")  # 初期値をCWに設定
-direction_var_motor1 = StringVar(value="-1")
-direction_var_motor2 = StringVar(value="1")
 
 tk.Label(root, text="Direction:").grid(row=3, column=0)
 tk.Radiobutton(root, text="CW", variable=direction_var, value="1").grid(row=3, column=1)
@@ -151,22 +145,22 @@ shutter_button_motor1 = tk.Button(root, text="Switch WHITE", command=shutter_swi
 shutter_button_motor1.grid(row=4, column=0)
 
 # シャッター状態表示ラベル (モーター1)
-shutter_state_motor1 = StringVar(value="CLOSE")
-shutter_state_label_motor1 = tk.Label(root, text=f"Shutter : {shutter_state_motor1.get()}")
+shutter_state_label_motor1 = tk.Label(root, text="Shutter : CLOSE")
 shutter_state_label_motor1.grid(row=5, column=0)
 
 # シャッタースイッチボタン (モーター2)
-shutter_button_motor2 = tk.Button(root, text="Switch PUMP", command=shutter_switch_motor2)
+shutter_button_motor2 = tk.Button(root, text="Switch PUMP", command=shutter_switch_motor2,
+                                  state=tk.NORMAL if "2" in MOTORS else tk.DISABLED)  # 未配線なら押せない
 shutter_button_motor2.grid(row=4, column=1)
 
 # シャッター状態表示ラベル (モーター2)
-shutter_state_motor2 = StringVar(value="CLOSE")
-shutter_state_label_motor2 = tk.Label(root, text=f"Shutter : {shutter_state_motor2.get()}")
+shutter_state_label_motor2 = tk.Label(root, text="Shutter : CLOSE" if "2" in MOTORS else "Shutter Pump : 未配線")
 shutter_state_label_motor2.grid(row=5, column=1)
 
 # GUIのメインループを開始
+root.after(100, refresh_status)
 root.mainloop()
 
 # プログラム終了時にシリアルポートを閉じる
-if 'arduino' in globals():
-    arduino.close()
+if driver is not None:
+    driver.close()
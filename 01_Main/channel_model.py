@@ -0,0 +1,100 @@
+"""表示中のデータセットを配列で保持するモデル
+
+● なにをする？
+    GUI で表示中の 6 チャンネル (DARK_ref, DARK_sig, ref, sig, ref_p, sig_p) を
+    (波長, 強度) の配列で保持します。計算・保存・グラフはこの配列を直接使います。
+
+● テキストとの関係
+    テキストボックスは貼り付けと確認のための「表示」にすぎません。
+    - 貼り付け・編集されたテキストは set_text で配列に反映する (同じ内容は再解析しない)
+    - 配列からテキストへの変換は text() を呼んだときだけ行う
+
+● 変更の判定
+    読み込み時の配列のハッシュと現在の配列のハッシュを比べます。
+"""
+
+import hashlib
+
+import numpy as np
+
+import tas_store
+
+
+def _digest(x, y):
+    h = hashlib.blake2b(digest_size=16)
+    for array in (x, y):
+        h.update(array.dtype.str.encode())
+        h.update(np.ascontiguousarray(array).tobytes())
+    return h.digest()
+
+
+def text_hash(text):
+    """テキストのハッシュ"""
+    return hashlib.blake2b(text.encode(), digest_size=16).digest()
+
+
+_EMPTY = np.empty(0, dtype=np.float64)
+
+
+class ChannelModel:
+    """表示中の 1 データセット分のチャンネル配列"""
+
+    def __init__(self, labels=tas_store.CHANNELS):
+        self.labels = list(labels)
+        self.dataset = tas_store.Dataset()
+        self._original = {}      # label -> 読み込み時の配列のハッシュ
+        self._text_digest = {}   # label -> 配列に反映済みのテキストのハッシュ
+
+    def load(self, dataset, as_original=True):
+        """データセットの配列を表示中にします (テキストへの変換はしません)。
+
+        as_original が True なら、この内容を「変更なし」の基準にします。
+        """
+        self.dataset = tas_store.Dataset()
+        self.dataset.channels = {label: dataset.channels[label]
+                                 for label in self.labels if label in dataset.channels}
+        self._text_digest = {}
+        if as_original:
+            self._original = {label: self.digest(label) for label in self.labels}
+
+    def xy(self, label):
+        """計算用に (波長, 強度) を float64 で返します。"""
+        return self.dataset.xy(label)
+
+    def digest(self, label):
+        x, y = self.dataset.channels.get(label, (_EMPTY, _EMPTY))
+        return _digest(x, y)
+
+    def is_modified(self, label):
+        return self.digest(label) != self._original.get(label, _digest(_EMPTY, _EMPTY))
+
+    def set_text(self, label, text, digest=None):
+        """テキストを解析して配列に反映します。内容が前回と同じなら何もせず False を返します。"""
+        if digest is None:
+            digest = text_hash(text)
+        if self._text_digest.get(label) == digest:
+            return False
+        x, y = tas_store.parse_spectrum(text)
+        self.dataset.set_channel(label, x, y)
+        self._text_digest[label] = digest
+        return True
+
+    def text(self, label):
+        """配列をテキストにして返します (表示用)。"""
+        if label not in self.dataset.channels:
+            return ""
+        text = tas_store.format_spectrum(*self.dataset.channels[label])
+        # このテキストは配列と同じ内容なので、戻ってきても再解析しない
+        self._text_digest[label] = text_hash(text)
+        return text
+
+    def points(self, label):
+        """チャンネルの点数"""
+        return len(self.dataset.channels.get(label, (_EMPTY, _EMPTY))[0])
+
+    def snapshot(self):
+        """保存用に現在の配列を Dataset として返します (配列は共有)。"""
+        dataset = tas_store.Dataset()
+        dataset.channels = {label: self.dataset.channels.get(label, (_EMPTY, _EMPTY.astype(np.float32)))
+                            for label in self.labels}
+        return dataset
@@ -4,12 +4,12 @@ Delay controller GUI laid out to match the reference screenshot (axis buttons ro
 Author: ChatGPT, 2025‑04‑30 (rev‑1)
 """
 
-import pyvisa
+import instrument_broker
 import tkinter as tk
 import tkinter.ttk as ttk
 from tkinter import messagebox
 
-rm = pyvisa.ResourceManager()
+rm = instrument_broker.resource_manager()  # 測定スクリプトと同じ接続を共有する
 instrument = None
 
 
@@ -1,9 +1,9 @@
-import pyvisa
+import instrument_broker
 import tkinter as tk
 from tkinter import messagebox
 
 # グローバル変数
-rm = pyvisa.ResourceManager()
+rm = instrument_broker.resource_manager()  # 測定スクリプトと同じ接続を共有する
 instrument = None
 
 class DeviceControlApp:
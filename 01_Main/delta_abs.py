@@ -0,0 +1,134 @@
+"""ΔAbs の一括計算
+
+● なにをする？
+    ΔAbs = log((ref_p * sig) / (sig_p * ref)) を
+    (データセット数, 画素数) の配列に対してまとめて計算します。
+    GUI_ver3.6 と 02_Analysis の DATAFLAME ツールで共通に使います。
+
+● 無効な画素
+    0 や NaN / inf が入った画素、対数が取れない画素は NaN にします。
+"""
+
+import numpy as np
+
+from tas_store import CHANNELS
+
+
+def compute(ref, sig, ref_p, sig_p, dark_ref=None, dark_sig=None, base=np.e):
+    """ΔAbs を計算します。
+
+    各引数は (画素数,) または (データセット数, 画素数) の配列。
+    画素数が揃っていない場合は短い方に合わせます (従来の zip と同じ)。
+    dark_ref / dark_sig を渡すと ref, ref_p / sig, sig_p からそれぞれ差し引きます。
+    base は対数の底 (np.e, 10 など)。
+    """
+    arrays = [np.asarray(a, dtype=np.float64) for a in (ref, sig, ref_p, sig_p, dark_ref, dark_sig)
+              if a is not None]
+    n_pixels = min(a.shape[-1] for a in arrays)
+    ref, sig, ref_p, sig_p = (a[..., :n_pixels] for a in arrays[:4])
+
+    if dark_ref is not None:
+        dark = np.asarray(dark_ref, dtype=np.float64)[..., :n_pixels]
+        ref, ref_p = ref - dark, ref_p - dark
+    if dark_sig is not None:
+        dark = np.asarray(dark_sig, dtype=np.float64)[..., :n_pixels]
+        sig, sig_p = sig - dark, sig_p - dark
+
+    numerator = ref_p * sig
+    denominator = sig_p * ref
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        values = np.log(numerator / denominator)
+    if base != np.e:
+        values /= np.log(base)
+
+    invalid = (numerator == 0) | (denominator == 0) | ~np.isfinite(values)
+    values[invalid] = np.nan
+    return values
+
+
+def stack_channels(datasets, labels=CHANNELS):
+    """Dataset のリストを {label: (データセット数, 画素数)} の配列にまとめます。
+
+    長さが足りないデータセットは NaN で埋めます。
+    """
+    n_pixels = max((len(dataset.channels[label][1]) for dataset in datasets
+                    for label in labels if label in dataset.channels), default=0)
+    stacked = {}
+    for label in labels:
+        block = np.full((len(datasets), n_pixels), np.nan)
+        for i, dataset in enumerate(datasets):
+            if label in dataset.channels:
+                y = dataset.channels[label][1]
+                block[i, :len(y)] = y
+        stacked[label] = block
+    return stacked
+
+
+def compute_matrix(datasets, dark=False, base=np.e):
+    """{名前: Dataset} から (名前リスト, ΔAbs 行列) を返します。"""
+    names = list(datasets)
+    stacked = stack_channels([datasets[name] for name in names])
+    values = compute(stacked['ref'], stacked['sig'], stacked['ref_p'], stacked['sig_p'],
+                     dark_ref=stacked['DARK_ref'] if dark else None,
+                     dark_sig=stacked['DARK_sig'] if dark else None,
+                     base=base)
+    return names, values
+
+
+class DeltaAbsCache:
+    """データセットごとの ΔAbs を1行ずつ保持するキャッシュ
+
+    store ({名前: Dataset}) の中身が変わったら invalidate(名前) を呼びます。
+    無効になった行と未計算の行だけを、参照されたときにまとめて計算し直します。
+    各行は (波長, ΔAbs) で、ΔAbs は波長 (DARK_ref の x) の長さに揃えます。
+    """
+
+    def __init__(self, store, dark=False, base=np.e):
+        self.dark = dark
+        self.base = base
+        self.bind(store)
+
+    def bind(self, store):
+        """参照する store を差し替え、キャッシュを空にします。"""
+        self.store = store
+        self._rows = {}
+
+    def invalidate(self, name=None):
+        """name の行を破棄します。name が None なら全行を破棄します。"""
+        if name is None:
+            self._rows.clear()
+        else:
+            self._rows.pop(name, None)
+
+    def _refresh(self, names):
+        missing = [name for name in names if name not in self._rows]
+        if not missing:
+            return
+        computed, values = compute_matrix({name: self.store[name] for name in missing},
+                                          dark=self.dark, base=self.base)
+        for name, row in zip(computed, values):
+            x, _ = self.store[name].xy('DARK_ref')
+            self._rows[name] = (x, row[:len(x)])
+
+    def rows(self, names=None):
+        """[(名前, 波長, ΔAbs), ...] を返します。names を省略すると store の全件 (保存順)。"""
+        names = [name for name in (self.store if names is None else names) if name in self.store]
+        self._refresh(names)
+        # store から消えた行は捨てる
+        for name in [name for name in self._rows if name not in self.store]:
+            del self._rows[name]
+        return [(name, *self._rows[name]) for name in names]
+
+    def row(self, name):
+        """(波長, ΔAbs) を返します。"""
+        self._refresh([name])
+        return self._rows[name]
+
+    def matrix(self, names=None):
+        """(名前リスト, ΔAbs 行列) を返します。長さの足りない行は NaN で埋めます。"""
+        rows = self.rows(names)
+        n_pixels = max((len(values) for _, _, values in rows), default=0)
+        block = np.full((len(rows), n_pixels), np.nan)
+        for i, (_, _, values) in enumerate(rows):
+            block[i, :len(values)] = values
+        return [name for name, _, _ in rows], block
@@ -0,0 +1,119 @@
+"""DS102 / DS112 シリアル通信 (待ち時間なしの送受信)
+
+● なにをする？
+    コマンドを送ったら、応答の終端 (CR) が届いた時点ですぐに読み取ります。
+    固定の time.sleep(0.1) は入れません。
+
+● 複数スレッドから呼んでも安全
+    送信から応答の読み取りまでをロックで 1 組にします。
+    (threading.Timer の状態更新とボタン操作が同時に来ても応答が入れ替わらない)
+
+● まとめて問い合わせ (パイプライン)
+    query_many(['AXI1:SB1?', 'AXI1:POS?']) は全コマンドを 1 回で送り、
+    応答を順に読みます。往復の待ちが 1 回分で済みます。
+
+● 統計
+    コマンドごとの応答時間 (回数・平均・中央値・95%タイル・最大) を stats() で返します。
+"""
+
+import re
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+# ------------------ 設定 ------------------
+TERMINATOR = b'\r'
+SAMPLES = 1000     # コマンドごとに保持する応答時間の数
+
+
+class TransportTimeout(IOError):
+    """タイムアウトまでに応答の終端が届かなかったとき"""
+
+
+class LatencyStats:
+    """応答時間の記録 (直近 SAMPLES 個)"""
+
+    def __init__(self, maxlen=SAMPLES):
+        self.count = 0
+        self.samples = deque(maxlen=maxlen)
+
+    def add(self, seconds):
+        self.count += 1
+        self.samples.append(seconds)
+
+    def summary(self):
+        a = np.asarray(self.samples) * 1000
+        if not len(a):
+            return {'count': 0}
+        return {'count': self.count, 'mean_ms': float(a.mean()), 'p50_ms': float(np.median(a)),
+                'p95_ms': float(np.percentile(a, 95)), 'max_ms': float(a.max())}
+
+
+def command_key(command):
+    """統計用に軸番号以外の数値引数を除いたコマンド名 ('AXI1:PULS 100:GO 0' -> 'AXI1:PULS:GO')"""
+    return re.sub(r'\s+[-+\w.]+', '', command.strip())
+
+
+class DS102Transport:
+    """DS102 とのコマンド送受信
+
+    ser は pyserial の Serial (timeout を設定しておくこと)。
+    """
+
+    def __init__(self, ser, terminator=TERMINATOR, encoding='utf-8'):
+        self.ser = ser
+        self.terminator = terminator
+        self.encoding = encoding
+        self.lock = threading.Lock()
+        self._stats = {}
+
+    def _send(self, commands):
+        data = b''.join(command.encode(self.encoding) + self.terminator for command in commands)
+        self.ser.write(data)
+
+    def _receive(self, command):
+        raw = self.ser.read_until(self.terminator)
+        if not raw.endswith(self.terminator):
+            raise TransportTimeout(f"{command}: 応答がありません (受信: {raw!r})")
+        return raw[:-len(self.terminator)].decode(self.encoding, errors='replace').strip()
+
+    def _record(self, command, seconds):
+        key = command_key(command)
+        if key not in self._stats:
+            self._stats[key] = LatencyStats()
+        self._stats[key].add(seconds)
+
+    def write(self, command):
+        """応答のないコマンドを送ります。"""
+        with self.lock:
+            self._send([command])
+
+    def query(self, command):
+        """コマンドを送り、応答を文字列で返します。"""
+        return self.query_many([command])[0]
+
+    def query_many(self, commands):
+        """複数の問い合わせを 1 回で送り、応答をリストで返します。"""
+        with self.lock:
+            # 前の呼び出しで読み残した応答があれば捨てる
+            if self.ser.in_waiting:
+                self.ser.reset_input_buffer()
+            t0 = time.perf_counter()
+            self._send(commands)
+            replies = []
+            for command in commands:
+                replies.append(self._receive(command))
+                # 応答時間は送信から各応答が届くまで
+                self._record(command, time.perf_counter() - t0)
+            return replies
+
+    def stats(self):
+        """{コマンド: 応答時間のまとめ} を返します。"""
+        with self.lock:
+            return {key: stats.summary() for key, stats in self._stats.items()}
+
+    def reset_stats(self):
+        with self.lock:
+            self._stats.clear()
@@ -0,0 +1,500 @@
+"""装置セッションブローカー (VISA / シリアルの接続を 1 プロセスで持つ)
+
+● なにをする？
+    D220 (GPIB1::7::INSTR) などの VISA リソースとシリアルポートを、
+    ブローカープロセスが 1 回だけ開き、使っているクライアントがいる間持ち続けます。
+    GUI と測定スクリプトはブローカー経由でコマンドを送るので、同時に動かしても衝突しません。
+    接続 (GPIB のハンドシェイク) はクライアントがいる間は最初の 1 回だけです。
+    最後のクライアントが閉じる (または終了する) と装置も閉じるので、
+    ブローカーを使わないスクリプト (pyvisa を直接使うもの) ともぶつかりません。
+
+● 使い方 (クライアント)
+    import instrument_broker
+    rm = instrument_broker.resource_manager()     # pyvisa.ResourceManager の代わり
+    sta = rm.open_resource('GPIB1::7::INSTR')
+    sta.query('AXI1:POS?')
+    ブローカーが動いていなければ自動で起動します。
+    起動できないとき・別のユーザーのブローカーが動いていて認証キーが合わないときは
+    普通の pyvisa.ResourceManager() を返します。
+
+    ser = instrument_broker.open_serial('COM1', baudrate=9600, timeout=3)   # serial.Serial の代わり
+    MARK-202 や Arduino シャッターのポートもブローカーが持つので、GUI と測定スクリプトを同時に使えます。
+    (ブローカーが使えないときは普通の serial.Serial を返します)
+    すでに開いているポート・リソースを別の設定 (baudrate など) で開こうとすると BrokerError になります。
+
+● ブローカーを手で起動する
+    python instrument_broker.py            (Ctrl+C で終了)
+
+● 応答のキャッシュ
+    *IDN? などの固定の問い合わせは最初の応答を覚えておき、装置に送りません。
+    分解能・速度などの設定値の問い合わせは、同じリソースに write が来るまで覚えておきます。
+
+● 通信
+    multiprocessing.connection (127.0.0.1:TAS_BROKER_PORT, 認証キー付き)。
+    認証キーはユーザーごとに乱数で作り、本人だけが読めるファイル (~/.tas_broker_key) に置きます。
+    (認証に通った接続の要求だけを読むので、キーを知らないプロセスはブローカーに何も送れない)
+    get / set で触れる属性は READABLE / SETTABLE に書いたものだけです。
+    シリアルの読み取りは SLICE_S ごとにポートのロックを手放すので、応答を待っている間も
+    同じポートの他のクライアントの要求は止まりません。(query どうしは 1 組ずつ順に行う)
+    1 回の要求 = {'op': ..., ...} を送り、{'ok': True, 'value': ...} か
+    {'ok': False, 'error': 型名, 'message': ...} を受け取ります。
+    クライアントは要求ごとの往復時間を telemetry の command_rtt.<op> に記録します。
+"""
+
+import os
+import re
+import secrets
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+import telemetry
+
+# ------------------ 設定 ------------------
+HOST = '127.0.0.1'
+PORT = int(os.environ.get('TAS_BROKER_PORT', 18861))
+KEY_FILE = os.environ.get('TAS_BROKER_KEY_FILE', os.path.join(os.path.expanduser('~'), '.tas_broker_key'))
+START_TIMEOUT_S = 10.0
+SLICE_S = 0.05         # シリアルの読み取りでポートのロックを続けて持つ最長時間 [s]
+
+# get / set で触れてよい属性 (pyvisa の Resource と serial.Serial の設定)
+SETTABLE = {'timeout', 'read_termination', 'write_termination', 'query_delay', 'chunk_size',
+            'send_end', 'baudrate'}
+READABLE = SETTABLE | {'resource_name', 'port', 'is_open', 'in_waiting'}
+
+# 装置を開き直さない限り変わらない問い合わせ
+STATIC_QUERIES = {'*IDN?', 'DS102VER?', 'VER?', 'CONTA?'}
+# write があるまで変わらない設定値の問い合わせ (軸番号の綴りは問わない)
+_SETTING_QUERY = re.compile(r'^AXI\w*\d:(RESOLUT\w*|DR\w*DIV\w*|F\w*0|L\w*0|PULS\w*|UNIT|SELSP|MEMSW\d)\?$', re.I)
+
+
+class BrokerError(RuntimeError):
+    """ブローカー側で起きたエラー"""
+
+
+def load_authkey(path=None):
+    """このユーザーの認証キーを返します。なければ作ります (本人だけが読み書きできるファイル)。"""
+    if os.environ.get('TAS_BROKER_KEY'):
+        return os.environ['TAS_BROKER_KEY'].encode()
+    path = path or KEY_FILE
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        with open(path, 'rb') as f:
+            return f.read().strip()
+    key = secrets.token_hex(32).encode()
+    with os.fdopen(fd, 'wb') as f:
+        f.write(key)
+    return key
+
+
+def is_cacheable(command):
+    """('static' | 'setting' | None) を返します。"""
+    command = command.strip()
+    if command.upper() in STATIC_QUERIES:
+        return 'static'
+    if _SETTING_QUERY.match(command):
+        return 'setting'
+    return None
+
+
+# -------------- ブローカー (サーバー) --------------
+
+class _Session:
+    """開いている 1 つのリソース (VISA またはシリアル)"""
+
+    def __init__(self, handle, kind, options):
+        self.handle = handle
+        self.kind = kind
+        self.options = options
+        self.lock = threading.Lock()
+        self.exchange = threading.Lock()     # serial_query の書き込みから応答までを 1 組にする
+        self.cache = {}
+        self.clients = 0
+
+
+class Broker:
+    """VISA リソースとシリアルポートを持ち、複数のクライアントからの要求を順に処理します。"""
+
+    def __init__(self, address=(HOST, PORT), authkey=None):
+        self.address = address
+        self.authkey = authkey or load_authkey()
+        self.sessions = {}
+        self.lock = threading.Lock()
+        self._rm = None
+        self.stats = {'requests': 0, 'cache_hits': 0, 'opens': 0}
+
+    def resource_manager(self):
+        if self._rm is None:
+            import pyvisa
+            self._rm = pyvisa.ResourceManager()
+        return self._rm
+
+    # ---- 要求の処理 ----
+    def _session(self, name):
+        session = self.sessions.get(name)
+        if session is None:
+            raise BrokerError(f"{name} は開かれていません")
+        return session
+
+    def op_ping(self):
+        return 'pong'
+
+    def op_stats(self):
+        return dict(self.stats, sessions={name: s.clients for name, s in self.sessions.items()})
+
+    def op_list_resources(self, query='?*::INSTR'):
+        return tuple(self.resource_manager().list_resources(query))
+
+    def op_open(self, name, kind='visa', options=None):
+        options = options or {}
+        with self.lock:
+            session = self.sessions.get(name)
+            if session is None:
+                if kind == 'serial':
+                    import serial
+                    handle = serial.Serial(name, **options)
+                else:
+                    handle = self.resource_manager().open_resource(name, **options)
+                session = self.sessions[name] = _Session(handle, kind, options)
+                self.stats['opens'] += 1
+            else:
+                # 開いたときと違う設定は黙って無視せずに断る
+                opened = dict(session.options)
+                mismatched = {key: value for key, value in options.items()
+                              if opened.get(key, getattr(session.handle, key, value)) != value}
+                if session.kind != kind or mismatched:
+                    raise BrokerError(f"{name} はすでに別の設定で開かれています "
+                                      f"(開いたときの設定: {opened}, 違う設定: {mismatched})")
+            session.clients += 1
+            return session.kind
+
+    def op_close(self, name):
+        with self.lock:
+            session = self.sessions.get(name)
+            if session is None:
+                return None
+            session.clients -= 1
+            if session.clients <= 0:
+                # 最後のクライアントが閉じたら装置も閉じる (他のプログラムが開けるように)
+                del self.sessions[name]
+                with session.lock:
+                    session.handle.close()
+            return session.clients
+
+    def op_set(self, name, attr, value):
+        if attr not in SETTABLE:
+            raise BrokerError(f"{attr} は変更できません")
+        session = self._session(name)
+        with session.lock:
+            setattr(session.handle, attr, value)
+
+    def op_get(self, name, attr):
+        if attr not in READABLE:
+            raise AttributeError(f"{attr} は読めません")
+        session = self._session(name)
+        with session.lock:
+            return getattr(session.handle, attr)
+
+    def op_write(self, name, command):
+        session = self._session(name)
+        with session.lock:
+            # 設定が変わるかもしれないので、設定値のキャッシュは捨てる
+            session.cache = {k: v for k, v in session.cache.items() if is_cacheable(k) == 'static'}
+            return session.handle.write(command)
+
+    def op_read(self, name):
+        session = self._session(name)
+        with session.lock:
+            return session.handle.read()
+
+    def op_query(self, name, command):
+        session = self._session(name)
+        with session.lock:
+            if command in session.cache:
+                self.stats['cache_hits'] += 1
+                return session.cache[command]
+            reply = session.handle.query(command)
+            if is_cacheable(command):
+                session.cache[command] = reply
+            return reply
+
+    def op_serial_write(self, name, data):
+        session = self._session(name)
+        with session.lock:
+            return session.handle.write(data)
+
+    def _serial_read(self, session, size=1, expected=None):
+        """ポートの timeout まで読みます。ロックは SLICE_S ごとに手放します。"""
+        handle = session.handle
+        with session.lock:
+            timeout = handle.timeout
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        data = bytearray()
+        while True:
+            remaining = SLICE_S if deadline is None else min(SLICE_S, deadline - time.perf_counter())
+            if remaining <= 0:
+                return bytes(data)
+            with session.lock:
+                slice_end = time.perf_counter() + remaining
+                saved, handle.timeout = handle.timeout, remaining
+                try:
+                    # 1 バイトずつ読む (終端の直後の、次の応答のバイトは読まない)
+                    while time.perf_counter() < slice_end:
+                        byte = handle.read(1)
+                        if not byte:
+                            break
+                        data += byte
+                        done = data.endswith(expected) if expected is not None else len(data) >= size
+                        if done:
+                            return bytes(data)
+                finally:
+                    handle.timeout = saved
+
+    def op_serial_read(self, name, size=1, expected=None):
+        return self._serial_read(self._session(name), size, expected)
+
+    def op_serial_query(self, name, data, expected=b'\r'):
+        """書き込みと応答の読み取りを、他のクライアントの query に割り込まれずに行います。"""
+        session = self._session(name)
+        with session.exchange:
+            with session.lock:
+                session.handle.write(data)
+            return self._serial_read(session, expected=expected)
+
+    def op_serial_in_waiting(self, name):
+        session = self._session(name)
+        with session.lock:
+            return session.handle.in_waiting
+
+    def op_serial_reset_input(self, name):
+        session = self._session(name)
+        with session.lock:
+            session.handle.reset_input_buffer()
+
+    def handle(self, request):
+        self.stats['requests'] += 1
+        op = getattr(self, 'op_' + request.pop('op'), None)
+        if op is None:
+            raise BrokerError("不明な要求です")
+        return op(**request)
+
+    # ---- 接続の受付 ----
+    def _serve_client(self, conn):
+        opened = []     # この接続が開いたままのリソース (接続が切れたら閉じる)
+        with conn:
+            while True:
+                try:
+                    request = conn.recv()
+                except (EOFError, OSError):
+                    break
+                op, name = request.get('op'), request.get('name')
+                try:
+                    conn.send({'ok': True, 'value': self.handle(request)})
+                except Exception as e:
+                    conn.send({'ok': False, 'error': type(e).__name__, 'message': str(e)})
+                    continue
+                if op == 'open':
+                    opened.append(name)
+                elif op == 'close' and name in opened:
+                    opened.remove(name)
+        for name in opened:
+            try:
+                self.op_close(name)
+            except Exception:
+                pass
+
+    def serve_forever(self):
+        with Listener(self.address, authkey=self.authkey) as listener:
+            print(f"instrument broker: {self.address[0]}:{self.address[1]}")
+            while True:
+                try:
+                    conn = listener.accept()
+                except (AuthenticationError, OSError):
+                    continue        # キーの違う接続は受け付けない (ブローカーは止めない)
+                threading.Thread(target=self._serve_client, args=(conn,), daemon=True).start()
+
+
+# -------------- クライアント --------------
+
+class BrokerClient:
+    """ブローカーへの 1 本の接続 (スレッドセーフ)"""
+
+    def __init__(self, address=(HOST, PORT), authkey=None):
+        self.conn = Client(address, authkey=authkey or load_authkey())
+        self.lock = threading.Lock()
+        self.telemetry = telemetry.default()
+
+    def call(self, op, **kwargs):
+        with self.lock, self.telemetry.timed(f'command_rtt.{op}'):
+            self.conn.send(dict(kwargs, op=op))
+            reply = self.conn.recv()
+        if not reply['ok']:
+            if reply['error'] == 'AttributeError':
+                # hasattr / getattr(obj, name, default) が普通のオブジェクトと同じに動くように
+                raise AttributeError(reply['message'])
+            raise BrokerError(f"{reply['error']}: {reply['message']}")
+        return reply['value']
+
+    def close(self):
+        self.conn.close()
+
+
+class RemoteResource:
+    """pyvisa の Resource と同じ呼び方ができる、ブローカー上のリソース"""
+
+    def __init__(self, client, name, **options):
+        object.__setattr__(self, '_client', client)
+        object.__setattr__(self, 'resource_name', name)
+        client.call('open', name=name, kind='visa', options=options or None)
+
+    def write(self, command):
+        return self._client.call('write', name=self.resource_name, command=command)
+
+    def read(self):
+        return self._client.call('read', name=self.resource_name)
+
+    def query(self, command):
+        return self._client.call('query', name=self.resource_name, command=command)
+
+    def close(self):
+        self._client.call('close', name=self.resource_name)
+
+    def __getattr__(self, attr):
+        if attr.startswith('_'):
+            raise AttributeError(attr)
+        return self._client.call('get', name=self.resource_name, attr=attr)
+
+    def __setattr__(self, attr, value):
+        self._client.call('set', name=self.resource_name, attr=attr, value=value)
+
+
+class RemoteSerial:
+    """serial.Serial の主な操作をブローカー経由で行うポート
+
+    複数のクライアントで共有するときは、write + read_until の代わりに query を使ってください。
+    """
+
+    def __init__(self, client, port, **options):
+        self._client = client
+        self.port = port
+        self.portstr = port
+        client.call('open', name=port, kind='serial', options=options or None)
+        self.is_open = True
+
+    def isOpen(self):
+        return self.is_open
+
+    @property
+    def timeout(self):
+        return self._client.call('get', name=self.port, attr='timeout')
+
+    @timeout.setter
+    def timeout(self, value):
+        self._client.call('set', name=self.port, attr='timeout', value=value)
+
+    def write(self, data):
+        return self._client.call('serial_write', name=self.port, data=bytes(data))
+
+    def read(self, size=1):
+        return self._client.call('serial_read', name=self.port, size=size)
+
+    def read_until(self, expected=b'\n'):
+        return self._client.call('serial_read', name=self.port, expected=expected)
+
+    def readline(self):
+        return self.read_until(b'\n')
+
+    def query(self, data, expected=b'\r'):
+        return self._client.call('serial_query', name=self.port, data=bytes(data), expected=expected)
+
+    @property
+    def in_waiting(self):
+        return self._client.call('serial_in_waiting', name=self.port)
+
+    def reset_input_buffer(self):
+        self._client.call('serial_reset_input', name=self.port)
+
+    def close(self):
+        if self.is_open:
+            self._client.call('close', name=self.port)
+            self.is_open = False
+
+
+class BrokerResourceManager:
+    """pyvisa.ResourceManager の代わり (リソースはブローカーが持つ)"""
+
+    def __init__(self, client=None):
+        self.client = client or BrokerClient()
+
+    def list_resources(self, query='?*::INSTR'):
+        return self.client.call('list_resources', query=query)
+
+    def open_resource(self, name, **options):
+        return RemoteResource(self.client, name, **options)
+
+    def open_serial(self, port, **options):
+        return RemoteSerial(self.client, port, **options)
+
+    def close(self):
+        self.client.close()
+
+
+def start_broker():
+    """ブローカーを別プロセスで起動し、接続できるまで待ちます。"""
+    kwargs = {}
+    if sys.platform == 'win32':
+        kwargs['creationflags'] = subprocess.CREATE_NEW_PROCESS_GROUP | subprocess.DETACHED_PROCESS
+    else:
+        kwargs['start_new_session'] = True
+    subprocess.Popen([sys.executable, os.path.abspath(__file__)],
+                     stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, **kwargs)
+    deadline = time.perf_counter() + START_TIMEOUT_S
+    while True:
+        try:
+            return BrokerClient()
+        except (ConnectionRefusedError, OSError):
+            if time.perf_counter() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+def connect(autostart=True):
+    """ブローカーに接続します。動いていなければ autostart=True のとき起動します。
+
+    認証キーの合わないブローカー (別のユーザーのもの) が動いているときは AuthenticationError です。
+    """
+    try:
+        return BrokerClient()
+    except (ConnectionRefusedError, OSError):
+        if not autostart:
+            raise
+        return start_broker()
+
+
+def resource_manager(autostart=True):
+    """ブローカー経由の ResourceManager を返します。使えなければ pyvisa.ResourceManager() を返します。"""
+    try:
+        return BrokerResourceManager(connect(autostart))
+    except (ConnectionRefusedError, OSError, AuthenticationError):
+        import pyvisa
+        return pyvisa.ResourceManager()
+
+
+def open_serial(port, autostart=True, **options):
+    """ブローカー経由のシリアルポートを返します。使えなければ serial.Serial(port, **options) を返します。"""
+    try:
+        return RemoteSerial(connect(autostart), port, **options)
+    except (ConnectionRefusedError, OSError, AuthenticationError):
+        import serial
+        return serial.Serial(port, **options)
+
+
+if __name__ == "__main__":
+    try:
+        Broker().serve_forever()
+    except KeyboardInterrupt:
+        pass
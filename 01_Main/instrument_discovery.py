@@ -0,0 +1,171 @@
+"""シリアルポートの自動検出 (どのポートにどの装置がつながっているか)
+
+● なにをする？
+    serial.tools.list_ports で見つかった全ポートを同時に (ポートごとに 1 スレッド) 調べ、
+    装置ごとの通信速度と問い合わせコマンドで応答を確かめます。
+    全体で timeout 秒以内に終わります (ポート数 × timeout にはならない)。
+
+● 調べる装置
+    DS102     : *IDN?  (38400 / 9600 baud)    応答に DS102 / DS112 / SURUGA を含む
+    MARK-202  : Q:     (9600 baud)            "位置,位置,K,K,R" の形の応答
+    ARDUINO   : ?      (9600 baud)            "SHUTTER" を含む応答
+                USB の情報 (VID 2341 / 2A03, 名前に Arduino) で分かるときはポートを開きません。
+                (開くとリセットされ、起動に BOOT_S 秒かかるため)
+
+● キャッシュ
+    見つけた対応表を ini/instrument_ports.json に保存します。
+    保存は前のキャッシュとの併合です。ほかのプログラムが開いていて調べられなかった (使用中の) ポートや、
+    今回つながっていないポートの記録は残し、調べて応答がなかったポートの記録だけを消します。
+    find_port('DS102') はまずキャッシュのポートだけを確かめ、違っていたときだけ全ポートを調べます。
+    キャッシュのポートが使用中のときは (ブローカーが開いているなど) キャッシュのとおりとみなします。
+
+● 使い方
+    python instrument_discovery.py               # 一覧を表示
+    port = instrument_discovery.find_port('ARDUINO')
+"""
+
+import json
+import os
+import re
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import serial
+import serial.tools.list_ports
+
+# ------------------ 設定 ------------------
+TIMEOUT_S = 3.0
+REPLY_S = 0.3          # 1 つの問い合わせの応答を待つ時間
+BOOT_S = 2.0           # Arduino はポートを開くとリセットされる
+CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'ini', 'instrument_ports.json')
+ARDUINO_VIDS = (0x2341, 0x2A03)
+
+Probe = namedtuple('Probe', 'device baudrate command terminator pattern boot_s')
+Found = namedtuple('Found', 'device port baudrate reply')
+BUSY = 'BUSY'          # identify の結果: ポートを開けなかった (使用中)
+
+PROBES = [
+    Probe('DS102', 38400, b'*IDN?\r', b'\r', re.compile(r'DS1[01]2|SURUGA', re.I), 0.0),
+    Probe('DS102', 9600, b'*IDN?\r', b'\r', re.compile(r'DS1[01]2|SURUGA', re.I), 0.0),
+    Probe('MARK-202', 9600, b'Q:\r\n', b'\r\n', re.compile(r'^\s*[-+]?\d+,\s*[-+]?\d+,[KLM],[KLM],[BR]'), 0.0),
+    Probe('ARDUINO', 9600, b'?\n', b'\n', re.compile(r'SHUTTER'), BOOT_S),
+]
+
+
+def is_arduino(info):
+    """USB の情報から Arduino かどうかを判定します (ポートは開かない)。"""
+    return getattr(info, 'vid', None) in ARDUINO_VIDS or 'arduino' in (info.description or '').lower()
+
+
+def _order(probes, first=None):
+    """キャッシュにある装置の問い合わせを先に、起動待ちのある問い合わせを最後にします。"""
+    return sorted(probes, key=lambda probe: (probe.device != first, probe.boot_s))
+
+
+def identify(info, probes=PROBES, deadline=None, first=None):
+    """1 つのポートを調べ、Found か None (応答なし) か BUSY (開けない) を返します。"""
+    if is_arduino(info):
+        return Found('ARDUINO', info.device, 9600, info.description)
+    deadline = deadline or time.perf_counter() + TIMEOUT_S
+    try:
+        ser = serial.Serial(info.device, probes[0].baudrate, timeout=0.1)
+    except (serial.SerialException, OSError):
+        return BUSY
+    opened_at = time.perf_counter()
+    try:
+        for probe in _order(probes, first):
+            if opened_at + probe.boot_s >= deadline:
+                continue
+            if ser.baudrate != probe.baudrate:
+                ser.baudrate = probe.baudrate
+            # 起動待ちが必要な装置は、ポートを開いてから boot_s 経つまで待つ
+            time.sleep(max(0.0, opened_at + probe.boot_s - time.perf_counter()))
+            ser.reset_input_buffer()
+            ser.write(probe.command)
+            ser.timeout = max(0.01, min(REPLY_S, deadline - time.perf_counter()))
+            raw = ser.read_until(probe.terminator)
+            reply = raw.decode('ascii', errors='replace').strip()
+            if raw.endswith(probe.terminator) and probe.pattern.search(reply):
+                return Found(probe.device, info.device, probe.baudrate, reply)
+    except (serial.SerialException, OSError):
+        pass
+    finally:
+        ser.close()
+    return None
+
+
+# ---- キャッシュ ----
+def load_cache(path=CACHE_PATH):
+    """{ポート: {'device', 'baudrate', 'hwid'}} を返します。"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cache(found, ports, path=CACHE_PATH, busy=()):
+    """今回の結果を前のキャッシュに併合して保存します。
+
+    ports は今回調べたポート (list_ports の情報)、busy はそのうち開けなかったポートです。
+    使用中のポートは、USB の情報 (hwid) が同じなら前の記録を残します。
+    """
+    hwids = {info.device: info.hwid for info in ports}
+    data = {port: entry for port, entry in load_cache(path).items()
+            if port not in hwids or (port in busy and entry.get('hwid') == hwids[port])}
+    data.update({item.port: {'device': item.device, 'baudrate': item.baudrate, 'hwid': hwids.get(item.port)}
+                 for item in found.values()})
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+def discover(timeout=TIMEOUT_S, probes=PROBES, cache_path=CACHE_PATH):
+    """全ポートを同時に調べ、{ポート: Found} を返します (キャッシュも更新します)。"""
+    ports = list(serial.tools.list_ports.comports())
+    if not ports:
+        return {}
+    cache = load_cache(cache_path)
+    deadline = time.perf_counter() + timeout
+    with ThreadPoolExecutor(max_workers=len(ports)) as pool:
+        futures = [pool.submit(identify, info, probes, deadline, cache.get(info.device, {}).get('device'))
+                   for info in ports]
+        results = [future.result() for future in futures]
+    found = {item.port: item for item in results if isinstance(item, Found)}
+    busy = {info.device for info, item in zip(ports, results) if item == BUSY}
+    save_cache(found, ports, cache_path, busy)
+    return found
+
+
+def find_port(device, timeout=TIMEOUT_S, cache_path=CACHE_PATH):
+    """device ('DS102' / 'MARK-202' / 'ARDUINO') のポート名を返します。見つからなければ None。"""
+    ports = {info.device: info for info in serial.tools.list_ports.comports()}
+    for port, entry in load_cache(cache_path).items():
+        info = ports.get(port)
+        if entry.get('device') != device or info is None or entry.get('hwid') != info.hwid:
+            continue
+        # キャッシュのポートだけを確かめる
+        probes = [probe for probe in PROBES if probe.device == device and probe.baudrate == entry.get('baudrate')]
+        if identify(info, probes or PROBES, time.perf_counter() + timeout, device) is not None:
+            return port             # 見つかった、または使用中 (キャッシュのとおりとみなす)
+    for item in discover(timeout, cache_path=cache_path).values():
+        if item.device == device:
+            return item.port
+    return None
+
+
+def main():
+    t0 = time.perf_counter()
+    found = discover()
+    for info in serial.tools.list_ports.comports():
+        item = found.get(info.device)
+        name = f"{item.device} ({item.baudrate} baud) {item.reply}" if item else "不明"
+        print(f"{info.device:8s} {name}")
+    if not found:
+        print("装置が見つかりませんでした")
+    print(f"({time.perf_counter() - t0:.2f} s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,908 @@
+"""装置シミュレータ (実機なしで TA 測定ループを動かす・計測するため)
+
+● なにをする？
+    次の装置をプロセス内で模擬し、pyserial / pyvisa / seabreeze と同じ形で見せます。
+    既存の制御コードは書き換えずにそのまま動きます。
+
+    - SURUGA DS102 / D220 (AXI1:POS?, AXI1:SB1?, PULS n:GO 0, GO ORG, STOP など)
+    - SIGMA MARK-202      (D:1S..F..R.., M:1+P18000, G:, Q:, !:)
+    - Arduino シャッター   ("steps,delay,dir" / "motor,steps,delay,dir")
+    - Ocean Optics 分光器  (USB4000 相当、遅延時間に応じた疑似 TA 信号付き)
+
+● 使い方
+    (1) スクリプトごと動かす
+        python instrument_sim.py ../cash/TA_Measure_original.py
+        python instrument_sim.py --speedup 10 main_suruga.py
+    (2) コードから使う (制御モジュールを import する前に install する)
+        import instrument_sim
+        bench = instrument_sim.install()
+        import serial, pyvisa          # ← 模擬モジュールが返る
+
+● 既定の接続先
+    COM1 : MARK-202 (ポンプ光シャッター)   COM3 : DS102   COM4 : Arduino シャッター
+    GPIB1::7::INSTR : D220 (遅延ステージ)
+    分光器 2 台 : SIM0001 (Sample), SIM0002 (Reference)
+
+● 遅延モデル
+    応答は「処理時間 + 送受信バイト数 × 1 バイトの転送時間 + ゆらぎ」だけ遅れて届きます。
+    ステージ・シャッターは設定速度 (pps) で動き、動作中は SB1? の 0x40 が立ちます。
+    speedup を大きくすると装置側の時間だけが速く進みます (制御側の sleep はそのまま)。
+"""
+
+import math
+import os
+import re
+import runpy
+import sys
+import threading
+import time
+import types
+from collections import deque
+
+import numpy as np
+
+# ------------------ 設定 ------------------
+SERIAL_BYTE_S = 10 / 9600      # 9600 baud, 8N1 の 1 バイトの転送時間
+GPIB_BYTE_S = 1e-6
+PS_PER_PULSE = 0.1 / 15        # TA_Measure の position_to_time と同じ換算
+SATURATION = 65535
+
+
+# -------------- 時計と遅延 --------------
+
+class SimClock:
+    """装置側の時計。speedup 倍の速さで進みます。"""
+
+    def __init__(self, speedup=1.0):
+        self.speedup = float(speedup)
+        self._t0 = time.perf_counter()
+
+    def now(self):
+        return (time.perf_counter() - self._t0) * self.speedup
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds / self.speedup)
+
+
+class LatencyModel:
+    """応答の遅れ = base + バイト数 × per_byte + ゆらぎ (正規分布, 0 以上)"""
+
+    def __init__(self, base, per_byte, jitter=0.0, seed=None):
+        self.base = base
+        self.per_byte = per_byte
+        self.jitter = jitter
+        self._rng = np.random.default_rng(seed)
+
+    def sample(self, nbytes):
+        delay = self.base + nbytes * self.per_byte
+        if self.jitter:
+            delay += abs(self._rng.normal(0.0, self.jitter))
+        return delay
+
+
+# -------------- 1 軸の動き --------------
+
+class _Axis:
+    """一定速度で動く 1 軸 (位置はパルス)"""
+
+    def __init__(self, clock, speed=1000, start_delay=0.005):
+        self.clock = clock
+        self.speed = float(speed)
+        self.start_delay = start_delay
+        self._pos = 0.0
+        self._motion = None      # (開始時刻, 開始位置, 速度 [pps], 目標位置 or None)
+        self._homing = False
+        self.origin = False
+        self.lock = threading.RLock()
+
+    def _update(self):
+        if self._motion is None:
+            return
+        t_start, p_start, velocity, target = self._motion
+        elapsed = max(0.0, self.clock.now() - t_start)
+        pos = p_start + velocity * elapsed
+        if target is not None and (pos - target) * math.copysign(1, velocity) >= 0:
+            self._pos = float(target)
+            self._motion = None
+            if self._homing:
+                self._homing = False
+                self.origin = True
+        else:
+            self._pos = pos
+
+    def position(self):
+        with self.lock:
+            self._update()
+            return int(round(self._pos))
+
+    def set_position(self, value):
+        with self.lock:
+            self._update()
+            self._pos = float(value)
+
+    @property
+    def moving(self):
+        with self.lock:
+            self._update()
+            return self._motion is not None
+
+    def move_to(self, target, homing=False):
+        with self.lock:
+            self._update()
+            self.origin = False
+            self._homing = homing
+            if target == self._pos:
+                self.origin = homing
+                return
+            velocity = math.copysign(max(self.speed, 1.0), target - self._pos)
+            self._motion = (self.clock.now() + self.start_delay, self._pos, velocity, float(target))
+
+    def move_by(self, pulses):
+        with self.lock:
+            self._update()
+            base = self._motion[3] if self._motion and self._motion[3] is not None else self._pos
+            self.move_to(base + pulses)
+
+    def jog(self, direction):
+        with self.lock:
+            self._update()
+            self.origin = False
+            self._motion = (self.clock.now() + self.start_delay, self._pos,
+                            direction * max(self.speed, 1.0), None)
+
+    def stop(self):
+        with self.lock:
+            self._update()
+            self._motion = None
+            self._homing = False
+
+    def remaining_time(self):
+        """止まるまでの残り時間 [s] (ジョグ中は inf)"""
+        with self.lock:
+            self._update()
+            if self._motion is None:
+                return 0.0
+            t_start, p_start, velocity, target = self._motion
+            if target is None:
+                return math.inf
+            return max(0.0, t_start - self.clock.now()) + abs(target - self._pos) / abs(velocity)
+
+
+# -------------- SURUGA DS102 / D220 --------------
+
+# (正規名, 短縮形, 完全形)  SCPI と同じく短縮形から完全形までの途中の綴りを受け付ける
+_DS102_KEYWORDS = [
+    ('AXI', 'AXI', 'AXIS'),
+    ('POS', 'POS', 'POSITION'),
+    ('PULS', 'PULS', 'PULSE'),
+    ('GO', 'GO', 'GO'),
+    ('GO', 'G', 'G'),
+    ('STOP', 'STOP', 'STOP'),
+    ('F0', 'F0', 'F0'),
+    ('F0', 'FSPEED0', 'FSPEED0'),
+    ('L0', 'L0', 'L0'),
+    ('L0', 'LSPEED0', 'LSPEED0'),
+    ('R0', 'R0', 'R0'),
+    ('R0', 'RATE0', 'RATE0'),
+    ('S0', 'S0', 'S0'),
+    ('S0', 'SRATE0', 'SRATE0'),
+    ('RESOLUT', 'RESOLUT', 'RESOLUTION'),
+    ('DRDIV', 'DRDIV', 'DRDIV'),
+    ('DRDIV', 'DRIVERDIVISION', 'DRIVERDIVISION'),
+    ('UNIT', 'UNIT', 'UNIT'),
+    ('SELSP', 'SELSP', 'SELSP'),
+    ('MEMSW0', 'MEMSW0', 'MEMSW0'),
+    ('SB1', 'SB1', 'SB1'),
+    ('SB2', 'SB2', 'SB2'),
+    ('SB3', 'SB3', 'SB3'),
+]
+
+
+def _ds102_keyword(word):
+    word = word.upper()
+    for canonical, short, full in _DS102_KEYWORDS:
+        if word.startswith(short) and full.startswith(word):
+            return canonical
+    return None
+
+
+class DS102Sim:
+    """SURUGA DS102 / D220 ステージコントローラ"""
+
+    terminator = '\r'
+
+    def __init__(self, clock, model='DS102', axes=2, latency=None, seed=None):
+        self.clock = clock
+        self.model = model
+        self.axes = [_Axis(clock) for _ in range(axes)]
+        self.params = [{'PULS': 0, 'L0': 100, 'R0': 100, 'S0': 100, 'RESOLUT': 1,
+                        'DRDIV': 0, 'UNIT': 0, 'SELSP': 0, 'MEMSW0': 0} for _ in range(axes)]
+        self.latency = latency or LatencyModel(0.004, SERIAL_BYTE_S, 0.0005, seed)
+        self.log = deque(maxlen=1000)   # 受信したコマンド (確認用)
+
+    def axis(self, number=1):
+        return self.axes[number - 1]
+
+    def handle(self, line):
+        """1 行分のコマンドを処理し、応答 (なければ None) を返します。"""
+        self.log.append(line)
+        if line.upper() == '*IDN?':
+            return f'SURUGA,{self.model},0,1.00'
+        if line.upper() in ('DS102VER?', 'VER?'):
+            return 'V1.00'
+        if line.upper() == 'CONTA?':
+            return str(len(self.axes))
+
+        reply = None
+        axis_no = 1
+        for token in line.split(':'):
+            token = token.strip()
+            if not token:
+                continue
+            match = re.match(r'([A-Za-z*]+)(\d*)(\??)\s*(.*)$', token)
+            if match is None:
+                continue
+            word, number, query, arg = match.groups()
+            name = _ds102_keyword(word + number) or _ds102_keyword(word)
+            if name == 'AXI':
+                axis_no = int(number or 1)
+                continue
+            if name is None or not 1 <= axis_no <= len(self.axes):
+                continue
+            if query:
+                reply = self._query(axis_no, name)
+            else:
+                self._command(axis_no, name, arg.strip())
+        return reply
+
+    def _query(self, axis_no, name):
+        axis = self.axis(axis_no)
+        if name == 'POS':
+            return str(axis.position())
+        if name == 'F0':
+            return str(int(axis.speed))
+        if name == 'SB1':
+            status = 0
+            if axis.moving:
+                status |= 0x40
+            elif axis.origin:
+                status |= 0x10
+            return str(status)
+        if name == 'SB2':
+            return '0'
+        if name == 'SB3':
+            return '1'       # 軸選択可能
+        if name in self.params[axis_no - 1]:
+            return str(self.params[axis_no - 1][name])
+        return None
+
+    def _command(self, axis_no, name, arg):
+        axis = self.axis(axis_no)
+        params = self.params[axis_no - 1]
+        if name == 'GO':
+            direction = arg.upper()
+            if direction == 'ORG':
+                axis.move_to(0, homing=True)
+            elif direction in ('CWJ', 'CCWJ'):
+                axis.jog(1 if direction == 'CWJ' else -1)
+            else:
+                sign = -1 if direction in ('1', 'CCW') else 1
+                axis.move_by(sign * params['PULS'])
+        elif name == 'STOP':
+            for each in self.axes:
+                each.stop()
+        elif name == 'POS':
+            axis.set_position(int(float(arg)))
+        elif name == 'F0':
+            axis.speed = float(arg)
+        elif name in params and arg:
+            params[name] = int(float(arg))
+
+
+# -------------- SIGMA MARK-202 --------------
+
+class Mark202Sim:
+    """SIGMA KOKI MARK-202 (2 軸パルスモーターコントローラ)"""
+
+    terminator = '\r\n'
+
+    def __init__(self, clock, latency=None, seed=None):
+        self.clock = clock
+        self.axes = [_Axis(clock, speed=5000), _Axis(clock, speed=5000)]
+        self._pending = [None, None]   # G: で動かす相対/絶対移動
+        self.latency = latency or LatencyModel(0.003, SERIAL_BYTE_S, 0.0005, seed)
+        self.log = deque(maxlen=1000)
+
+    def busy(self):
+        return any(axis.moving for axis in self.axes)
+
+    def _targets(self, selector):
+        return [0, 1] if selector.upper() == 'W' else [int(selector) - 1]
+
+    def handle(self, line):
+        self.log.append(line)
+        command, _, body = line.partition(':')
+        command = command.upper()
+        if command == 'Q':
+            p1, p2 = (axis.position() for axis in self.axes)
+            return f'{p1:>10},{p2:>10},K,K,{"B" if self.busy() else "R"}'
+        if command == '!':
+            return 'B' if self.busy() else 'R'
+        if command == 'D':
+            match = re.match(r'(\w)S(\d+)F(\d+)R(\d+)', body.upper())
+            if match:
+                for i in self._targets(match.group(1)):
+                    self.axes[i].speed = float(match.group(3))
+            return 'OK'
+        if command in ('M', 'A'):
+            moves = re.findall(r'([+-])P(\d+)', body.upper())
+            selector = body[:1]
+            for i, (sign, pulses) in zip(self._targets(selector), moves):
+                value = int(pulses) * (1 if sign == '+' else -1)
+                self._pending[i] = (command, value)
+            return 'OK'
+        if command == 'G':
+            for i, pending in enumerate(self._pending):
+                if pending is not None:
+                    kind, value = pending
+                    if kind == 'M':
+                        self.axes[i].move_by(value)
+                    else:
+                        self.axes[i].move_to(value)
+            self._pending = [None, None]
+            return 'OK'
+        if command == 'H':
+            for i in self._targets(body[:1] or 'W'):
+                self.axes[i].move_to(0, homing=True)
+            return 'OK'
+        if command == 'L':
+            for axis in self.axes:
+                axis.stop()
+            return 'OK'
+        if command == 'R':
+            for i in self._targets(body[:1] or 'W'):
+                self.axes[i].set_position(0)
+            return 'OK'
+        return 'NG'
+
+    def shutter_open(self):
+        """軸 1 の回転位置からポンプ光シャッターが開いているかを返します (0 で開, ±18000 で閉)"""
+        phase = self.axes[0].position() % 36000
+        return phase < 9000 or phase > 27000
+
+
+# -------------- Arduino シャッター --------------
+
+class ArduinoShutterSim:
+    """Arduino のステッピングモーター・シャッター (aruduino/arduino_code と同じ動作)
+
+    "motor,steps,delay,dir[,seq]\\n" (3 項目ならモーター 1) を受け付け、1 ステップ = 4 相 × delay [ms] で動かします。
+    コマンドは 1 つずつ順に処理し、動作が終わった時刻に "DONE motor position seq" を返します。
+    "P?" には "POS position1 ..."、"?" には "SHUTTER"、読めない行には "ERR ..." を返します。
+    motors はつながっているモーター (ファームウェアの既定はモーター 1 だけ)。
+    ack=False にすると応答を返さない旧ファームウェアとして動きます ("?" 以外)。
+    ポートを開くと boot_s 秒間リセット中で、その間の受信は捨てられます。
+    """
+
+    terminator = '\r\n'
+    STEPS_PER_REV = 512
+
+    def __init__(self, clock, latency=None, boot_s=2.0, ack=True, motors=(1,), seed=None):
+        self.clock = clock
+        self.latency = latency or LatencyModel(0.001, SERIAL_BYTE_S, 0.0002, seed)
+        self.boot_s = boot_s
+        self.ack = ack
+        self.motors = {motor: 0 for motor in motors}   # モーターごとの正味ステップ数
+        self._busy_until = 0.0
+        self._ready_at = 0.0
+        self.log = deque(maxlen=1000)
+
+    def on_open(self):
+        self._ready_at = self.clock.now() + self.boot_s
+
+    def busy(self):
+        return self.clock.now() < self._busy_until
+
+    def handle(self, line):
+        """応答は (文字列, 応答までの時間 [s]) で返します (前の動作が終わるまで次の行は読まれない)。"""
+        now = self.clock.now()
+        if now < self._ready_at:
+            return None                  # リセット中は受信できない
+        wait = max(0.0, self._busy_until - now)
+        line = line.strip()
+        if line == '?':
+            return 'SHUTTER', wait
+        if line == 'P?':
+            return ('POS ' + ' '.join(str(self.motors[m]) for m in sorted(self.motors)), wait) if self.ack else None
+        fields = [field.strip() for field in line.split(',')]
+        try:
+            seq = 0
+            if len(fields) == 5:
+                motor, steps, delay_ms, direction, seq = (int(float(f)) for f in fields)
+            elif len(fields) == 4:
+                motor, steps, delay_ms, direction = (int(float(f)) for f in fields)
+            elif len(fields) == 3:
+                motor = 1
+                steps, delay_ms, direction = (int(float(f)) for f in fields)
+            else:
+                raise ValueError(line)
+            if motor not in self.motors:
+                raise ValueError(line)
+        except ValueError:
+            return (f'ERR {line}', wait) if self.ack else None
+        self.log.append(line)
+        start = now + wait
+        self._busy_until = start + steps * 4 * delay_ms / 1000
+        self.motors[motor] += steps if direction == 1 else -steps
+        if not self.ack:
+            return None
+        return f'DONE {motor} {self.motors[motor]} {seq}', self._busy_until - now
+
+    def white_open(self):
+        return self.motors.get(1, 0) < 0 and not self.busy()
+
+    def pump_open(self):
+        return self.motors.get(2, 0) > 0 and not self.busy()
+
+
+# -------------- Ocean Optics 分光器 --------------
+
+class SimDevice:
+    """seabreeze.spectrometers.list_devices() が返す装置情報の代わり"""
+
+    def __init__(self, bench, index, serial_number, model='USB4000'):
+        self.bench = bench
+        self.index = index
+        self.serial_number = serial_number
+        self.model = model
+
+    def __repr__(self):
+        return f"<SeaBreezeDevice {self.model}:{self.serial_number}>"
+
+
+class SimSpectrometer:
+    """seabreeze.spectrometers.Spectrometer と同じ呼び方ができる疑似分光器
+
+    index 0 (Sample) はポンプ光が開いていると遅延時間に応じた ΔAbs ぶん暗くなります。
+    index 1 (Reference) はポンプ光の影響を受けません。
+    ランプの揺らぎは 2 台で共通なので、比を取ると打ち消されます。
+    """
+
+    def __init__(self, device):
+        self._device = device
+        self._bench = device.bench
+        self.model = device.model
+        self.serial_number = device.serial_number
+        self.pixels = 3648
+        self._wavelengths = np.linspace(340.0, 1030.0, self.pixels)
+        self._lamp = 40000.0 * np.exp(-0.5 * ((self._wavelengths - 600.0) / 120.0) ** 2)
+        self._integration_us = 10000
+        self._rng = np.random.default_rng(device.index + 1)
+        self._closed = False
+
+    @classmethod
+    def from_serial_number(cls, serial=None):
+        bench = _installed_bench()
+        for device in bench.devices:
+            if serial is None or device.serial_number == serial:
+                return cls(device)
+        raise RuntimeError(f"No unopened device found (serial={serial})")
+
+    @classmethod
+    def from_first_available(cls):
+        return cls.from_serial_number(None)
+
+    def wavelengths(self):
+        return self._wavelengths.copy()
+
+    def integration_time_micros(self, integration_time_micros):
+        self._integration_us = int(integration_time_micros)
+
+    @property
+    def integration_time_micros_limits(self):
+        return (10, 65000000)
+
+    def intensities(self, correct_dark_counts=False, correct_nonlinearity=False):
+        bench = self._bench
+        exposure = self._integration_us / 1e6
+        # 次の露光が終わるのを待つ (読み出し 2 ms を含む)
+        bench.clock.sleep(exposure + 0.002)
+        t = bench.clock.now()
+        signal = self._lamp * (exposure / 0.1) * bench.lamp_factor(t)
+        if self._device.index == 0 and bench.pump_open():
+            signal = signal * 10.0 ** (-bench.delta_abs(self._wavelengths))
+        counts = self._rng.poisson(np.clip(signal, 0, None)).astype(np.float64)
+        counts += self._rng.normal(1500.0, 10.0, self.pixels)
+        if correct_dark_counts:
+            counts -= 1500.0
+        return np.clip(counts, 0, SATURATION)
+
+    def spectrum(self, correct_dark_counts=False, correct_nonlinearity=False):
+        return np.vstack((self.wavelengths(), self.intensities(correct_dark_counts, correct_nonlinearity)))
+
+    def close(self):
+        self._closed = True
+
+
+# -------------- 装置一式 --------------
+
+class SimBench:
+    """模擬装置一式とポート・VISA リソースの対応表
+
+    pump_source : ポンプ光シャッターとして使う装置 ('mark202' または 'arduino')
+    time_zero   : 時間原点のステージ位置 [pulse]
+    tau_ps      : 疑似 TA 信号の減衰時定数 [ps]
+    """
+
+    def __init__(self, speedup=1.0, pump_source='mark202', time_zero=0, tau_ps=50.0, seed=None):
+        self.clock = SimClock(speedup)
+        self.mark202 = Mark202Sim(self.clock, seed=seed)
+        self.ds102 = DS102Sim(self.clock, 'DS102', seed=seed)
+        self.d220 = DS102Sim(self.clock, 'D220', axes=1,
+                             latency=LatencyModel(0.0015, GPIB_BYTE_S, 0.0002, seed))
+        # ポンプを Arduino で開け閉めするときは、モーター 2 の配線を足したファームウェアを想定する
+        self.arduino = ArduinoShutterSim(self.clock, motors=(1, 2) if pump_source == 'arduino' else (1,), seed=seed)
+        self.pump_source = pump_source
+        self.time_zero = time_zero
+        self.tau_ps = tau_ps
+        self.ports = {'COM1': self.mark202, 'COM3': self.ds102, 'COM4': self.arduino}
+        self.resources = {'GPIB1::7::INSTR': self.d220}
+        self.devices = [SimDevice(self, 0, 'SIM0001'), SimDevice(self, 1, 'SIM0002')]
+
+    def delay_stage(self):
+        return self.d220.axis(1)
+
+    def pump_open(self):
+        if self.pump_source == 'arduino':
+            return self.arduino.pump_open()
+        return self.mark202.shutter_open()
+
+    def lamp_factor(self, t):
+        """2 台共通のランプ強度の揺らぎ"""
+        return 1.0 + 0.01 * math.sin(2 * math.pi * t / 7.0) + 0.003 * math.sin(2 * math.pi * t / 0.37)
+
+    def delta_abs(self, wavelengths):
+        """現在の遅延時間での疑似 ΔAbs (励起状態吸収 650 nm, 基底状態ブリーチ 500 nm)"""
+        t_ps = (self.delay_stage().position() - self.time_zero) * PS_PER_PULSE
+        rise = 0.5 * (1 + math.tanh(t_ps / 0.2))
+        decay = math.exp(-max(t_ps, 0.0) / self.tau_ps)
+        band = (0.010 * np.exp(-0.5 * ((wavelengths - 650.0) / 40.0) ** 2)
+                - 0.006 * np.exp(-0.5 * ((wavelengths - 500.0) / 30.0) ** 2))
+        return rise * decay * band
+
+
+# -------------- pyserial 風インターフェース --------------
+
+class SerialException(IOError):
+    pass
+
+
+class SerialTimeoutException(SerialException):
+    pass
+
+
+class _Link:
+    """制御側と模擬装置の間の受信バッファ (応答は届く時刻つき)"""
+
+    def __init__(self, device, clock, byte_s):
+        self.device = device
+        self.clock = clock
+        self.byte_s = byte_s
+        self._rx = b''
+        self._incoming = []      # (届く時刻, bytes)
+        self._partial = ''
+        self._cond = threading.Condition()
+
+    def send(self, data):
+        self._partial += data.decode('utf-8', errors='replace')
+        lines = re.split(r'\r\n|\r|\n', self._partial)
+        self._partial = lines.pop()
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            reply = self.device.handle(line)
+            delay = 0.0
+            if isinstance(reply, tuple):
+                reply, delay = reply     # 動作が終わってから返す応答
+            nbytes = len(line) + 1 + (len(reply) + len(self.device.terminator) if reply is not None else 0)
+            ready = self.clock.now() + self.device.latency.sample(nbytes) + delay
+            if reply is not None:
+                with self._cond:
+                    self._incoming.append((ready, (reply + self.device.terminator).encode()))
+                    self._incoming.sort(key=lambda item: item[0])
+                    self._cond.notify_all()
+
+    def _collect(self):
+        now = self.clock.now()
+        while self._incoming and self._incoming[0][0] <= now:
+            self._rx += self._incoming.pop(0)[1]
+
+    def available(self):
+        with self._cond:
+            self._collect()
+            return len(self._rx)
+
+    def take(self, predicate, timeout):
+        """predicate(buffer) が切り出す長さを返すまで待ち、その分を返します。"""
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        with self._cond:
+            while True:
+                self._collect()
+                n = predicate(self._rx)
+                if n:
+                    data, self._rx = self._rx[:n], self._rx[n:]
+                    return data
+                remaining = None if deadline is None else deadline - time.perf_counter()
+                if remaining is not None and remaining <= 0:
+                    data, self._rx = self._rx, b''
+                    return data
+                wait = remaining
+                if self._incoming:
+                    until = (self._incoming[0][0] - self.clock.now()) / self.clock.speedup
+                    wait = until if wait is None else min(wait, until)
+                self._cond.wait(max(wait, 0.0) if wait is not None else None)
+
+    def clear(self):
+        with self._cond:
+            self._collect()
+            self._rx = b''
+
+
+class SimSerial:
+    """serial.Serial と同じ呼び方ができる模擬ポート"""
+
+    bench = None
+
+    def __init__(self, port=None, baudrate=9600, timeout=None, **kwargs):
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.write_timeout = kwargs.get('write_timeout')
+        self._link = None
+        if port is not None:
+            self.open()
+
+    @property
+    def portstr(self):
+        return self.port
+
+    @property
+    def name(self):
+        return self.port
+
+    @property
+    def is_open(self):
+        return self._link is not None
+
+    def isOpen(self):
+        return self.is_open
+
+    def open(self):
+        device = self.bench.ports.get(self.port)
+        if device is None:
+            raise SerialException(f"could not open port '{self.port}': FileNotFoundError")
+        if hasattr(device, 'on_open'):
+            device.on_open()
+        self._link = _Link(device, self.bench.clock, 10 / self.baudrate)
+
+    def close(self):
+        self._link = None
+
+    def _require_open(self):
+        if self._link is None:
+            raise SerialException("Attempting to use a port that is not open")
+
+    def write(self, data):
+        self._require_open()
+        self._link.send(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    @property
+    def in_waiting(self):
+        self._require_open()
+        return self._link.available()
+
+    def inWaiting(self):
+        return self.in_waiting
+
+    def read(self, size=1):
+        self._require_open()
+        return self._link.take(lambda rx: size if len(rx) >= size else 0, self.timeout)
+
+    def read_until(self, expected=b'\n', size=None):
+        self._require_open()
+
+        def until(rx):
+            i = rx.find(expected)
+            if i >= 0:
+                return i + len(expected) if size is None else min(i + len(expected), size)
+            return size if size is not None and len(rx) >= size else 0
+        return self._link.take(until, self.timeout)
+
+    def readline(self, size=None):
+        return self.read_until(b'\n', size)
+
+    def reset_input_buffer(self):
+        self._require_open()
+        self._link.clear()
+
+    flushInput = reset_input_buffer
+
+    def reset_output_buffer(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SimPortInfo:
+    """serial.tools.list_ports.comports() の要素の代わり"""
+
+    def __init__(self, device, description):
+        self.device = device
+        self.name = device
+        self.description = description
+        self.hwid = f'SIM::{device}'
+
+    def __iter__(self):
+        return iter((self.device, self.description, self.hwid))
+
+
+# -------------- pyvisa 風インターフェース --------------
+
+class VisaIOError(IOError):
+    pass
+
+
+class SimResource:
+    """pyvisa の Resource (write / read / query) の代わり"""
+
+    def __init__(self, bench, name):
+        self.bench = bench
+        self.resource_name = name
+        self.timeout = 2000          # ms
+        self.read_termination = None
+        self.write_termination = '\r\n'
+        self._link = _Link(bench.resources[name], bench.clock, GPIB_BYTE_S)
+
+    def write(self, message):
+        self._link.send((message + '\n').encode())
+        return len(message)
+
+    def read(self):
+        terminator = self._link.device.terminator.encode()
+
+        def until(rx):
+            i = rx.find(terminator)
+            return i + len(terminator) if i >= 0 else 0
+        data = self._link.take(until, self.timeout / 1000)
+        if not data.endswith(terminator):
+            raise VisaIOError("VI_ERROR_TMO (-1073807339): Timeout expired before operation completed.")
+        return data.decode().rstrip('\r\n')
+
+    def query(self, message):
+        self.write(message)
+        return self.read()
+
+    def clear(self):
+        self._link.clear()
+
+    def close(self):
+        pass
+
+
+class SimResourceManager:
+    """pyvisa.ResourceManager の代わり"""
+
+    bench = None
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def list_resources(self, query='?*::INSTR'):
+        return tuple(self.bench.resources)
+
+    def open_resource(self, name, **kwargs):
+        if name not in self.bench.resources:
+            raise VisaIOError(f"VI_ERROR_RSRC_NFOUND: {name}")
+        resource = SimResource(self.bench, name)
+        for key, value in kwargs.items():
+            setattr(resource, key, value)
+        return resource
+
+    def close(self):
+        pass
+
+
+# -------------- 差し替え --------------
+
+_bench = None
+
+
+def _installed_bench():
+    if _bench is None:
+        raise RuntimeError("instrument_sim.install() が呼ばれていません")
+    return _bench
+
+
+def install(bench=None, **options):
+    """serial / pyvisa / seabreeze を模擬モジュールに差し替えて SimBench を返します。
+
+    制御コードを import する前に呼んでください。options は SimBench に渡します。
+    """
+    global _bench
+    _bench = bench = bench or SimBench(**options)
+
+    serial_mod = types.ModuleType('serial')
+    serial_mod.Serial = type('Serial', (SimSerial,), {'bench': bench})
+    serial_mod.SerialException = SerialException
+    serial_mod.SerialTimeoutException = SerialTimeoutException
+    serial_mod.PARITY_NONE, serial_mod.PARITY_EVEN, serial_mod.PARITY_ODD = 'N', 'E', 'O'
+    serial_mod.EIGHTBITS, serial_mod.SEVENBITS = 8, 7
+    serial_mod.STOPBITS_ONE, serial_mod.STOPBITS_TWO = 1, 2
+    tools_mod = types.ModuleType('serial.tools')
+    list_ports_mod = types.ModuleType('serial.tools.list_ports')
+    descriptions = {'COM1': 'MARK-202 (sim)', 'COM3': 'DS102 (sim)', 'COM4': 'Arduino Uno (sim)'}
+    list_ports_mod.comports = lambda *args, **kwargs: [
+        SimPortInfo(port, descriptions.get(port, 'sim')) for port in bench.ports]
+    tools_mod.list_ports = list_ports_mod
+    serial_mod.tools = tools_mod
+
+    visa_mod = types.ModuleType('pyvisa')
+    visa_mod.ResourceManager = type('ResourceManager', (SimResourceManager,), {'bench': bench})
+    visa_mod.VisaIOError = VisaIOError
+    errors_mod = types.ModuleType('pyvisa.errors')
+    errors_mod.VisaIOError = VisaIOError
+    visa_mod.errors = errors_mod
+
+    seabreeze_mod = types.ModuleType('seabreeze')
+    seabreeze_mod.use = lambda backend, **kwargs: None
+    spectrometers_mod = types.ModuleType('seabreeze.spectrometers')
+    spectrometers_mod.list_devices = lambda: list(bench.devices)
+    spectrometers_mod.Spectrometer = SimSpectrometer
+    seabreeze_mod.spectrometers = spectrometers_mod
+
+    sys.modules.update({
+        'serial': serial_mod,
+        'serial.tools': tools_mod,
+        'serial.tools.list_ports': list_ports_mod,
+        'pyvisa': visa_mod,
+        'pyvisa.errors': errors_mod,
+        'visa': visa_mod,
+        'seabreeze': seabreeze_mod,
+        'seabreeze.spectrometers': spectrometers_mod,
+    })
+    return bench
+
+
+def main(argv=None):
+    """python instrument_sim.py [--speedup N] [--pump mark202|arduino] script.py [引数...]"""
+    args = list(sys.argv[1:] if argv is None else argv)
+    options = {}
+    while args and args[0].startswith('--'):
+        flag = args.pop(0)
+        if flag == '--speedup':
+            options['speedup'] = float(args.pop(0))
+        elif flag == '--pump':
+            options['pump_source'] = args.pop(0)
+        else:
+            raise SystemExit(f"不明なオプション: {flag}")
+    if not args:
+        raise SystemExit(main.__doc__)
+    install(**options)
+    script = args[0]
+    sys.argv = args
+    sys.path.insert(0, os.path.dirname(os.path.abspath(script)))
+    runpy.run_path(script, run_name='__main__')
+
+
+if __name__ == "__main__":
+    main()
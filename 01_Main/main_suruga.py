@@ -12,10 +12,14 @@ import tkinter as tk
 import tkinter.ttk as ttk
 from tkinter import messagebox
 
+import ds102_transport
+import instrument_discovery
+
 axisNo = '1'            # 軸番号
 direction = 'CCW'       # 駆動方向設定(-(CCW)、+(CW))
 mode = 0                # 駆動方法(0: 連続駆動、1: ステップ駆動、2: 原点復帰)
 ser = serial.Serial()
+transport = None        # ds102_transport.DS102Transport (接続後に作成)
 
 
 # 接続ボタンを押した時の処理
@@ -25,7 +29,7 @@ def connect_button_click(event):
 
 # 通信ポートを設定する
 def comm_port_open():
-    global ser
+    global ser, transport
 
     if ser.is_open:
         ser.close()
@@ -37,6 +41,7 @@ def comm_port_open():
         lblState['text'] = '接続エラー発生'
         root.after(1, showerror('接続エラー発生'))
         return
+    transport = ds102_transport.DS102Transport(ser)
 
     # ---------------------------------------------------------
     # ID要求
@@ -330,15 +335,20 @@ def update_status():
     # ---------------------------------------------------------
     # ステータス3要求
     # ---------------------------------------------------------
-    r_data = serial_write_read(('AXI' + axisNo + ':SB3?' + '\r').encode('utf-8'))
+    # ステータス1要求・現在位置要求もまとめて送り、1 往復で受け取る
+    try:
+        replies = serial_query_many(['AXI' + axisNo + ':SB3?', 'AXI' + axisNo + ':SB1?', 'AXI' + axisNo + ':POS?'])
+    except ds102_transport.TransportTimeout:
+        replies = None
+    if replies is None:
+        status = 'Stop'
+        return status
+    r_data, sb1_data, pos_data = replies
 
     # 数値に変換できなければ終了する
     try:
-        if r_data is not None:
-            int(r_data)
-        else:
-            status = 'Stop'
-            return status
+        int(r_data)
+        int(sb1_data)
     except ValueError:
         status = 'Stop'
         return status
@@ -349,9 +359,9 @@ def update_status():
         return status
     else:
         # ---------------------------------------------------------
-        # ステータス1要求
+        # ステータス1 (まとめて受信済み)
         # ---------------------------------------------------------
-        r_data = serial_write_read(('AXI' + axisNo + ':SB1?' + '\r').encode('utf-8'))
+        r_data = sb1_data
 
         if int(r_data) & 0x40 == 0x40:
             lblState['text'] = '動作中'
@@ -381,9 +391,9 @@ def update_status():
             status = 'Stop'
 
         # ---------------------------------------------------------
-        # 現在位置要求
+        # 現在位置 (まとめて受信済み)
         # ---------------------------------------------------------
-        r_data = serial_write_read(('AXI' + axisNo + ':POS?' + '\r').encode('utf-8'))
+        r_data = pos_data
         txtPosition.delete(0, tk.END)
         txtPosition.insert(tk.END, r_data)
 
@@ -393,17 +403,22 @@ def update_status():
 # 送信
 def serial_write(write_data):
     if ser.isOpen():
-        ser.write(write_data)
+        transport.write(write_data.decode('utf-8').rstrip('\r'))
 
 
-# 送受信
+# 送受信 (応答の終端が届いたらすぐ戻る)
 def serial_write_read(write_data):
     if ser.isOpen():
-        ser.write(write_data)
-        time.sleep(0.1)
-        read_data = ser.read_until(b'\r')
+        try:
+            return transport.query(write_data.decode('utf-8').rstrip('\r'))
+        except ds102_transport.TransportTimeout:
+            return None
 
-        return read_data
+
+# まとめて送受信 (応答をリストで返す)
+def serial_query_many(commands):
+    if ser.isOpen():
+        return transport.query_many(commands)
 
 
 # ポジション設定ボタンを押した時の処理
@@ -574,12 +589,12 @@ if __name__ == '__main__':
     lblCommPort = tk.Label(frameCommPort, text=u'通信ポート：', width=10)
     lblCommPort.pack(side=tk.LEFT)
 
-    port = ['COM1', 'COM2', 'COM3', 'COM4', 'COM5', 'COM6', 'COM7',
-            'COM8', 'COM9', 'COM10', 'COM11', 'COM12', 'COM13', 'COM14',
-            'COM15', 'COM16', 'COM17', 'COM18', 'COM19', 'COM20']
+    # 接続されているポートを並べ、DS102 が見つかったポートを選んでおく
+    port = [info.device for info in serial.tools.list_ports.comports()] or ['COM1']
+    ds102_port = instrument_discovery.find_port('DS102')
     portList = tk.StringVar()
     cmbCommPort = ttk.Combobox(frameCommPort, values=port, textvariable=portList, width=10)
-    cmbCommPort.set(port[0])
+    cmbCommPort.set(ds102_port or port[0])
     cmbCommPort.pack(side=tk.LEFT)
 
     btnConnect = tk.Button(frameCommPort, text=u'接続', width=20, height=1)
@@ -595,7 +610,8 @@ if __name__ == '__main__':
     baudrate = ['38400', '19200', '9600', '4800']
     baudrateList = tk.StringVar()
     cmbBaudrate = ttk.Combobox(frameBaudrate, values=baudrate, textvariable=baudrateList, width=10)
-    cmbBaudrate.set(baudrate[0])
+    ds102_baudrate = instrument_discovery.load_cache().get(ds102_port, {}).get('baudrate')
+    cmbBaudrate.set(str(ds102_baudrate) if ds102_port and ds102_baudrate else baudrate[0])
     cmbBaudrate.pack(side=tk.LEFT)
 
     btnDisconnect = tk.Button(frameBaudrate, text=u'切断', width=20, height=1)
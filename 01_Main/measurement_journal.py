@@ -0,0 +1,169 @@
+"""測定ジャーナル (途中で止まっても測定済みの点を失わない記録)
+
+● なにをする？
+    遅延点を 1 つ測るたびに、生スペクトル・ステージ位置・時刻を追記し、os.fsync でディスクに書きます。
+    PC や Python が落ちても、ジャーナルには最後に書き終えた点までが残ります。
+    resume ではジャーナルを読み直し、測定済みの点は測り直さずに続きから測定します。
+
+● ファイルの形 (*.tasj, リトルエンディアン)
+    先頭      : b'TASJ' + バージョン (uint16)
+    レコード  : 種類 (uint8) + 長さ (uint32) + CRC32 (uint32) + 中身
+        PLAN  : 測定計画 (JSON)  ループ回数・各点のステップ幅・露光時間・積算回数・ブックのパス
+        POINT : 点の番号 (uint32), ステージ位置 (int64), 遅延時間 [ps] (float64), 時刻 [ns] (int64),
+                チャンネル数 (uint16), 各チャンネル = 点数 (uint32) + float64 の配列
+                チャンネルは wl_sam, sam_excited, wl_ref, ref_excited, sam, ref の順
+        END   : 測定終了 (JSON)
+    書き込み途中で止まった最後のレコード (長さ不足・CRC 不一致) は読み飛ばし、再開時に切り詰めます。
+
+● 使い方
+    journal = Journal.create(path, plan)
+    journal.append_point(i, position, position_to_time, channels)
+    journal.finish({'elapsed_s': ...})
+
+    journal = Journal.open(path)          # 再開
+    journal.plan, journal.completed(), journal.points[i]
+"""
+
+import json
+import os
+import struct
+import time
+import zlib
+from collections import namedtuple
+
+import numpy as np
+
+MAGIC = b'TASJ'
+VERSION = 1
+PLAN, POINT, END = 1, 2, 3
+CHANNELS = ('wl_sam', 'sam_excited', 'wl_ref', 'ref_excited', 'sam', 'ref')
+
+_FILE_HEADER = struct.Struct('<4sH')
+_RECORD = struct.Struct('<BII')
+_POINT = struct.Struct('<IqdqH')
+
+Point = namedtuple('Point', 'index position position_to_time timestamp_ns channels')
+
+
+class JournalError(IOError):
+    """ジャーナルとして読めないファイル"""
+
+
+def _encode_point(index, position, position_to_time, timestamp_ns, channels):
+    parts = [_POINT.pack(index, int(position), float(position_to_time), timestamp_ns, len(channels))]
+    for values in channels:
+        values = np.ascontiguousarray(values, dtype='<f8')
+        parts.append(struct.pack('<I', len(values)))
+        parts.append(values.tobytes())
+    return b''.join(parts)
+
+
+def _decode_point(payload):
+    index, position, position_to_time, timestamp_ns, n = _POINT.unpack_from(payload)
+    offset = _POINT.size
+    channels = []
+    for _ in range(n):
+        (length,) = struct.unpack_from('<I', payload, offset)
+        offset += 4
+        channels.append(np.frombuffer(payload, dtype='<f8', count=length, offset=offset).copy())
+        offset += 8 * length
+    return Point(index, position, position_to_time, timestamp_ns, tuple(channels))
+
+
+def read_records(f):
+    """(種類, 中身, 終わりの位置) を順に返します。壊れたレコードの手前で止まります。"""
+    header = f.read(_FILE_HEADER.size)
+    if len(header) < _FILE_HEADER.size or _FILE_HEADER.unpack(header)[0] != MAGIC:
+        raise JournalError(f"{getattr(f, 'name', '')}: 測定ジャーナルではありません")
+    while True:
+        head = f.read(_RECORD.size)
+        if len(head) < _RECORD.size:
+            return
+        kind, length, crc = _RECORD.unpack(head)
+        payload = f.read(length)
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            return
+        yield kind, payload, f.tell()
+
+
+class Journal:
+    """追記専用の測定ジャーナル"""
+
+    def __init__(self, path, f, plan, points=None, finished=None):
+        self.path = path
+        self._f = f
+        self.plan = plan
+        self.points = points or {}
+        self.finished = finished
+
+    @classmethod
+    def create(cls, path, plan):
+        """新しいジャーナルを作り、測定計画を書き込みます。"""
+        f = open(path, 'xb')
+        f.write(_FILE_HEADER.pack(MAGIC, VERSION))
+        journal = cls(path, f, plan)
+        journal._append(PLAN, json.dumps(plan, ensure_ascii=False).encode('utf-8'))
+        return journal
+
+    @classmethod
+    def read(cls, path):
+        """ジャーナルを読みます (ファイルは変更しません)。(plan, points, finished, 有効な長さ) を返します。"""
+        plan, points, finished, end = None, {}, None, _FILE_HEADER.size
+        with open(path, 'rb') as f:
+            for kind, payload, end in read_records(f):
+                if kind == PLAN:
+                    plan = json.loads(payload.decode('utf-8'))
+                elif kind == POINT:
+                    point = _decode_point(payload)
+                    points[point.index] = point
+                elif kind == END:
+                    finished = json.loads(payload.decode('utf-8'))
+        if plan is None:
+            raise JournalError(f"{path}: 測定計画がありません")
+        return plan, points, finished, end
+
+    @classmethod
+    def open(cls, path):
+        """続きを書くためにジャーナルを開きます (壊れた末尾は切り詰めます)。"""
+        plan, points, finished, end = cls.read(path)
+        f = open(path, 'r+b')
+        f.truncate(end)
+        f.seek(end)
+        return cls(path, f, plan, points, finished)
+
+    def _append(self, kind, payload):
+        self._f.write(_RECORD.pack(kind, len(payload), zlib.crc32(payload)) + payload)
+        self._f.flush()
+        os.fsync(self._f.fileno())
+
+    def append_point(self, index, position, position_to_time, channels, timestamp_ns=None):
+        """1 点分を書き込み、ディスクに書き終えてから戻ります。"""
+        timestamp_ns = time.time_ns() if timestamp_ns is None else timestamp_ns
+        self._append(POINT, _encode_point(index, position, position_to_time, timestamp_ns, channels))
+        self.points[index] = Point(index, int(position), float(position_to_time), timestamp_ns,
+                                   tuple(np.asarray(values, dtype=np.float64) for values in channels))
+
+    def finish(self, summary=None):
+        """測定の終了を書き込みます。"""
+        self.finished = summary or {}
+        self._append(END, json.dumps(self.finished, ensure_ascii=False).encode('utf-8'))
+
+    def completed(self):
+        """測定済みの点の番号 (昇順)"""
+        return sorted(self.points)
+
+    def next_index(self):
+        """次に測る点の番号 (途中が抜けていれば、その最初の番号)"""
+        index = 0
+        while index in self.points:
+            index += 1
+        return index
+
+    def close(self):
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,90 @@
+"""測定ループのパイプライン化
+
+● なにをする？
+    遅延点ごとの処理を「取得 (装置)」と「解析・保存 (PC)」に分け、
+    解析・保存はワーカースレッドで行います。測定ループは取得が終わったらすぐに
+    次のステージ移動を始められます。
+
+        測定ループ : 取得 → 移動開始 → 取得 → 移動開始 → ...
+        解析       :        analyze(i) (workers 本のスレッド)
+        保存       :        persist(i) (1 本のスレッド, 点の順番どおり)
+
+● 流量制御
+    解析待ち・保存待ちの点が maxsize 個たまると submit が待ちます (メモリが増え続けない)。
+
+● エラー
+    analyze / persist で起きた例外は、次の submit か close で測定ループ側に投げ直します。
+"""
+
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+_STOP = object()
+
+
+class MeasurementPipeline:
+    """取得済みデータの解析・保存をバックグラウンドで行うパイプライン"""
+
+    def __init__(self, analyze, persist, workers=2, maxsize=4):
+        self.analyze = analyze
+        self.persist = persist
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='analyze')
+        self._queue = queue.Queue(maxsize=maxsize)   # (番号, Future) を投入順に保持
+        self._error = None
+        self._writer = threading.Thread(target=self._write_loop, name='persist', daemon=True)
+        self._writer.start()
+
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _STOP:
+                    return
+                index, future = item
+                if self._error is None:
+                    self.persist(index, future.result())
+            except BaseException as e:
+                if self._error is None:
+                    self._error = e
+            finally:
+                self._queue.task_done()
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise self._error
+
+    def submit(self, index, raw):
+        """取得データを渡します。待ちがいっぱいのときは空くまで待ちます。"""
+        self._raise_error()
+        future = self._pool.submit(self.analyze, index, raw)
+        self._queue.put((index, future))
+
+    def drain(self):
+        """渡したデータがすべて保存されるまで待ちます。"""
+        self._queue.join()
+        self._raise_error()
+
+    def close(self):
+        """残りを保存し終えてからスレッドを止めます。"""
+        try:
+            self._queue.join()
+        finally:
+            self._queue.put(_STOP)
+            self._writer.join()
+            self._pool.shutdown()
+        self._raise_error()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            # 測定側で例外が起きたときも、取得済みの点は保存しておく
+            try:
+                self.close()
+            except Exception:
+                pass
+
@@ -13,78 +13,69 @@
 
 ※ 積算時間: 4 ms  (両機共通)
 ※ 開始時刻差 = 終了時刻差 なので終了時刻を利用
+※ 取得は paired_acquisition の常駐スレッドで行う (Barrier でそろえて開始し、
+   perf_counter_ns で取得の前後を記録)。毎回スレッドに投げる揺らぎは入らない
+※ ずれそのものを測るので、組にする許容差は MAX_SKEW_MS まで広げる
+   (既定の露光時間の半分だと、大きくずれた回が組にならず統計から消える)
 """
 
+import queue
 import sys
-import time
-from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 import matplotlib.pyplot as plt
-import seabreeze
-from seabreeze.spectrometers import list_devices, Spectrometer
+
+from spectrometer_backend import SpectrometerError, open_spectrometers
+from paired_acquisition import PairedAcquisition
+import telemetry
 
 # ------------------ 設定 ------------------
-BACKENDS = ["cseabreeze", "pyseabreeze"]
 NEEDED   = 2      # 必要台数
 INT_MS   = 100    # 積算時間 [ms]
 ITER     = 20    # 測定回数
+MAX_SKEW_MS = 10_000  # これ以上ずれた回だけ組にしない [ms]
 
 
-# -------------- バックエンド選択 --------------
-
-def pick_backend(required=NEEDED):
-    best, best_be = [], None
-
-
-    for be in BACKENDS:
-        try:
-            seabreeze.use(be)
-        except Exception:
-            continue
-        devs = list_devices()
-        if len(devs) >= required:
-            return be, devs
-        if len(devs) > len(best):
-            best, best_be = devs, be
-    return best_be, best
-
-# ---------------- 測定関数 ----------------
-
-def acquire(spec: Spectrometer):
-    t_cmd = time.perf_counter()
-    _ = spec.spectrum()
-    t_fin = time.perf_counter()
-    return t_cmd, t_fin
-
 # ----------------- メイン -----------------
 
 def main():
-    be, devs = pick_backend()
-    if not be or len(devs) < NEEDED:
-        print("[ERROR] 分光器を 2 台検出できません")
+    try:
+        specs = open_spectrometers(NEEDED)  # シリアル順で固定 (list_devices 順序)
+    except SpectrometerError as e:
+        print(f"[ERROR] {e}")
         sys.exit(1)
 
-    specs = [Spectrometer(devs[i]) for i in range(NEEDED)]
     for s in specs:
-        s.integration_time_micros(INT_MS * 1000)
-        s.spectrum()  # ウォームアップ
+        s.configure(exposure_ms=INT_MS)
+        s.read_once()  # ウォームアップ
 
     abs_errors = []
     bar_unit = ITER // 50 or 1  # 進捗バー更新間隔
     print("計測中:", end=" ")
 
-    with ThreadPoolExecutor(max_workers=NEEDED) as ex:
-        for n in range(1, ITER + 1):
-            times = list(ex.map(acquire, specs))
-            # シリアル順で固定 (list_devices 順序)
-            c0, f0 = times[0]
-            c1, f1 = times[1]
-            delta_ms = abs(f1 - f0) * 1000  # 絶対誤差(ms)
+    with PairedAcquisition(specs, tolerance_ns=int(MAX_SKEW_MS * 1e6)) as engine:
+        target = engine.request(ITER)
+        while True:
+            try:
+                pair = engine.get(timeout=0.1)
+            except queue.Empty:
+                if engine.done(target):  # 相手のいないフレームの分は組が来ない
+                    break
+                continue
+            except SpectrometerError as e:
+                print(f"\n[ERROR] {e}")
+                break
+            delta_ms = abs(pair.stop_skew_ns) / 1e6  # 絶対誤差(ms)
             abs_errors.append(delta_ms)
+            n = len(abs_errors)
             if n % bar_unit == 0 or n == ITER:
                 print("#", end="", flush=True)
+        unpaired = engine.unpaired
     print(" 完了")
+    if unpaired:
+        print(f"相手のいないフレーム: {unpaired}")
+    if not abs_errors:
+        sys.exit(1)
 
     # ---------- 統計 ----------
     a = np.array(abs_errors)
@@ -98,6 +89,8 @@ def main():
     print(f"中央値 : {median:.3f}")
     print(f"95%タイル: {p95:.3f}")
     print(f"最大   : {max_v:.3f}")
+    print()
+    print(telemetry.default().format_summary())  # フレーム間隔と組のずれ (取得スレッドで記録)
 
     # ---------- ヒストグラム ----------
     plt.figure(figsize=(8, 4))
@@ -105,7 +98,7 @@ def main():
     plt.axvline(mean, linestyle="--", label=f"平均 {mean:.2f} ms")
     plt.xlabel("|Δ| (ms)")
     plt.ylabel("Count")
-    plt.title(f"Start 時刻差の分布  N={ITER}, int={INT_MS} ms")
+    plt.title(f"Start 時刻差の分布  N={len(a)}, int={INT_MS} ms")
     plt.legend()
     plt.tight_layout()
     plt.show()
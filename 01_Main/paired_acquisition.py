@@ -0,0 +1,248 @@
+"""2 台の分光器 (sig / ref) の同期取得エンジン
+
+● なにをする？
+    分光器ごとに取得専用のスレッドを 1 本ずつ立てておき、測定のあいだ使い続けます。
+    (1 回ごとに ThreadPoolExecutor へ投げると、スレッドの起動・切り替えの揺らぎが
+     そのまま sig と ref の取得時刻のずれに入る)
+    1 フレームごとに threading.Barrier で 2 本のスレッドをそろえてから取得を始め、
+    取得の前後の時刻を time.perf_counter_ns で記録します。
+
+● ペアにする
+    sig と ref のフレームは、取得時間の中央の時刻が tolerance 以内のものを 1 組にします。
+    tolerance の既定値は 露光時間 + 観測した読み出しの遅れ (これまでの取得時間の最大値) です。
+    (露光時間の半分にすると、USB の読み出しが片方だけ遅れた回が組にならずに捨てられる)
+    相手のいないフレーム (片方が遅れた・失敗した) は捨てて unpaired に数えます。
+    組は上限つきのキュー (maxsize) から取り出します。取り出しが追いつかないときは
+    取得スレッドがそこで待つので、フレームを黙って捨てることはありません。
+    フレーム間隔 (frame_interval.sig / .ref) と組のずれ (skew) は telemetry に記録します。
+
+● 使い方
+    with PairedAcquisition(specs) as engine:        # specs = [sig, ref] (spectrometer_backend)
+        (wl_sig, sig), (wl_ref, ref) = engine.acquire()   # 積算回数分の組を平均
+        target = engine.request(100)                 # 100 フレームずつ取得
+        pair = engine.get()                          # Pair(index, sig, ref)
+        pair.stop_skew_ns                            # 取得終了時刻の差 (ref - sig)
+        engine.done(target)                          # 100 フレーム分を取り終えて受け取ったか
+"""
+
+import logging
+import queue
+import threading
+import time
+from collections import deque, namedtuple
+
+import numpy as np
+
+import telemetry as telemetry_
+from spectrometer_backend import SpectrometerError
+
+logger = logging.getLogger('paired_acquisition')
+
+# ------------------ 設定 ------------------
+MAXSIZE = 256          # 組のキューの上限
+POLL_S = 0.05          # キューを待つ間隔 [s]
+RETRIES = 3            # acquire で足りない組を取り直す回数
+
+SIG, REF = 0, 1
+
+Frame = namedtuple('Frame', 'device index t_start_ns t_stop_ns intensities')
+
+
+class Pair(namedtuple('Pair', 'index sig ref')):
+    """同時に取得した sig と ref のフレーム"""
+
+    __slots__ = ()
+
+    @property
+    def start_skew_ns(self):
+        return self.ref.t_start_ns - self.sig.t_start_ns
+
+    @property
+    def stop_skew_ns(self):
+        return self.ref.t_stop_ns - self.sig.t_stop_ns
+
+
+def _mid_ns(frame):
+    return (frame.t_start_ns + frame.t_stop_ns) // 2
+
+
+class PairedAcquisition:
+    """sig / ref の 2 台を同じタイミングで取得し続けるエンジン
+
+    specs は spectrometer_backend の SpectrometerBackend 2 台 ([sig, ref] の順)。
+    tolerance_ns を省略すると、短いほうの露光時間に観測した読み出しの遅れを足したものを
+    ペアにする許容差にします。acquire が平均した組の数は averaged に入ります。
+    """
+
+    def __init__(self, specs, maxsize=MAXSIZE, tolerance_ns=None, telemetry=None):
+        if len(specs) != 2:
+            raise ValueError(f"分光器は 2 台 (sig, ref) 必要です ({len(specs)} 台)")
+        self.specs = list(specs)
+        self.tolerance_ns = tolerance_ns
+        self.telemetry = telemetry or telemetry_.default()
+        self.unpaired = 0
+        self.averaged = 0
+        self.error = None
+        self._pairs = queue.Queue(maxsize)
+        self._barrier = threading.Barrier(2)
+        self._cond = threading.Condition()
+        self._match_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._requested = 0                 # ここまでに頼んだフレーム数 (両方の分光器で共通)
+        self._done = [0, 0]                 # 分光器ごとに取得・ペア判定まで終えたフレーム数
+        self._pending = (deque(), deque())  # 相手待ちのフレーム
+        self._paired = 0
+        self._read_ns = 0                   # これまでの取得時間 (read_once の前後) の最大値
+        self._workers = [threading.Thread(target=self._run, args=(device,), daemon=True,
+                                          name=f"acquire-{'sig' if device == SIG else 'ref'}")
+                         for device in (SIG, REF)]
+        for worker in self._workers:
+            worker.start()
+
+    # ---- 取得スレッド ----
+    def _run(self, device):
+        spec = self.specs[device]
+        metric = f"frame_interval.{'sig' if device == SIG else 'ref'}"
+        while True:
+            with self._cond:
+                while not self._stop.is_set() and self._done[device] >= self._requested:
+                    self._cond.wait()
+                if self._stop.is_set():
+                    return
+                index = self._done[device]
+            try:
+                self._barrier.wait()        # 2 台そろってから取得を始める
+            except threading.BrokenBarrierError:
+                return
+            try:
+                t_start = time.perf_counter_ns()
+                intensities = spec.read_once()
+                t_stop = time.perf_counter_ns()
+            except Exception as e:
+                self._fail(SpectrometerError(f"{spec.name}: 取得に失敗しました ({e})"))
+                return
+            self.telemetry.interval(metric, t_start)
+            self._match(Frame(device, index, t_start, t_stop, intensities))
+            with self._cond:
+                self._done[device] += 1
+                self._cond.notify_all()
+
+    def _fail(self, error):
+        self.error = error
+        self._stop.set()
+        self._barrier.abort()
+        with self._cond:
+            self._cond.notify_all()
+
+    def _tolerance(self):
+        if self.tolerance_ns is not None:
+            return self.tolerance_ns
+        # 露光時間 + 読み出しの遅れ (取得時間の最大値 - 露光時間)
+        exposure_ns = int(min(spec.exposure_ms for spec in self.specs) * 1e6)
+        return exposure_ns + max(0, self._read_ns - exposure_ns)
+
+    def _match(self, frame):
+        """取得時刻でペアを作り、キューに入れます。"""
+        with self._match_lock:
+            self._read_ns = max(self._read_ns, frame.t_stop_ns - frame.t_start_ns)
+            self._pending[frame.device].append(frame)
+            sig, ref = self._pending
+            while sig and ref:
+                if abs(_mid_ns(sig[0]) - _mid_ns(ref[0])) <= self._tolerance():
+                    pair = Pair(self._paired, sig.popleft(), ref.popleft())
+                    self.telemetry.record('skew', pair.stop_skew_ns)
+                    self._put(pair)
+                    self._paired += 1
+                else:
+                    # 古いほうには相手がいない
+                    (sig if _mid_ns(sig[0]) < _mid_ns(ref[0]) else ref).popleft()
+                    self.unpaired += 1
+
+    def _put(self, pair):
+        while not self._stop.is_set():
+            try:
+                self._pairs.put(pair, timeout=POLL_S)
+                return
+            except queue.Full:
+                continue
+
+    # ---- 呼び出し側 ----
+    def request(self, n):
+        """n フレームずつ取得するよう頼みます。頼んだ分を取り終えたときの完了数を返します。"""
+        with self._cond:
+            self._requested += int(n)
+            self._cond.notify_all()
+            return self._requested
+
+    def completed(self):
+        """両方の分光器で取得・ペア判定まで終えたフレーム数"""
+        with self._cond:
+            return min(self._done)
+
+    def done(self, target):
+        """request が返した target まで取り終え、その組をすべて受け取ったか"""
+        # 完了数はキューに入れたあとで進むので、完了していて空なら全部受け取っている
+        return self.completed() >= target and self._pairs.empty()
+
+    def get(self, timeout=None):
+        """次の組を返します (timeout 秒待っても来なければ queue.Empty)。"""
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while True:
+            if self.error is not None:
+                raise self.error
+            wait = POLL_S if deadline is None else min(POLL_S, deadline - time.perf_counter())
+            if wait <= 0:
+                raise queue.Empty
+            try:
+                return self._pairs.get(timeout=wait)
+            except queue.Empty:
+                continue
+
+    def collect(self, n):
+        """n フレーム頼み、その分の組をリストで返します (相手のいないフレームの分は少なくなる)。"""
+        target = self.request(n)
+        pairs = []
+        while True:
+            try:
+                pairs.append(self.get(timeout=POLL_S))
+            except queue.Empty:
+                if self.done(target):
+                    return pairs
+
+    def acquire(self, scans=None):
+        """積算回数分の組を平均し、[(波長, 強度) sig, (波長, 強度) ref] を返します。
+
+        spectrometer_backend.acquire_all(specs) の置き換えです。
+        RETRIES 回取り直しても組が足りないときは、取れた組だけで平均してログに警告を書きます
+        (1 組も取れなければ SpectrometerError)。
+        """
+        scans = scans or max(spec.scans for spec in self.specs)
+        pairs = self.collect(scans)
+        for _ in range(RETRIES):
+            if len(pairs) >= scans:
+                break
+            pairs += self.collect(scans - len(pairs))
+        self.averaged = len(pairs)
+        if not pairs:
+            raise SpectrometerError("sig と ref の組が取れませんでした (取得時刻が合いません)")
+        if len(pairs) < scans:
+            logger.warning(f"sig と ref の組が足りません: {len(pairs)}/{scans} 組で平均します "
+                           f"(相手のいないフレーム: 累計 {self.unpaired})")
+        sig = np.mean([pair.sig.intensities for pair in pairs], axis=0)
+        ref = np.mean([pair.ref.intensities for pair in pairs], axis=0)
+        return [(self.specs[SIG].wavelengths(), sig), (self.specs[REF].wavelengths(), ref)]
+
+    def close(self):
+        """取得スレッドを止めます (分光器は閉じません)。"""
+        self._stop.set()
+        self._barrier.abort()
+        with self._cond:
+            self._cond.notify_all()
+        for worker in self._workers:
+            worker.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
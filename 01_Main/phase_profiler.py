@@ -0,0 +1,105 @@
+"""測定ループの区間ごとの時間計測
+
+● なにをする？
+    遅延点ごとに「ステージ待ち」「取得」「シャッター」などの区間の開始・終了を
+    time.perf_counter_ns で記録します。常に有効にしておけるくらい軽い処理です。
+    (1 区間あたり perf_counter_ns 2 回とリストへの追加だけ)
+
+● ログ (TA_LOG)
+    点ごとに 1 行の JSON をログに書きます。
+        PHASES {"point": 3, "thread": "MainThread", "phases": {"acquire_pumped": [開始, 終了], ...}}
+    時刻は測定開始からの ns です。別スレッド (解析・保存) の区間は別の行になります。
+
+● まとめ
+    測定の最後に、区間ごとの回数・平均・中央値・95/99 パーセンタイル・最大・合計と、
+    測定時間に占める割合を表にして表示し、ログにも書きます。
+
+● 使い方
+    profiler = PhaseProfiler()
+    with profiler.phase('acquire_pumped', i):
+        ...
+    profiler.log_point(i)          # その点でここまでに記録した区間をログへ
+    print(profiler.format_summary())
+"""
+
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+import numpy as np
+
+logger = logging.getLogger('phase')
+
+
+class PhaseProfiler:
+    """区間ごとの ns 単位の時間を記録します (複数スレッドから呼んでも安全)。"""
+
+    def __init__(self, log=logger):
+        self.log = log
+        self.t0_ns = time.perf_counter_ns()
+        self.log.info(f"PHASES_START {json.dumps({'wall_time_ns': time.time_ns()})}")
+        self._lock = threading.Lock()
+        self._durations = defaultdict(list)     # 区間名 -> [ns]
+        self._pending = defaultdict(dict)       # (点, スレッド名) -> {区間名: [開始, 終了]}
+
+    def record(self, name, point, start_ns, end_ns):
+        """区間を 1 つ記録します (時刻は perf_counter_ns の値)。"""
+        key = (point, threading.current_thread().name)
+        with self._lock:
+            self._durations[name].append(end_ns - start_ns)
+            self._pending[key][name] = [start_ns - self.t0_ns, end_ns - self.t0_ns]
+
+    @contextmanager
+    def phase(self, name, point=None):
+        start_ns = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.record(name, point, start_ns, time.perf_counter_ns())
+
+    def log_point(self, point):
+        """この点についてこのスレッドで記録した区間を、1 行の JSON としてログに書きます。"""
+        thread = threading.current_thread().name
+        with self._lock:
+            phases = self._pending.pop((point, thread), None)
+        if phases:
+            record = {'point': point, 'thread': thread, 'phases': phases}
+            self.log.info(f"PHASES {json.dumps(record)}")
+
+    def summary(self):
+        """区間ごとのまとめ [{'phase', 'count', 'mean_ms', ...}] を合計時間の長い順に返します。"""
+        with self._lock:
+            durations = {name: np.asarray(values, dtype=np.float64) / 1e6
+                         for name, values in self._durations.items()}
+        elapsed_ms = (time.perf_counter_ns() - self.t0_ns) / 1e6
+        rows = []
+        for name, ms in durations.items():
+            p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+            rows.append({'phase': name, 'count': len(ms), 'mean_ms': float(ms.mean()),
+                         'p50_ms': float(p50), 'p95_ms': float(p95), 'p99_ms': float(p99),
+                         'max_ms': float(ms.max()), 'total_s': float(ms.sum() / 1000),
+                         'share': float(ms.sum() / elapsed_ms) if elapsed_ms else 0.0})
+        return sorted(rows, key=lambda row: row['total_s'], reverse=True)
+
+    def format_summary(self, rows=None):
+        """summary() を表の文字列にします。"""
+        lines = [f"{'phase':<18}{'count':>7}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}{'total':>10}{'share':>8}",
+                 f"{'':<18}{'':>7}{'[ms]':>10}{'[ms]':>10}{'[ms]':>10}{'[ms]':>10}{'[ms]':>10}{'[s]':>10}{'':>8}"]
+        for row in self.summary() if rows is None else rows:
+            lines.append(f"{row['phase']:<18}{row['count']:>7}{row['mean_ms']:>10.1f}{row['p50_ms']:>10.1f}"
+                         f"{row['p95_ms']:>10.1f}{row['p99_ms']:>10.1f}{row['max_ms']:>10.1f}"
+                         f"{row['total_s']:>10.2f}{row['share']:>8.1%}")
+        return '\n'.join(lines)
+
+    def log_summary(self):
+        """まとめを表示し、ログにも書きます。"""
+        rows = self.summary()
+        table = self.format_summary(rows)
+        print(table)
+        self.log.info("Phase summary\n" + table)
+        for row in rows:
+            self.log.info(f"PHASE_SUMMARY {json.dumps(row)}")
+        return table
@@ -0,0 +1,47 @@
+"""matplotlib の図をファイルを介さずに QPixmap にする
+
+● なにをする？
+    Agg で描いた RGBA バッファをそのまま QImage → QPixmap に変換します。
+    temp.png への保存・読込・削除がなくなります。
+
+● Thumbnail
+    テキストボックス横の小さなグラフ用。
+    図と線 (Line2D) を作っておき、更新時は線のデータだけ差し替えて描き直します。
+"""
+
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from PyQt5.QtGui import QImage, QPixmap
+
+
+def figure_to_pixmap(figure):
+    """Figure を描画して QPixmap を返します。"""
+    canvas = figure.canvas if isinstance(figure.canvas, FigureCanvasAgg) else FigureCanvasAgg(figure)
+    canvas.draw()
+    width, height = canvas.get_width_height()
+    image = QImage(canvas.buffer_rgba(), width, height, QImage.Format_RGBA8888)
+    # バッファは次の描画で書き換わるので複製しておく
+    return QPixmap.fromImage(image.copy())
+
+
+class Thumbnail:
+    """1本の線だけを描く使い回しの小さなグラフ"""
+
+    def __init__(self, width, height, dpi=100, xlim=(350, 800)):
+        self.figure = Figure(figsize=(width / dpi, height / dpi), dpi=dpi)
+        FigureCanvasAgg(self.figure)
+        self.axes = self.figure.add_axes([0, 0, 1, 1])
+        self.axes.axis('off')
+        self.axes.set_xlim(*xlim)
+        self.line, = self.axes.plot([], [], color='k', alpha=0.7, linestyle='-', linewidth=1)
+
+    def render(self, x_values, y_values):
+        """線のデータを差し替えて QPixmap を返します。"""
+        self.line.set_data(x_values, y_values)
+        if len(y_values):
+            y_min, y_max = np.nanmin(y_values), np.nanmax(y_values)
+            if y_min == y_max:
+                y_min, y_max = y_min - 1, y_max + 1
+            self.axes.set_ylim(y_min, y_max)
+        return figure_to_pixmap(self.figure)
@@ -0,0 +1,120 @@
+"""測定 1 回分 (遅延点のスキャン) の書き出し
+
+● なにをする？
+    ΔAbs は (波長 × 遅延点) の NumPy 配列を最初に確保しておき、遅延点ごとに 1 列だけ書き込みます。
+    (毎回 pd.concat で作り直したり、シート全体を書き直したりしない)
+    各点の生スペクトルも配列のまま持っておき、ブック (xlsx) は最後に 1 回だけ書き出します。
+
+● 出力するブック (これまでの TA_Measure と同じ形)
+    'delta ABS'               : Wavelength/nm と遅延時間ごとの ΔAbs
+    '{position}_{time}ps'     : その点の I_Sam_Ex / I_Ref_Ex / I_Sam / I_Ref
+                                (試料側と参照側の波長が違うときは、波長の和集合の行に並べる)
+
+● 使い方
+    with RunWriter(path, n_points=loop_count) as writer:
+        writer.append(i, '0.5', wl_ref, delta_abs, sheet='75_0.5ps', raw=[(name, wl, values), ...])
+        wl, recent, labels = writer.recent(15)      # 途中のグラフ用
+    # with を抜けるときにブックを書き出す (測定が途中で止まっても、そこまでの点を書き出す)
+"""
+
+import numpy as np
+
+WAVELENGTH = 'Wavelength/nm'
+DELTA_ABS_SHEET = 'delta ABS'
+
+
+def outer_columns(columns):
+    """[(名前, 波長, 値)] を波長の和集合にそろえ、(波長, [(名前, 値)]) を返します。
+
+    値のない行は NaN です (pandas の外部結合と同じ並び)。
+    """
+    wavelengths = [np.asarray(wl, dtype=np.float64) for _, wl, _ in columns]
+    if all(len(wl) == len(wavelengths[0]) and np.array_equal(wl, wavelengths[0]) for wl in wavelengths):
+        return wavelengths[0], [(name, np.asarray(values, dtype=np.float64)) for name, _, values in columns]
+    union = np.union1d(wavelengths[0], np.concatenate(wavelengths[1:]))
+    aligned = []
+    for (name, _, values), wl in zip(columns, wavelengths):
+        column = np.full(len(union), np.nan)
+        column[np.searchsorted(union, wl)] = values
+        aligned.append((name, column))
+    return union, aligned
+
+
+class RunWriter:
+    """遅延点ごとに ΔAbs を 1 列ずつ追加し、最後にブックを書き出します。"""
+
+    def __init__(self, path, n_points):
+        self.path = path
+        self.capacity = max(int(n_points), 1)
+        self.wavelength = None
+        self.matrix = None          # (波長, 遅延点), append されるまで確保しない
+        self.labels = [None] * self.capacity
+        self.sheets = {}            # 点の番号 -> (シート名, [(名前, 波長, 値)])
+        self.count = 0
+
+    def _allocate(self, wavelength):
+        self.wavelength = np.asarray(wavelength, dtype=np.float64)
+        self.matrix = np.full((len(self.wavelength), self.capacity), np.nan)
+
+    def _grow(self, index):
+        # 予定より点が多いときだけ倍に広げる
+        capacity = max(index + 1, self.capacity * 2)
+        matrix = np.full((self.matrix.shape[0], capacity), np.nan)
+        matrix[:, :self.capacity] = self.matrix
+        self.labels += [None] * (capacity - self.capacity)
+        self.matrix, self.capacity = matrix, capacity
+
+    def append(self, index, label, wavelength, delta_abs, sheet=None, raw=None):
+        """index 番目の点の ΔAbs (と生スペクトル) を書き込みます。"""
+        if self.matrix is None:
+            self._allocate(wavelength)
+        elif len(wavelength) != len(self.wavelength):
+            raise ValueError(f"{label}: 波長の数が最初の点と違います ({len(wavelength)} != {len(self.wavelength)})")
+        if index >= self.capacity:
+            self._grow(index)
+        self.matrix[:, index] = delta_abs
+        self.labels[index] = str(label)
+        if raw is not None:
+            self.sheets[index] = (sheet or str(label), raw)
+        self.count = max(self.count, index + 1)
+
+    def recent(self, k):
+        """最後の k 点の (波長, ΔAbs (波長 × k), ラベル) を返します。"""
+        start = max(self.count - k, 0)
+        return self.wavelength, self.matrix[:, start:self.count], self.labels[start:self.count]
+
+    # ---- ブックの書き出し ----
+    @staticmethod
+    def _write_sheet(workbook, name, wavelength, columns):
+        sheet = workbook.add_worksheet(name)
+        sheet.write_row(0, 0, [WAVELENGTH] + [column_name for column_name, _ in columns])
+        values = np.column_stack([wavelength] + [column for _, column in columns])
+        # constant_memory では行の順に書く必要がある
+        for row, line in enumerate(values.tolist(), start=1):
+            sheet.write_row(row, 0, [None if value != value else value for value in line])  # NaN は空欄
+
+    def write(self):
+        """ここまでの点をブックに書き出します。"""
+        import xlsxwriter
+        points = [i for i in range(self.count) if self.labels[i] is not None]
+        workbook = xlsxwriter.Workbook(self.path, {'constant_memory': True})
+        try:
+            if self.matrix is not None:
+                self._write_sheet(workbook, DELTA_ABS_SHEET, self.wavelength,
+                                  [(self.labels[i], self.matrix[:, i]) for i in points])
+            for i in points:
+                if i in self.sheets:
+                    name, raw = self.sheets[i]
+                    wavelength, columns = outer_columns(raw)
+                    self._write_sheet(workbook, name, wavelength, columns)
+        finally:
+            workbook.close()
+
+    def close(self):
+        self.write()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
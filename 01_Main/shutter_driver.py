@@ -0,0 +1,236 @@
+"""Arduino シャッターのドライバ (GUI を止めない)
+
+● なにをする？
+    コマンドの送信と完了待ちをバックグラウンドのスレッドで 1 つずつ行い、
+    呼び出し側には concurrent.futures.Future をすぐに返します。
+    ファームウェア (aruduino/arduino_code) は動作が終わると "DONE motor position seq" を返すので、
+    Future は実際に動き終わった時点で完了し、位置は応答の値で更新されます。
+    コマンドには番号 (seq) を付け、同じ番号の応答だけを受け取ります。送る前には受信バッファも空にするので、
+    タイムアウトのあとに遅れて届いた応答を次の動作の完了と取り違えません。
+    タイムアウトしたモーターは位置を「不明」にし、次に動かす前に P? で位置を読み直します。
+    応答を返さない旧ファームウェアのときは ack=False にします (計算上の動作時間だけ待つ)。
+
+● シャッターの状態
+    Shutter は位置 (正味のステップ数) から OPEN / CLOSE を決めます。
+    動作中は MOVING です。起動時は閉じている (位置 0) とみなします。
+
+● 使い方
+    driver = ShutterDriver(serial.Serial(port, 9600, timeout=1))
+    white = Shutter(driver, motor=1, open_direction=-1)   # ファームウェアが動かすのはモーター1 のみ
+    future = white.open()         # すぐ戻る (GUI はこのまま)
+    future.result()               # 開き終わるまで待つ (測定ループ)
+    white.state                   # -> 'OPEN'
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+# ------------------ 設定 ------------------
+STEPS_PER_REV = 512
+DELAY_MS = 2           # 1 相あたりの時間 [ms] (1 ステップ = 4 相)
+BOOT_S = 2.0           # ポートを開くと Arduino はリセットされる
+MARGIN_S = 1.0         # 完了応答を待つ時間の余裕 [s]
+
+OPEN = 'OPEN'
+CLOSE = 'CLOSE'
+MOVING = 'MOVING'
+UNKNOWN = 'UNKNOWN'
+
+
+class ShutterError(RuntimeError):
+    """応答がない・コマンドが読めないなど"""
+
+
+class ShutterTimeout(ShutterError):
+    """時間内に完了の応答がなかったとき (モーターがどこまで動いたか分からない)"""
+
+
+def angle_to_steps(angle):
+    """角度をステップ数に変換します。"""
+    return int(angle * STEPS_PER_REV / 360)
+
+
+def motion_time(steps, delay_ms=DELAY_MS):
+    """steps ステップ動かすのにかかる時間 [s]"""
+    return abs(steps) * 4 * delay_ms / 1000
+
+
+class ShutterDriver:
+    """Arduino へのコマンドをワーカースレッドで順に実行します。
+
+    ser は pyserial の Serial (開いた直後のもの)。
+    """
+
+    def __init__(self, ser, ack=True, boot_s=BOOT_S, margin_s=MARGIN_S):
+        self.ser = ser
+        self.ack = ack
+        self.margin_s = margin_s
+        self.positions = {1: 0, 2: 0}      # None は不明 (次に動かす前に P? で読み直す)
+        self._seq = 0
+        self._ready_at = time.perf_counter() + boot_s
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name='shutter', daemon=True)
+        self._worker.start()
+
+    # ---- ワーカー ----
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            future, func, args = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(func(*args))
+            except BaseException as e:
+                future.set_exception(e)
+
+    def submit(self, func, *args):
+        """func(*args) をワーカーで実行し、Future を返します。"""
+        future = Future()
+        self._queue.put((future, func, args))
+        return future
+
+    def _wait_boot(self):
+        time.sleep(max(0.0, self._ready_at - time.perf_counter()))
+
+    def _read_reply(self, prefix, timeout, seq=None):
+        """prefix で始まる (seq を指定したときはその番号で終わる) 応答行が届くまで読みます。"""
+        deadline = time.perf_counter() + timeout
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                raise ShutterTimeout(f"{timeout:.1f} s 以内に応答 ({prefix.strip()}) がありません")
+            self.ser.timeout = remaining
+            raw = self.ser.read_until(b'\n')
+            if not raw.endswith(b'\n'):
+                continue
+            line = raw.decode('ascii', errors='replace').strip()
+            if seq is not None and line.rsplit(None, 1)[-1].rsplit(',', 1)[-1] != str(seq):
+                continue                 # 前のコマンドへの応答 (ERR はコマンドをそのまま返す)
+            if line.startswith('ERR'):
+                raise ShutterError(f"コマンドが受け付けられませんでした: {line}")
+            if line.startswith(prefix):
+                return line
+
+    # ---- ワーカーで実行される処理 (ワーカースレッドの中からは直接呼んでよい) ----
+    def position(self, motor):
+        """モーターの位置を返します。不明なら P? で読み直します。"""
+        if self.positions.get(motor, 0) is None:
+            self.query_positions_sync()
+            if self.positions[motor] is None:
+                raise ShutterError(f"モーター {motor} の位置を読めません (ファームウェアが返しません)")
+        return self.positions.get(motor, 0)
+
+    def move_sync(self, motor, steps, direction, delay_ms=DELAY_MS):
+        """モーターを動かし、動き終わるまで待って位置を返します。"""
+        direction = 1 if int(direction) == 1 else -1
+        self._wait_boot()
+        if not self.ack:
+            self.ser.write(f"{motor},{steps},{delay_ms},{direction}\n".encode())
+            time.sleep(motion_time(steps, delay_ms))
+            position = self.positions.get(motor, 0) + (steps if direction == 1 else -steps)
+            self.positions[motor] = position
+            return position
+        self.position(motor)             # タイムアウトのあとなら位置を読み直してから
+        self._seq += 1
+        seq = self._seq
+        self.ser.reset_input_buffer()
+        self.ser.write(f"{motor},{steps},{delay_ms},{direction},{seq}\n".encode())
+        try:
+            reply = self._read_reply(f'DONE {motor} ', motion_time(steps, delay_ms) + self.margin_s, seq)
+        except ShutterTimeout:
+            self.positions[motor] = None  # どこまで動いたか分からない
+            raise
+        position = int(reply.split()[2])
+        self.positions[motor] = position
+        return position
+
+    def query_positions_sync(self):
+        """ファームウェアが覚えている位置を読み、{モーター: 位置} を返します。"""
+        self._wait_boot()
+        self.ser.reset_input_buffer()
+        self.ser.write(b'P?\n')
+        reply = self._read_reply('POS ', self.margin_s)
+        # ファームウェアにつながっているモーターの数だけ返ってくる
+        self.positions.update({motor: int(value) for motor, value in enumerate(reply.split()[1:], start=1)})
+        return dict(self.positions)
+
+    # ---- 呼び出し側 ----
+    def move(self, motor, steps, direction, delay_ms=DELAY_MS):
+        """モーターを動かします。Future の結果は動作後の位置です。"""
+        return self.submit(self.move_sync, int(motor), int(steps), direction, delay_ms)
+
+    def query_positions(self):
+        """ファームウェアが覚えている位置を読みます (ack=True のときのみ)。"""
+        return self.submit(self.query_positions_sync)
+
+    def close(self):
+        """残りのコマンドを実行してからポートを閉じます。"""
+        self._queue.put(None)
+        self._worker.join()
+        self.ser.close()
+
+
+class Shutter:
+    """1 枚のシャッター (モーター 1 つ)
+
+    open_direction : 開くときの回転方向 (1: CW, -1: CCW)
+    状態が変わるたびに add_listener で登録した関数が呼ばれます (ワーカースレッドから)。
+    """
+
+    def __init__(self, driver, motor, open_direction, angle=50, delay_ms=DELAY_MS):
+        self.driver = driver
+        self.motor = motor
+        self.delay_ms = delay_ms
+        self.closed_position = driver.positions.get(motor, 0)
+        self.open_position = self.closed_position + open_direction * angle_to_steps(angle)
+        self.state = CLOSE
+        self.target = CLOSE
+        self._listeners = []
+
+    def add_listener(self, func):
+        self._listeners.append(func)
+
+    def _set_state(self, state):
+        self.state = state
+        for func in self._listeners:
+            func(self)
+
+    def _state_at(self, position):
+        if position == self.open_position:
+            return OPEN
+        if position == self.closed_position:
+            return CLOSE
+        return UNKNOWN
+
+    def _go(self, position):
+        delta = position - self.driver.position(self.motor)
+        if delta:
+            self._set_state(MOVING)
+            try:
+                self.driver.move_sync(self.motor, abs(delta), 1 if delta > 0 else -1, self.delay_ms)
+            finally:
+                # タイムアウトしたときは位置が不明 (None) なので UNKNOWN になる
+                self._set_state(self._state_at(self.driver.positions.get(self.motor, 0)))
+        return self.state
+
+    def _request(self, target):
+        self.target = target
+        position = self.open_position if target == OPEN else self.closed_position
+        return self.driver.submit(self._go, position)
+
+    def open(self):
+        """開きます。Future の結果は動作後の状態です。"""
+        return self._request(OPEN)
+
+    def close(self):
+        """閉じます。Future の結果は動作後の状態です。"""
+        return self._request(CLOSE)
+
+    def toggle(self):
+        """最後に指示した状態と逆にします (連打しても順に実行されます)。"""
+        return self._request(CLOSE if self.target == OPEN else OPEN)
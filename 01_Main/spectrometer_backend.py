@@ -0,0 +1,179 @@
+"""分光器の取得バックエンド
+
+● なにをする？
+    分光器からスペクトルを numpy 配列 (波長, 強度) で直接取得します。
+    OceanView の画面をクリックしてクリップボードから読む方法の置き換えです。
+
+● バックエンド
+    SeaBreezeBackend  : seabreeze 経由で Ocean Insight 分光器 (USB4000 など) を使う
+    SimulatedBackend  : 装置なしで動作確認するための疑似分光器
+
+● 使い方
+    specs = open_spectrometers(2)                  # 実機 (list_devices 順)
+    specs = open_spectrometers(2, simulate=True)   # 疑似
+    for s in specs:
+        s.configure(exposure_ms=4, scans=100)
+    (wl0, y0), (wl1, y1) = acquire_all(specs)      # 全台同時に取得
+"""
+
+import abc
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# ------------------ 設定 ------------------
+BACKENDS = ["cseabreeze", "pyseabreeze"]
+
+
+class SpectrometerError(RuntimeError):
+    """分光器が見つからない・取得に失敗したとき"""
+
+
+# -------------- 共通インターフェース --------------
+
+class SpectrometerBackend(abc.ABC):
+    """分光器 1 台分の取得インターフェース"""
+
+    name = "spectrometer"
+
+    def __init__(self):
+        self.exposure_ms = 100.0
+        self.scans = 1
+
+    def configure(self, exposure_ms=None, scans=None):
+        """露光時間 [ms] と積算回数を設定します。"""
+        if exposure_ms is not None:
+            self.exposure_ms = float(exposure_ms)
+            self._set_exposure(self.exposure_ms)
+        if scans is not None:
+            self.scans = max(1, int(scans))
+
+    @abc.abstractmethod
+    def wavelengths(self):
+        """波長 [nm] の配列を返します。"""
+
+    @abc.abstractmethod
+    def read_once(self):
+        """1 回分の強度を返します。"""
+
+    def acquire(self):
+        """積算回数分を平均して (波長, 強度) を返します。"""
+        total = self.read_once().astype(np.float64)
+        for _ in range(self.scans - 1):
+            total += self.read_once()
+        return self.wavelengths(), total / self.scans
+
+    def close(self):
+        pass
+
+    def _set_exposure(self, exposure_ms):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# -------------- seabreeze --------------
+
+def pick_backend(required=1):
+    """required 台以上見つかる seabreeze バックエンドを選びます。"""
+    import seabreeze
+    from seabreeze.spectrometers import list_devices
+
+    best, best_be = [], None
+    for be in BACKENDS:
+        try:
+            seabreeze.use(be)
+        except Exception:
+            continue
+        devs = list_devices()
+        if len(devs) >= required:
+            return be, devs
+        if len(devs) > len(best):
+            best, best_be = devs, be
+    return best_be, best
+
+
+class SeaBreezeBackend(SpectrometerBackend):
+    """seabreeze の Spectrometer を使うバックエンド"""
+
+    def __init__(self, device):
+        super().__init__()
+        from seabreeze.spectrometers import Spectrometer
+
+        self.spec = Spectrometer(device)
+        self.name = f"{self.spec.model}:{self.spec.serial_number}"
+        self._wavelengths = np.asarray(self.spec.wavelengths(), dtype=np.float64)
+        self._set_exposure(self.exposure_ms)
+
+    def _set_exposure(self, exposure_ms):
+        self.spec.integration_time_micros(int(exposure_ms * 1000))
+
+    def wavelengths(self):
+        return self._wavelengths
+
+    def read_once(self):
+        return np.asarray(self.spec.intensities(), dtype=np.float64)
+
+    def close(self):
+        self.spec.close()
+
+
+# -------------- 疑似分光器 --------------
+
+class SimulatedBackend(SpectrometerBackend):
+    """装置なしで動く疑似分光器
+
+    ランプ光 (ガウス型) にショットノイズと暗電流を足したスペクトルを返します。
+    transmission に (画素数,) の配列を入れると、その透過率を掛けます (過渡吸収の模擬用)。
+    realtime=True なら露光時間ぶん待ちます。
+    """
+
+    def __init__(self, name="SIM", pixels=3648, wl_range=(340.0, 1030.0), peak=30000.0,
+                 dark=1500.0, seed=None, realtime=True):
+        super().__init__()
+        self.name = name
+        self.realtime = realtime
+        self._wavelengths = np.linspace(*wl_range, pixels)
+        self._lamp = peak * np.exp(-0.5 * ((self._wavelengths - 600.0) / 120.0) ** 2)
+        self._dark = dark
+        self._rng = np.random.default_rng(seed)
+        self.transmission = None
+
+    def wavelengths(self):
+        return self._wavelengths
+
+    def read_once(self):
+        if self.realtime:
+            time.sleep(self.exposure_ms / 1000)
+        signal = self._lamp * (self.exposure_ms / 100.0)
+        if self.transmission is not None:
+            signal = signal * self.transmission
+        counts = self._rng.poisson(np.clip(signal, 0, None)) + self._rng.normal(self._dark, 10.0, signal.shape)
+        return np.clip(counts, 0, 65535)
+
+
+# -------------- まとめて扱う --------------
+
+def open_spectrometers(count=2, simulate=False, **sim_options):
+    """分光器を count 台開きます (seabreeze の list_devices 順)。"""
+    if simulate:
+        return [SimulatedBackend(name=f"SIM{i}", **sim_options) for i in range(count)]
+    be, devs = pick_backend(count)
+    if not be or len(devs) < count:
+        raise SpectrometerError(f"分光器を {count} 台検出できません (検出: {len(devs)} 台)")
+    return [SeaBreezeBackend(devs[i]) for i in range(count)]
+
+
+def acquire_all(specs, executor=None):
+    """全台を同時に取得し、[(波長, 強度), ...] を specs の順で返します。"""
+    if len(specs) == 1:
+        return [specs[0].acquire()]
+    if executor is not None:
+        return list(executor.map(lambda s: s.acquire(), specs))
+    with ThreadPoolExecutor(max_workers=len(specs)) as ex:
+        return list(ex.map(lambda s: s.acquire(), specs))
@@ -0,0 +1,134 @@
+"""SURUGA ステージ (DS102 / D220) の移動完了待ち
+
+● なにをする？
+    固定時間の sleep の代わりに、ステータス SB1? を一定間隔で読み、
+    軸が止まったらすぐに戻ります。戻り値は実際の移動時間 [s] です。
+
+● SB1? のビット (main_suruga.update_status と同じ)
+    0x40 : 動作中
+    0x10 : 原点検出
+    0x02, 0x04 : 機械リミット検出
+
+● 使い方
+    stage = SurugaStage(sta)               # sta は pyvisa の resource など (query / write を持つ)
+    stage.home()                           # 原点復帰して待つ
+    duration = stage.move_pulses(1000)     # +1000 pulse 動かして待つ
+    stage.start_move(500)                  # 動かし始めるだけ
+    ...                                    # 移動中に別の処理
+    duration = stage.wait()                # 止まるまで待つ
+"""
+
+import time
+
+# ------------------ 設定 ------------------
+RUNNING = 0x40
+ORIGIN = 0x10
+LIMIT = 0x02 | 0x04
+POLL_S = 0.01          # ステータスを読む間隔 [s]
+START_GRACE_S = 0.05   # 動作中ビットが立つまでの猶予 [s]
+
+
+class MotionError(RuntimeError):
+    """リミット検出などで移動が正常に終わらなかったとき"""
+
+
+class MotionTimeout(MotionError):
+    """timeout までに軸が止まらなかったとき"""
+
+
+def read_status(query, axis=1):
+    """SB1? の値を整数で返します。"""
+    return int(query(f'AXI{axis}:SB1?'))
+
+
+def wait_for_motion(query, axis=1, poll_s=POLL_S, timeout=None, expect_origin=False,
+                    start_grace_s=START_GRACE_S, started_at=None):
+    """軸が止まるまで SB1? を読み続け、移動時間 [s] を返します。
+
+    query         : コマンド文字列を送って応答文字列を返す関数 (pyvisa の query など)
+    timeout       : これを超えても止まらなければ MotionTimeout (None なら無制限)
+    expect_origin : 原点復帰の完了待ち (止まったときに原点検出ビットを確認する)
+    start_grace_s : 移動コマンド直後に動作中ビットがまだ立っていない間は止まったとみなさない
+    started_at    : 移動コマンドを送った時刻 (time.perf_counter)。移動時間の起点になる
+    """
+    t0 = time.perf_counter() if started_at is None else started_at
+    seen_running = False
+    while True:
+        status = read_status(query, axis)
+        elapsed = time.perf_counter() - t0
+        if status & RUNNING:
+            seen_running = True
+        elif seen_running or elapsed >= start_grace_s:
+            if status & LIMIT:
+                raise MotionError(f"AXI{axis}: リミットを検出しました (SB1={status:#04x})")
+            if expect_origin and not status & ORIGIN:
+                raise MotionError(f"AXI{axis}: 原点を検出できませんでした (SB1={status:#04x})")
+            return elapsed
+        if timeout is not None and elapsed > timeout:
+            raise MotionTimeout(f"AXI{axis}: {timeout:.1f} s 以内に停止しませんでした")
+        time.sleep(poll_s)
+
+
+class SurugaStage:
+    """1 軸分の移動と完了待ち
+
+    inst は query(str) -> str と write(str) を持つもの (pyvisa の resource など)。
+    timeout は移動距離と速度から見積もった時間に margin_s を足した値です。
+    params (stage_params.StageParams) を渡すと、速度は問い合わせずにスナップショットから読みます。
+    """
+
+    def __init__(self, inst, axis=1, poll_s=POLL_S, margin_s=5.0, params=None):
+        self.inst = inst
+        self.params = params
+        self.axis = axis
+        self.poll_s = poll_s
+        self.margin_s = margin_s
+        self.last_duration = None
+        self._pending = None     # (開始時刻, timeout, 原点復帰か)
+
+    def query(self, command):
+        return self.inst.query(command)
+
+    def position(self):
+        return int(self.query(f'AXI{self.axis}:POS?'))
+
+    def speed(self):
+        if self.params is not None:
+            return self.params.speed
+        return int(float(self.query(f'AXI{self.axis}:F0?')))
+
+    def _timeout(self, pulses):
+        return abs(pulses) / max(self.speed(), 1) + self.margin_s
+
+    def start_move(self, pulses):
+        """pulses だけ動かし始めます (負なら CCW)。"""
+        timeout = self._timeout(pulses)
+        direction = 0 if pulses >= 0 else 1
+        self.inst.write(f'AXI{self.axis}:PULS {abs(pulses)}:GO {direction}')
+        self._pending = (time.perf_counter(), timeout, False)
+
+    def start_home(self):
+        """原点復帰を始めます。"""
+        timeout = self._timeout(self.position())
+        self.inst.write(f'AXI{self.axis}:GO ORG')
+        self._pending = (time.perf_counter(), timeout, True)
+
+    def wait(self):
+        """start_move / start_home で始めた移動が止まるまで待ち、移動時間 [s] を返します。"""
+        if self._pending is None:
+            return 0.0
+        started_at, timeout, homing = self._pending
+        self._pending = None
+        self.last_duration = wait_for_motion(self.query, self.axis, self.poll_s, timeout,
+                                             expect_origin=homing, started_at=started_at)
+        return self.last_duration
+
+    def move_pulses(self, pulses):
+        """pulses だけ動かして止まるまで待ち、移動時間 [s] を返します。"""
+        self.start_move(pulses)
+        return self.wait()
+
+    def home(self):
+        """原点復帰して止まるまで待ち、移動時間 [s] を返します。"""
+        self.start_home()
+        return self.wait()
@@ -0,0 +1,140 @@
+"""SURUGA ステージ (DS102 / D220) の固定パラメータのスナップショット
+
+● なにをする？
+    分解能・ドライバ分割数・定パルス移動量・駆動速度などの設定値を 1 回だけまとめて読み、
+    コントローラごとにファイル (ini/stage_params/*.json) に保存しておきます。
+    次回の起動では、ファイルの値を使い、確認の問い合わせを 1 回だけ行います。
+    (起動のたびに同じ問い合わせと time.sleep を繰り返さない)
+
+● キャッシュが捨てられるとき
+    set() で値を書き込んだレジスタだけ捨て、次に読むときに装置から読み直します。
+    確認の問い合わせで値が違っていたときは、全レジスタを読み直します。
+    コントローラは *IDN? の応答とリソース名で区別します。
+
+● 使い方
+    params = StageParams.load(sta)          # sta は pyvisa の resource / DS102Transport など
+    print(params.idn, params['resolution'])
+    params.set('speed', 5000)               # AXI1:F0 5000 を送る
+    params.speed                            # -> 5000 (読み直した値)
+"""
+
+import json
+import os
+import re
+import time
+
+from ds102_transport import DS102Transport
+
+# ------------------ 設定 ------------------
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'ini', 'stage_params')
+
+# 名前: (レジスタ, 説明)
+REGISTERS = {
+    'resolution': ('RESOLUT', '1パルス移動量(um)'),
+    'division': ('DRDIV', 'ドライバ分割数(FULL:0, HALF1)'),
+    'pulse': ('PULS', '定パルス移動量(pulse)'),
+    'speed': ('F0', '駆動速度(pps)'),
+    'start_speed': ('L0', '起動速度(pps)'),
+    'rate': ('R0', '加減速レート'),
+}
+# 起動時の確認で読み直すレジスタ (他のプログラムが変えることがある)
+VERIFY = ('speed',)
+
+
+def _query_all(inst, commands):
+    """問い合わせをまとめて送ります。DS102Transport なら 1 回で送ります。"""
+    # ブローカーのリソースに hasattr で問い合わせない (属性ごとに往復が増える)
+    if isinstance(inst, DS102Transport):
+        return [str(reply).strip() for reply in inst.query_many(commands)]
+    return [str(inst.query(command)).strip() for command in commands]
+
+
+def controller_id(idn, resource=''):
+    """キャッシュファイル名に使えるコントローラの識別子"""
+    return re.sub(r'[^\w.-]+', '_', f'{idn}_{resource}').strip('_')
+
+
+class StageParams:
+    """1 軸分の設定値のスナップショット (値は装置の応答文字列のまま持つ)
+
+    values に無いレジスタは、次に読むときに装置から読みます。
+    """
+
+    def __init__(self, inst, idn, axis=1, resource='', cache_dir=CACHE_DIR):
+        self.inst = inst
+        self.idn = idn
+        self.axis = axis
+        self.path = os.path.join(cache_dir, f'{controller_id(idn, resource)}_AXI{axis}.json')
+        self.values = {}
+        self.read_at = None
+
+    @classmethod
+    def load(cls, inst, axis=1, cache_dir=CACHE_DIR, verify=True):
+        """*IDN? で装置を確かめ、キャッシュがあれば使い、なければ全レジスタを読みます。"""
+        resource = inst.ser.port if isinstance(inst, DS102Transport) else getattr(inst, 'resource_name', '')
+        checks = VERIFY if verify else ()
+        replies = _query_all(inst, ['*IDN?'] + [cls._command(axis, name) + '?' for name in checks])
+        params = cls(inst, replies[0], axis, resource, cache_dir)
+        if not params._read_cache():
+            params.refresh()
+        elif any(params.values.get(name, value) != value for name, value in zip(checks, replies[1:])):
+            # 他のプログラムが設定を変えている
+            params.refresh()
+        else:
+            missing = [name for name in REGISTERS if name not in params.values]
+            if missing:
+                params.refresh(missing)
+        return params
+
+    @staticmethod
+    def _command(axis, name):
+        return f'AXI{axis}:{REGISTERS[name][0]}'
+
+    # ---- キャッシュファイル ----
+    def _read_cache(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if data.get('idn') != self.idn:
+            return False
+        self.values = {name: value for name, value in data.get('values', {}).items() if name in REGISTERS}
+        self.read_at = data.get('read_at')
+        return True
+
+    def _write_cache(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'idn': self.idn, 'axis': self.axis, 'read_at': self.read_at,
+                       'values': self.values}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
+
+    # ---- 読み書き ----
+    def refresh(self, names=None):
+        """レジスタを装置からまとめて読み直します (names=None なら全部)。"""
+        names = list(REGISTERS if names is None else names)
+        replies = _query_all(self.inst, [self._command(self.axis, name) + '?' for name in names])
+        self.values.update(zip(names, replies))
+        self.read_at = time.strftime('%Y-%m-%d %H:%M:%S')
+        self._write_cache()
+
+    def __getitem__(self, name):
+        if name not in self.values:
+            self.refresh([name])
+        return self.values[name]
+
+    def set(self, name, value):
+        """値を書き込み、そのレジスタのキャッシュを捨てます。"""
+        self.inst.write(f'{self._command(self.axis, name)} {value}')
+        if self.values.pop(name, None) is not None:
+            self._write_cache()
+
+    @property
+    def speed(self):
+        return int(float(self['speed']))
+
+    def table(self):
+        """[(説明, 値)] を返します (表示・ログ用)。"""
+        return [(REGISTERS[name][1], self[name]) for name in REGISTERS]
@@ -0,0 +1,370 @@
+"""TASデータセットのバイナリ保存形式 (.tas)
+
+● なにをする？
+    GUI_ver3.6 の「Save / Load」で扱うデータセット群
+    (DARK_ref / DARK_sig / ref / sig / ref_p / sig_p の 6 チャンネル) を
+    タブ区切りテキスト入り JSON の代わりにバイナリで保存・読込します。
+    02_Analysis の DATAFLAME ツールからも同じ API で読めます。
+    DatasetStore はデータセット名の索引だけを先に読み、中身は参照時に読み込みます。
+
+● ファイル構成 (リトルエンディアン)
+    magic 'TASB' | version(u16) | reserved(u16) | header長(u32) | header(JSON, utf-8)
+    | 8byte 境界までパディング | データ領域
+    - header にはメタデータ・共通波長軸・各データセットの位置 (offset / size) を記録
+    - 共通の波長軸は float64、チャンネルは float32 (テキストから値が変わる場合のみ float64)
+    - offset はすべてデータ領域先頭からのバイト数
+
+● 旧 JSON との互換
+    import_legacy_json / export_legacy_json で相互変換できます。
+    数値はテキストの値をそのまま保持します (float32 で表せない値は float64 で保存)。
+"""
+
+import json
+import os
+import re
+import struct
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+import numpy as np
+
+# ------------------ 定数 ------------------
+MAGIC = b'TASB'
+VERSION = 1
+CHANNELS = ('DARK_ref', 'DARK_sig', 'ref', 'sig', 'ref_p', 'sig_p')
+ALIGN = 8
+
+_PREAMBLE = struct.Struct('<4sHHI')
+_NUMBER = re.compile(r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+
+
+# -------------- テキスト変換 --------------
+
+def parse_spectrum(text):
+    """タブ区切りテキストを (波長, 強度) の配列に変換します。"""
+    # 通常は 1 行 2 列の数値だけなので、まとめて NumPy で変換する
+    tokens = text.split()
+    if not tokens:
+        return np.empty(0, dtype=np.float64), np.empty(0, dtype=np.float64)
+    # 空行が無ければ「改行の数 + 1」が行数 (合わなければ 1 行ずつ解析)
+    n_lines = text.count('\n') + (not text.endswith('\n'))
+    if len(tokens) == 2 * n_lines:
+        try:
+            values = np.array(tokens, dtype=np.float64).reshape(-1, 2)
+            return values[:, 0].copy(), values[:, 1].copy()
+        except ValueError:
+            pass
+    return _parse_spectrum_lines(text)
+
+
+def _parse_spectrum_lines(text):
+    """崩れた行を含むテキストを 1 行ずつ解析します (parse_spectrum の予備)。"""
+    x_values, y_values = [], []
+    for line in text.splitlines():
+        parts = line.split()
+        try:
+            x, y = float(parts[0]), float(parts[1])
+        except (ValueError, IndexError):
+            # 単位や記号が混ざった行は数値らしきものだけ拾う
+            nums = _NUMBER.findall(line)
+            if len(nums) < 2:
+                continue
+            x, y = float(nums[0]), float(nums[1])
+        x_values.append(x)
+        y_values.append(y)
+    return np.array(x_values, dtype=np.float64), np.array(y_values, dtype=np.float64)
+
+
+def _format_values(values):
+    return [np.format_float_positional(v, unique=True, trim='-') for v in values]
+
+
+def format_spectrum(x, y):
+    """(波長, 強度) の配列を旧形式のタブ区切りテキストに変換します。"""
+    return '\n'.join(f'{a}\t{b}' for a, b in zip(_format_values(x), _format_values(y)))
+
+
+def _compact(values):
+    """テキストの値が変わらなければ float32 に詰めます。"""
+    values = np.asarray(values, dtype=np.float64)
+    packed = values.astype(np.float32)
+    if np.array_equal(packed.astype(str).astype(np.float64), values, equal_nan=True):
+        return packed
+    return values
+
+
+# -------------- データセット --------------
+
+class Dataset:
+    """1 データセット分 (6 チャンネル) のスペクトル"""
+
+    def __init__(self, channels=None):
+        # label -> (波長 float64, 強度 float32/float64)
+        self.channels = {}
+        for label, (x, y) in (channels or {}).items():
+            self.set_channel(label, x, y)
+
+    @classmethod
+    def from_legacy(cls, texts):
+        """{label: テキスト} の旧形式から作成します。"""
+        return cls({label: parse_spectrum(text) for label, text in texts.items()})
+
+    def to_legacy(self):
+        """{label: テキスト} の旧形式に戻します。"""
+        return {label: format_spectrum(x, y) for label, (x, y) in self.channels.items()}
+
+    def set_channel(self, label, x, y):
+        self.channels[label] = (np.asarray(x, dtype=np.float64), _compact(y))
+
+    def xy(self, label):
+        """計算用に (波長, 強度) を float64 で返します。"""
+        if label in self.channels:
+            x, y = self.channels[label]
+            return x, y.astype(np.float64)
+        return np.empty(0, dtype=np.float64), np.empty(0, dtype=np.float64)
+
+    def y(self, label):
+        return self.xy(label)[1]
+
+    @property
+    def wavelength(self):
+        """先頭チャンネル (通常 DARK_ref) の波長軸"""
+        for x, _ in self.channels.values():
+            if len(x):
+                return x
+        return np.empty(0, dtype=np.float64)
+
+
+# -------------- 保存 --------------
+
+def _pad(n):
+    return -n % ALIGN
+
+
+def save_tas(path, datasets, meta=None):
+    """{名前: Dataset} を .tas ファイルに保存します。"""
+    axes, blocks, offset = [], [], 0
+
+    def add_block(array):
+        nonlocal offset
+        array = np.ascontiguousarray(array)
+        data = array.astype(array.dtype.newbyteorder('<'), copy=False).tobytes()
+        entry = {'offset': offset, 'count': int(array.size), 'dtype': array.dtype.newbyteorder('<').str}
+        blocks.append(data + b'\0' * _pad(len(data)))
+        offset += len(data) + _pad(len(data))
+        return entry
+
+    def axis_index(x):
+        # 同じ波長軸は 1 回だけ保存する (先頭が共通軸)
+        for i, (known, _) in enumerate(axes):
+            if np.array_equal(known, x):
+                return i
+        axes.append((x, add_block(x)))
+        return len(axes) - 1
+
+    index = []
+    for name, dataset in datasets.items():
+        start = offset
+        axis_index(dataset.wavelength)
+        channels = {}
+        for label, (x, y) in dataset.channels.items():
+            entry = {'axis': axis_index(x)}
+            entry.update(add_block(y))
+            channels[label] = entry
+        index.append({'name': name, 'offset': start, 'size': offset - start, 'channels': channels})
+
+    header = {
+        'meta': {'created': time.strftime('%Y-%m-%dT%H:%M:%S'), **(meta or {})},
+        'channels': list(CHANNELS),
+        'axes': [entry for _, entry in axes],
+        'datasets': index,
+    }
+    header_bytes = json.dumps(header, ensure_ascii=False).encode('utf-8')
+    head = _PREAMBLE.pack(MAGIC, VERSION, 0, len(header_bytes)) + header_bytes
+    head += b'\0' * _pad(len(head))
+
+    # 途中で落ちても既存ファイルを壊さないよう一時ファイル経由で置き換える
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(head)
+        for block in blocks:
+            f.write(block)
+    os.replace(tmp_path, path)
+
+
+# -------------- 読込 --------------
+
+def read_header(f):
+    """ヘッダを読み、(header, データ領域の先頭位置) を返します。"""
+    magic, version, _, header_len = _PREAMBLE.unpack(f.read(_PREAMBLE.size))
+    if magic != MAGIC:
+        raise ValueError('TASファイルではありません')
+    if version > VERSION:
+        raise ValueError(f'未対応のバージョンです: {version}')
+    header = json.loads(f.read(header_len).decode('utf-8'))
+    head_len = _PREAMBLE.size + header_len
+    return header, head_len + _pad(head_len)
+
+
+def _block(buffer, entry, base=0):
+    return np.frombuffer(buffer, dtype=entry['dtype'], count=entry['count'],
+                         offset=entry['offset'] - base)
+
+
+def load_tas(path):
+    """.tas ファイルを読み込み、({名前: Dataset}, meta) を返します。"""
+    with open(path, 'rb') as f:
+        header, data_start = read_header(f)
+        f.seek(data_start)
+        buffer = f.read()
+
+    axes = [_block(buffer, entry) for entry in header['axes']]
+    datasets = {item['name']: _make_dataset(item, axes, buffer) for item in header['datasets']}
+    return datasets, header['meta']
+
+
+def _make_dataset(item, axes, buffer, base=0):
+    dataset = Dataset()
+    for label, entry in item['channels'].items():
+        dataset.channels[label] = (axes[entry['axis']], _block(buffer, entry, base))
+    return dataset
+
+
+# -------------- 旧 JSON 互換 --------------
+
+def _read_legacy_texts(path):
+    with open(path, 'r') as f:
+        data = json.load(f)
+    # save_data (1 データセット分) の形式はファイル名をデータセット名にする
+    if data and all(isinstance(v, str) for v in data.values()):
+        data = {os.path.splitext(os.path.basename(path))[0]: data}
+    return data
+
+
+def import_legacy_json(path):
+    """GUI_ver3.6 の JSON を {名前: Dataset} として読み込みます。"""
+    return {name: Dataset.from_legacy(texts) for name, texts in _read_legacy_texts(path).items()}
+
+
+def export_legacy_json(path, datasets):
+    """{名前: Dataset} を GUI_ver3.6 の JSON 形式で保存します。"""
+    with open(path, 'w') as f:
+        json.dump({name: dataset.to_legacy() for name, dataset in datasets.items()}, f)
+
+
+def is_tas_file(path):
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def load_datasets(path):
+    """.tas と旧 JSON のどちらでも {名前: Dataset} を返します。"""
+    if is_tas_file(path):
+        return load_tas(path)[0]
+    return import_legacy_json(path)
+
+
+def save_datasets(path, datasets, meta=None):
+    """拡張子が .json なら旧形式、それ以外は .tas で保存します。"""
+    if path.lower().endswith('.json'):
+        export_legacy_json(path, datasets)
+    else:
+        save_tas(path, datasets, meta)
+
+
+# -------------- 遅延読込 --------------
+
+class DatasetStore(MutableMapping):
+    """データセット名の索引だけを先に読み、中身は参照されたときに読み込む辞書
+
+    - .tas はヘッダ (名前・offset・size) だけを読み、参照時にその範囲だけ読む
+    - 旧 JSON はテキストのまま保持し、参照時に数値へ変換する
+    - ファイル由来のデータセットは最大 max_resident 件だけメモリに残す (LRU)
+    - 新しく追加・変更したデータセットはファイルに無いので常に保持する
+    """
+
+    def __init__(self, path=None, max_resident=16):
+        self.max_resident = max_resident
+        self._reset(path)
+
+    def _reset(self, path):
+        self.path = path
+        self.meta = {}
+        self._entries = {}               # 名前 -> 索引 (メモリ上のみなら None)
+        self._resident = OrderedDict()   # ファイル由来で読込済みのもの (LRU順)
+        self._memory = {}                # ファイルに無いもの
+        self._axes = []
+        self._data_start = 0
+        self._is_tas = False
+        if path is not None:
+            self._open_index(path)
+
+    def _open_index(self, path):
+        self._is_tas = is_tas_file(path)
+        if self._is_tas:
+            with open(path, 'rb') as f:
+                header, self._data_start = read_header(f)
+                axes = header['axes']
+                # 波長軸は小さく全データセットで共有するので先に読む
+                for entry in axes:
+                    f.seek(self._data_start + entry['offset'])
+                    raw = f.read(entry['count'] * np.dtype(entry['dtype']).itemsize)
+                    self._axes.append(np.frombuffer(raw, dtype=entry['dtype']))
+            self.meta = header['meta']
+            self._entries = {item['name']: item for item in header['datasets']}
+        else:
+            self._entries = dict(_read_legacy_texts(path))
+
+    def _materialize(self, name):
+        entry = self._entries[name]
+        if self._is_tas:
+            with open(self.path, 'rb') as f:
+                f.seek(self._data_start + entry['offset'])
+                buffer = f.read(entry['size'])
+            return _make_dataset(entry, self._axes, buffer, base=entry['offset'])
+        return Dataset.from_legacy(entry)
+
+    def __getitem__(self, name):
+        if name in self._memory:
+            return self._memory[name]
+        if name in self._resident:
+            self._resident.move_to_end(name)
+            return self._resident[name]
+        if self._entries.get(name) is None:
+            raise KeyError(name)
+        dataset = self._materialize(name)
+        self._resident[name] = dataset
+        while len(self._resident) > self.max_resident:
+            self._resident.popitem(last=False)
+        return dataset
+
+    def __setitem__(self, name, dataset):
+        self._resident.pop(name, None)
+        if name not in self._entries:
+            self._entries[name] = None
+        self._memory[name] = dataset
+
+    def __delitem__(self, name):
+        del self._entries[name]
+        self._resident.pop(name, None)
+        self._memory.pop(name, None)
+
+    def __iter__(self):
+        return iter(list(self._entries))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, name):
+        return name in self._entries
+
+    def save(self, path, meta=None):
+        """保存します。.tas で保存した場合は保存先を新しい索引として開き直します。"""
+        save_datasets(path, self, meta)
+        if is_tas_file(path):
+            self._reset(path)
+
+    @property
+    def resident_count(self):
+        return len(self._resident) + len(self._memory)
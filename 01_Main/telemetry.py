@@ -0,0 +1,210 @@
+"""取得タイミングのテレメトリ (フレーム間隔・装置間のずれ・コマンドの往復時間)
+
+● なにをする？
+    取得ループから ns 単位の時間を受け取り、項目ごとのヒストグラムに数えます。
+    ヒストグラムは HDR Histogram と同じ対数・線形のビンで、1 ns から約 18 分までを
+    相対誤差 1% 未満で数えます。何回記録してもメモリは一定で、記録は 1 回あたり
+    ビンの番号を計算して 1 つ足すだけです (取得スレッドから毎フレーム呼んでよい)。
+
+● 項目 (名前は自由。よく使うもの)
+    frame_interval.<装置>   フレームの到着間隔 (Ex_Trigger, paired_acquisition)
+    skew                    sig と ref の取得終了時刻の差 (paired_acquisition)
+    command_rtt.<操作>      ブローカー経由のコマンドの往復時間 (instrument_broker)
+    ずれのように負になる値は、負の側のビンに別に数えます (平均・percentile・最小・最大はすべて符号つき)。
+
+● 読む・書き出す
+    telemetry.default().summary()        # 取得中でも読める (GUI から)
+    telemetry.default().dump(log_dir)    # 測定の最後に TA_LOG へ JSON で書き出す
+        telemetry_YYYYmmdd_HHMMSS.json : 項目ごとのまとめと、0 でないビン [下限 ns, 数]
+                                         (負の側のビンは [-下限 ns, 数]。下限は絶対値の下限)
+        ログにも TELEMETRY {...} の行を項目ごとに書きます。
+
+● 使い方
+    tm = telemetry.default()
+    tm.interval('frame_interval.usb4000', time.perf_counter_ns())
+    tm.record('skew', t_ref - t_sig)
+    with tm.timed('command_rtt.query'):
+        inst.query('AXIs1:POSition?')
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+logger = logging.getLogger('telemetry')
+
+# ------------------ 設定 ------------------
+SUB_BITS = 8            # 2 倍ごとの区間を 128 ビンに分ける (相対誤差 < 1/128)
+MAX_BITS = 40           # 2**40 ns ≒ 18 分まで (それより長い値は最後のビン)
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+class Histogram:
+    """HDR 形式 (対数・線形のビン) の ns 単位のヒストグラム
+
+    0 以上の値と負の値は別のビンの列 (counts / negative) に絶対値で数えます。
+    """
+
+    def __init__(self, sub_bits=SUB_BITS, max_bits=MAX_BITS):
+        self.sub_bits = sub_bits
+        self.half = 1 << (sub_bits - 1)
+        self.max_value = (1 << max_bits) - 1
+        self.counts = [0] * (self._index(self.max_value) + 1)   # 記録が速いので list
+        self.negative = [0] * len(self.counts)                   # 負の値 (絶対値で数える)
+        self.count = 0
+        self.total = 0          # 符号つきの合計 (平均用)
+        self.min = None
+        self.max = None
+        self._lock = threading.Lock()
+
+    def _index(self, value):
+        # 2**sub_bits 未満はそのまま、それ以上は上位 sub_bits ビットで区切る
+        shift = max(value.bit_length() - self.sub_bits, 0)
+        return shift * self.half + (value >> shift)
+
+    def _lower(self, index):
+        """index 番目のビンの下限 [ns]"""
+        shift = max(index // self.half - 1, 0)
+        return (index - shift * self.half) << shift
+
+    def record(self, value_ns):
+        value = int(value_ns)
+        index = self._index(min(abs(value), self.max_value))
+        with self._lock:
+            (self.negative if value < 0 else self.counts)[index] += 1
+            self.count += 1
+            self.total += value
+            if self.min is None or value < self.min:
+                self.min = value
+            if self.max is None or value > self.max:
+                self.max = value
+
+    def _mid(self, index):
+        return (self._lower(index) + self._lower(index + 1) - 1) / 2
+
+    def percentiles(self, ps=PERCENTILES):
+        """符号つきの percentile [ns] (ビンの中央の値を [最小, 最大] に収めたもの) を返します。"""
+        with self._lock:
+            positive = np.array(self.counts, np.int64)
+            negative = np.array(self.negative, np.int64)
+            lo, hi = self.min, self.max
+        # 小さい順: 負の側は絶対値の大きいビンから
+        counts = np.concatenate((negative[::-1], positive))
+        cum = np.cumsum(counts)
+        if cum[-1] == 0:
+            return [float('nan')] * len(ps)
+        n = len(negative)
+        values = []
+        for p in ps:
+            index = int(np.searchsorted(cum, max(1, np.ceil(p / 100 * cum[-1]))))
+            value = -self._mid(n - 1 - index) if index < n else self._mid(index - n)
+            values.append(min(max(value, lo), hi))      # HdrHistogram と同じく最小・最大を超えない
+        return values
+
+    def summary(self):
+        """{'count', 'mean_ms', 'min_ms', 'p50_ms', ..., 'max_ms'} を返します。"""
+        with self._lock:
+            count, total, lo, hi = self.count, self.total, self.min, self.max
+        row = {'count': count, 'mean_ms': total / count / 1e6 if count else float('nan'),
+               'min_ms': lo / 1e6 if count else float('nan')}
+        for p, value in zip(PERCENTILES, self.percentiles()):
+            row[f'p{p:g}_ms'] = value / 1e6
+        row['max_ms'] = hi / 1e6 if count else float('nan')
+        return row
+
+    def buckets(self):
+        """0 でないビンの [(下限 ns, 数)] (負の側は (-下限 ns, 数), 小さい順)"""
+        with self._lock:
+            negative = [(-self._lower(i), n) for i, n in enumerate(self.negative) if n]
+            return negative[::-1] + [(self._lower(i), n) for i, n in enumerate(self.counts) if n]
+
+
+class Telemetry:
+    """項目ごとのヒストグラムの集まり (複数スレッドから記録してよい)"""
+
+    def __init__(self):
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._last = {}                 # interval 用: 項目 -> 前回の時刻 [ns]
+
+    def histogram(self, name):
+        with self._lock:
+            if name not in self._histograms:
+                self._histograms[name] = Histogram()
+            return self._histograms[name]
+
+    def record(self, name, value_ns):
+        """値 [ns] を 1 つ記録します。"""
+        self.histogram(name).record(value_ns)
+
+    def interval(self, name, t_ns):
+        """前回からの間隔を記録します (t_ns は perf_counter_ns の値)。"""
+        with self._lock:
+            last, self._last[name] = self._last.get(name), t_ns
+        if last is not None:
+            self.record(name, t_ns - last)
+
+    @contextmanager
+    def timed(self, name):
+        """with の中の時間を記録します (コマンドの往復時間など)。"""
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter_ns() - start)
+
+    def reset(self, name=None):
+        """ヒストグラムを空にします (name を省略するとすべて)。"""
+        with self._lock:
+            for key in [name] if name else list(self._histograms):
+                self._histograms.pop(key, None)
+                self._last.pop(key, None)
+
+    def summary(self):
+        """{項目: まとめ} を項目名の順で返します。"""
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+        return {name: histogram.summary() for name, histogram in histograms}
+
+    def format_summary(self, rows=None):
+        """summary() を表の文字列にします。"""
+        rows = self.summary() if rows is None else rows
+        columns = ['mean_ms'] + [f'p{p:g}_ms' for p in PERCENTILES] + ['max_ms']
+        lines = [f"{'metric':<26}{'count':>8}" + ''.join(f"{c[:-3]:>10}" for c in columns),
+                 f"{'':<26}{'':>8}" + ''.join(f"{'[ms]':>10}" for _ in columns)]
+        for name, row in rows.items():
+            lines.append(f"{name:<26}{row['count']:>8}" + ''.join(f"{row[c]:>10.3f}" for c in columns))
+        return '\n'.join(lines)
+
+    def dump(self, log_dir, log=logger):
+        """まとめとビンを log_dir に JSON で書き出し、ログと画面にも出します。書いたパスを返します。"""
+        os.makedirs(log_dir, exist_ok=True)
+        path = os.path.join(log_dir, time.strftime("telemetry_%Y%m%d_%H%M%S.json"))
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+        rows = {name: histogram.summary() for name, histogram in histograms}
+        data = {'started': self.started, 'finished': time.time(), 'sub_bits': SUB_BITS,
+                'metrics': {name: dict(rows[name], buckets=histogram.buckets())
+                            for name, histogram in histograms}}
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=1)
+        table = self.format_summary(rows)
+        print(table)
+        log.info("Telemetry summary\n" + table)
+        for name, row in rows.items():
+            log.info(f"TELEMETRY {json.dumps(dict(row, metric=name))}")
+        return path
+
+
+_default = Telemetry()
+
+
+def default():
+    """取得ループ・GUI で共有するテレメトリ"""
+    return _default
@@ -1,5 +1,5 @@
+import os
 import sys
-import json
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
@@ -9,6 +9,11 @@ from PyQt5.QtWidgets import (
 )
 from PyQt5.QtCore import Qt  # Qtをインポート
 
+# 01_Main の共通モジュール (tas_store, delta_abs) を読み込む
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '01_Main'))
+import tas_store
+import delta_abs
+
 class JsonToDataFrameApp(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -79,25 +84,20 @@ class JsonToDataFrameApp(QMainWindow):
 
     def load_json_file(self):
         options = QFileDialog.Options()
-        file_path, _ = QFileDialog.getOpenFileName(self, "Open JSON File", "", "JSON Files (*.json);;All Files (*)", options=options)
+        file_path, _ = QFileDialog.getOpenFileName(self, "Open JSON File", "", "TAS Files (*.tas *.json);;All Files (*)", options=options)
 
         if file_path:
             try:
-                with open(file_path, 'r') as f:
-                    data = json.load(f)
+                data = tas_store.load_datasets(file_path)
 
                 all_data = {}
                 wavelengths = None
 
-                for pulse_name, pulse_data in data.items():
-                    x_dark_ref, y_dark_ref = self.parse_data(pulse_data['DARK_ref'])
-                    _, y_dark_sig = self.parse_data(pulse_data['DARK_sig'])
-                    _, y_ref = self.parse_data(pulse_data['ref'])
-                    _, y_ref_p = self.parse_data(pulse_data['ref_p'])
-                    _, y_sig = self.parse_data(pulse_data['sig'])
-                    _, y_sig_p = self.parse_data(pulse_data['sig_p'])
-
-                    log_values = self.calculate_delta_abs(y_ref, y_ref_p, y_dark_ref, y_dark_sig, y_sig, y_sig_p)
+                # 全データセットのΔAbsをまとめて計算
+                names, log_matrix = delta_abs.compute_matrix(data)
+                for pulse_name, log_values in zip(names, log_matrix):
+                    x_dark_ref, _ = data[pulse_name].xy('DARK_ref')
+                    log_values = log_values[:len(x_dark_ref)]
 
                     if wavelengths is None:
                         wavelengths = x_dark_ref
@@ -122,28 +122,6 @@ class JsonToDataFrameApp(QMainWindow):
             except Exception as e:
                 QMessageBox.warning(self, "Error", f"Error loading file: {e}")
 
-    def parse_data(self, data):
-        x_values, y_values = [], []
-        for line in data.splitlines():
-            if line.strip():
-                parts = line.split()
-                try:
-                    x_values.append(float(parts[0]))
-                    y_values.append(float(parts[1]))
-                except (ValueError, IndexError):
-                    continue
-        return x_values, y_values
-
-    def calculate_delta_abs(self, y_ref, y_ref_p, y_dark_ref, y_dark_sig, y_sig, y_sig_p):
-        log_values = []
-        for ref_p_real, sig_real, sig_p_real, ref_real in zip(y_ref_p, y_sig, y_sig_p, y_ref):
-            if ref_real != 0 and sig_p_real != 0:
-                log_value = np.log((ref_p_real * sig_real) / (sig_p_real * ref_real))
-                log_values.append(log_value)
-            else:
-                log_values.append(np.nan)
-        return log_values
-
     def display_dataframe(self, df):
         self.data_display.clear()
         self.data_display.append(str(df))
@@ -173,14 +151,10 @@ class JsonToDataFrameApp(QMainWindow):
             for i, selected_wavelength in enumerate(selected_wavelengths):
                 if selected_wavelength in self.df.index:
                     values = self.df.loc[selected_wavelength]
-<<<<<<< HEAD
-                    plt.plot(self.df.columns, values, label=f'Wavelength {selected_wavelength} nm', linestyle='-')
-=======
                     # 色の濃さを調整
                     color = cmap((i + 0.6) / len(selected_wavelengths)) 
                     selected_wavelength = f"{selected_wavelength:.1f}"#有効数字は小数点以下1桁
                     plt.plot(self.df.columns, values, marker='o', label=f'Wavelength {selected_wavelength} nm', color=color)
->>>>>>> 60d4547b17fc7c39d8a77e2a1b20653372262dcd
             plt.title('ΔAbs at Selected Wavelengths')
             plt.xlabel('Pulse Position')
             plt.ylabel('ΔAbs')
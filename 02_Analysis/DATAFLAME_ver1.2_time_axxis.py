@@ -1,10 +1,15 @@
+import os
 import sys
-import json
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 from PyQt5.QtWidgets import QApplication, QMainWindow, QPushButton, QFileDialog, QMessageBox, QVBoxLayout, QWidget, QTextEdit
 
+# 01_Main の共通モジュール (tas_store, delta_abs) を読み込む
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '01_Main'))
+import tas_store
+import delta_abs
+
 class JsonToDataFrameApp(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -31,28 +36,22 @@ class JsonToDataFrameApp(QMainWindow):
 
     def load_json_file(self):
         options = QFileDialog.Options()
-        file_path, _ = QFileDialog.getOpenFileName(self, "JSONファイルを読み込む", "", "JSON Files (*.json);;All Files (*)", options=options)
+        file_path, _ = QFileDialog.getOpenFileName(self, "JSONファイルを読み込む", "", "TAS Files (*.tas *.json);;All Files (*)", options=options)
 
         if file_path:
             try:
-                with open(file_path, 'r') as f:
-                    data = json.load(f)
+                data = tas_store.load_datasets(file_path)
 
                 # データを格納するための辞書
                 all_data = {}
                 wavelengths = None
 
-                for pulse_name, pulse_data in data.items():
-                    # 各データセットの波長とΔAbsを取得
-                    x_dark_ref, y_dark_ref = self.parse_data(pulse_data['DARK_ref'])
-                    _, y_dark_sig = self.parse_data(pulse_data['DARK_sig'])
-                    _, y_ref = self.parse_data(pulse_data['ref'])
-                    _, y_ref_p = self.parse_data(pulse_data['ref_p'])
-                    _, y_sig = self.parse_data(pulse_data['sig'])
-                    _, y_sig_p = self.parse_data(pulse_data['sig_p'])
-
-                    # ΔAbsの計算
-                    log_values = self.calculate_delta_abs(y_ref, y_ref_p, y_dark_ref, y_dark_sig, y_sig, y_sig_p)
+                # 全データセットのΔAbsをまとめて計算
+                names, log_matrix = delta_abs.compute_matrix(data)
+                for pulse_name, log_values in zip(names, log_matrix):
+                    # 各データセットの波長を取得
+                    x_dark_ref, _ = data[pulse_name].xy('DARK_ref')
+                    log_values = log_values[:len(x_dark_ref)]
 
                     # 波長を保持
                     if wavelengths is None:
@@ -75,30 +74,6 @@ class JsonToDataFrameApp(QMainWindow):
             except Exception as e:
                 QMessageBox.warning(self, "エラー", f"ファイルの読み込み中にエラーが発生しました: {e}")
 
-    def parse_data(self, data):
-        """テキストデータを波長と強度のリストに変換します。"""
-        x_values, y_values = [], []
-        for line in data.splitlines():
-            if line.strip():
-                parts = line.split()
-                try:
-                    x_values.append(float(parts[0]))
-                    y_values.append(float(parts[1]))
-                except (ValueError, IndexError):
-                    continue
-        return x_values, y_values
-
-    def calculate_delta_abs(self, y_ref, y_ref_p, y_dark_ref, y_dark_sig, y_sig, y_sig_p):
-        """ΔAbsを計算する関数"""
-        log_values = []
-        for ref_p_real, sig_real, sig_p_real, ref_real in zip(y_ref_p, y_sig, y_sig_p, y_ref):
-            if ref_real != 0 and sig_p_real != 0:
-                log_value = np.log((ref_p_real * sig_real) / (sig_p_real * ref_real))
-                log_values.append(log_value)
-            else:
-                log_values.append(np.nan)
-        return log_values
-
     def display_dataframe(self, df):
         """データフレームをテキストエディットに表示"""
         self.data_display.clear()
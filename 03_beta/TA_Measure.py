@@ -1,11 +1,16 @@
 import os
 import time
 import logging
-import pyvisa as visa
 import serial
 import serial.tools.list_ports
 import subprocess
 import json
+import sys
+
+# 01_Main の共通モジュールを読み込む
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '01_Main'))
+import instrument_broker
+import instrument_discovery
 
 # コンフィグ設定
 def setup_config():
@@ -35,7 +40,7 @@ def set_coordinates():
 # 接続されている機器のリストを取得
 def get_connected_devices():
     global devices, rm
-    rm = visa.ResourceManager()
+    rm = instrument_broker.resource_manager()  # 装置はブローカーが開いたものを共有する
     devices = rm.list_resources()
     print('接続されている機器:', devices)
     logging.info('Connected devices: %s' % devices)
@@ -218,7 +223,7 @@ def init_shutter():
     logging.info('シャッターの初期化を開始します')
     
     global arduino
-    com_port = 'COM4'
+    com_port = instrument_discovery.find_port('ARDUINO') or 'COM4'  # 見つからなければ従来の COM4
     
     while True:
         available_ports = [com.device for com in serial.tools.list_ports.comports()]
@@ -239,7 +244,7 @@ def init_shutter():
                 print('無効な入力です。再度入力してください。')
         else:
             try:
-                arduino = serial.Serial(com_port, 9600, timeout=1)
+                arduino = instrument_broker.open_serial(com_port, baudrate=9600, timeout=1)  # ポートはブローカーが持つ
                 time.sleep(2)
 
                 if arduino.is_open:
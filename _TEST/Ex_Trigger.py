@@ -4,18 +4,27 @@ usb4000_easyconf.py  – 交互測定フレームワーク（変更容易版）
 ------------------------------------------------------------
 ◎ 変更したい値は Config クラスか外部 JSON/YAML だけ
 ◎ tqdm で進捗表示、PyQt5 + Matplotlib + Toolbar で可視化
+◎ フレームは固定長リング (float32)、ΔA は ON/OFF の逐次統計 (Welford) から計算
+◎ ON/OFF は到着時刻 (TTL 周期) で決める → トリガーを取りこぼしてもずれない
+  → 何フレーム取っても使うメモリは一定、ΔA と標準誤差は取得中も表示
+◎ 悪いショットは取得スレッドで除外 (ShotFilter)
+  → エネルギー (フレーム合計) の外れ・飽和ピクセル・宇宙線スパイクを移動窓の中央値/MAD で判定
+◎ フレーム間隔は 01_Main/telemetry に記録 → 取得中は GUI に表示、終了時に TA_LOG へ書き出し
 ◎ Python 3.9+  /  pip install seabreeze pyqt5 matplotlib tqdm pyyaml
 """
 
 # ─────────────────────────
 # 0. 標準 / サードパーティ
 # ─────────────────────────
-import sys, time, threading, collections, argparse, json, pathlib
-from dataclasses import dataclass, asdict
+import sys, time, threading, argparse, json, pathlib
+from dataclasses import dataclass, asdict, field
 import numpy as np
 from seabreeze.spectrometers import Spectrometer
 from tqdm import tqdm
 
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent / "01_Main"))
+import telemetry
+
 import matplotlib
 matplotlib.use("Qt5Agg")
 from matplotlib.backends.backend_qt5agg import (
@@ -24,6 +33,7 @@ from matplotlib.backends.backend_qt5agg import (
 )
 from matplotlib.figure import Figure
 from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout
+from PyQt5.QtCore import QTimer
 
 try:               # YAML は任意
     import yaml
@@ -38,7 +48,18 @@ class Config:
     freq_hz:   float = 70     # TTL 周波数 [Hz]
     pair_n:    int   = 1000       # ON/OFF ペア数
     integ_ms:  float = None      # 露光時間 [ms] (None→周期×0.4)
-    ring_len:  int   = 512       # リングバッファ長 (frames)
+    ring_len:  int   = 512       # リングバッファ長 (frames, ヒートマップ・間隔表示用)
+    refresh_ms: int  = 500       # 表示の更新間隔 [ms]
+    jitter_tol: float = 0.4      # 到着時刻のずれの許容 (周期に対する割合)
+    scatter_band: tuple = None   # ポンプ散乱光の波長帯 (nm_min, nm_max)。指定すると強度でも ON/OFF を確認
+    resync_n:  int   = 3         # 強度と時刻の判定がこの回数続けて食い違ったら位相を合わせ直す
+    reject_window: int = 64      # 外れ判定に使う移動窓 (ON / OFF 別, frames)
+    spike_k:   float = 6.0       # ピクセルが中央値から spike_k·σ (σ = 1.4826·MAD) 離れたらスパイク
+    energy_k:  float = 5.0       # フレーム合計が中央値から energy_k·σ 離れたら除外 (レーザー落ちなど)
+    sat_level: float = 60000     # これ以上のピクセルは飽和とみなす (USB4000 は 65535, ダーク補正後なので少し下げる)
+    noise_floor: float = 10.0    # σ の下限 [counts] (MAD が 0 に近いピクセルで誤判定しないように)
+    max_bad_frac: float = 0.02   # 飽和・スパイクのピクセルがこの割合を超えたらフレームごと除外
+    log_dir:   str   = str(pathlib.Path(__file__).resolve().parent.parent / "TA_LOG")  # テレメトリの書き出し先
     cmap:      str   = "viridis" # ヒートマップ用カラーマップ
     title:     str   = "USB4000 Viewer"
 
@@ -54,12 +75,316 @@ def load_config_from_file(path: pathlib.Path) -> Config:
     return Config(**{**asdict(Config()), **(data or {})})
 
 # ─────────────────────────
-# 3. データ取得スレッド
+# 3. リングバッファ & ON/OFF 逐次統計
+# ─────────────────────────
+class FrameRing:
+    """(capacity, n_pixels) float32 の固定長リング。書き込むのは取得スレッド 1 本だけ
+
+    count (書き込んだ総フレーム数) はフレームを書き終えてから進めるので、書き込み側にロックは不要。
+    読む側は count を前後で確かめ、読んでいる間に上書きされたフレームは捨てる。
+    """
+
+    def __init__(self, capacity: int, n_pixels: int):
+        self.capacity = capacity
+        self.frames = np.zeros((capacity, n_pixels), np.float32)
+        self.ts = np.zeros(capacity, np.float64)
+        self.is_on = np.zeros(capacity, bool)
+        self.count = 0
+
+    def push(self, t: float, intens, is_on: bool):
+        i = self.count % self.capacity
+        self.frames[i] = intens
+        self.ts[i] = t
+        self.is_on[i] = is_on
+        self.count += 1              # 書き終えてから公開
+
+    def snapshot(self):
+        """古い順の (ts, frames, is_on) のコピーを返す"""
+        end = self.count
+        start = max(0, end - self.capacity)
+        idx = np.arange(start, end) % self.capacity
+        ts, frames, is_on = self.ts[idx], self.frames[idx], self.is_on[idx]
+        # 上書きされた分 (古い側) と、書き込み中かもしれないスロット (count が進む前の 1 つ) を捨てる
+        # (満杯なら count が変わっていなくても、いちばん古いフレームは書き込み中かもしれない)
+        now = self.count
+        lost = max(0, now + 1 - self.capacity - start)
+        return ts[lost:], frames[lost:], is_on[lost:]
+
+
+class Welford:
+    """ピクセルごとの平均・分散を 1 フレームずつ更新 (メモリは一定)
+
+    mask (bool 配列) を渡すと True のピクセルだけ更新する。そのため数 n もピクセルごと。
+    """
+
+    def __init__(self, n_pixels: int):
+        self.frames = 0              # 加えたフレーム数
+        self.n = np.zeros(n_pixels, np.int64)
+        self.mean = np.zeros(n_pixels)
+        self.m2 = np.zeros(n_pixels)
+
+    def add(self, x, mask=None):
+        self.frames += 1
+        if mask is None:
+            self.n += 1
+            d = x - self.mean
+        else:
+            self.n += mask
+            d = np.where(mask, x - self.mean, 0.0)   # 除外したピクセルは変えない
+        self.mean += d / np.maximum(self.n, 1)
+        self.m2 += d * (x - self.mean)
+
+    def var(self):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(self.n > 1, self.m2 / (self.n - 1), np.nan)
+
+    def sem(self):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.sqrt(self.var() / self.n)
+
+
+class OnOffStats:
+    """ON / OFF それぞれの逐次統計と ΔA = -log10(ON/OFF) ± 標準誤差"""
+
+    def __init__(self, n_pixels: int):
+        self.on = Welford(n_pixels)
+        self.off = Welford(n_pixels)
+        self._lock = threading.Lock()   # 表示側が更新途中の配列を読まないように
+
+    def add(self, intens, is_on: bool, mask=None):
+        x = np.asarray(intens, np.float64)
+        with self._lock:
+            (self.on if is_on else self.off).add(x, mask)
+
+    def delta_a(self):
+        """(ΔA, 標準誤差, ON の数, OFF の数) を返す"""
+        with self._lock:
+            m_on, m_off = self.on.mean.copy(), self.off.mean.copy()
+            se_on, se_off = self.on.sem(), self.off.sem()
+            n_on, n_off = self.on.frames, self.off.frames
+        with np.errstate(divide="ignore", invalid="ignore"):
+            dA = -np.log10(m_on / m_off)
+            # 誤差の伝搬: σ(ΔA) = 1/ln10 · √((σ_on/I_on)² + (σ_off/I_off)²)
+            se = np.sqrt((se_on / m_on) ** 2 + (se_off / m_off) ** 2) / np.log(10)
+        dA[~np.isfinite(dA)] = 0
+        return dA, se, n_on, n_off
+
+
+class ShotParity:
+    """フレームの到着時刻 (と任意でポンプ散乱光の強度) から ON/OFF を決める
+
+    TTL の周期 T ごとに 1 ショット、ポンプは 1 ショットおきに ON (最初のフレーム = ON)。
+    推定したショット時刻からの経過を T で割ってショット番号を進めるので、
+    トリガーを取りこぼしても (経過 ≈ 2T) 以降の ON/OFF はずれない。取りこぼし数は dropped に数える。
+    ショット時刻と周期は到着時刻の残差で少しずつ補正する (1 フレームの揺らぎに引きずられない)。
+    残差が jitter_tol·T を超えたフレームは判定不能 (ok=False) として統計に使わない。
+    band を指定すると、散乱光の強度が ON / OFF の平均レベルのどちらに近いかも調べる。
+    散乱光があるほうを ON とし、時刻による判定と resync_n 回続けて食い違ったら位相を反転させる
+    (resyncs に数える)。
+    """
+
+    def __init__(self, period_s: float, band=None, jitter_tol: float = 0.4,
+                 resync_n: int = 3, gain: float = 0.1):
+        self.period = period_s
+        self.band = band             # 散乱光の波長帯のマスク (bool 配列) または None
+        self.jitter_tol = jitter_tol
+        self.resync_n = resync_n
+        self.gain = gain
+        self.shot = -1
+        self.t_shot = None           # 推定した現在のショット時刻
+        self.flip = False
+        self.dropped = 0
+        self.resyncs = 0
+        self.ambiguous = 0
+        self._disagree = 0
+        self._level = {True: None, False: None}   # ON / OFF の散乱光レベル (指数移動平均)
+
+    def assign(self, t: float, intens):
+        """(ショット番号, ON か, 統計に使ってよいか) を返す"""
+        ok = True
+        if self.t_shot is None:
+            steps, self.t_shot = 1, t
+        else:
+            steps = max(1, round((t - self.t_shot) / self.period))
+            predicted = self.t_shot + steps * self.period
+            residual = t - predicted
+            if abs(residual) <= self.jitter_tol * self.period:
+                self.t_shot = predicted + self.gain * residual
+                self.period += self.gain ** 2 * residual / steps
+            else:
+                self.t_shot = t
+                ok = False
+            self.dropped += steps - 1
+        self.shot += steps
+        is_on = (self.shot % 2 == 0) != self.flip
+        if self.band is not None:
+            is_on, ok = self._check_intensity(intens, is_on, ok)
+        if not ok:
+            self.ambiguous += 1
+        return self.shot, is_on, ok
+
+    def _check_intensity(self, intens, is_on: bool, ok: bool):
+        level = float(np.mean(np.asarray(intens)[self.band]))
+        on_lvl, off_lvl = self._level[True], self._level[False]
+        if on_lvl is None or off_lvl is None:
+            ok = False                   # 両方のレベルが分かるまでは統計に使わない
+        else:
+            guess = abs(level - on_lvl) < abs(level - off_lvl)
+            if guess != is_on:
+                self._disagree += 1
+                if self._disagree < self.resync_n:
+                    return is_on, False  # 食い違っている間は統計に使わない
+                self.flip = not self.flip
+                self.resyncs += 1
+                is_on = guess
+            self._disagree = 0
+        prev = self._level[is_on]
+        self._level[is_on] = level if prev is None else prev + 0.05 * (level - prev)
+        # 散乱光のある (明るい) ほうが ON。逆に覚えていたら位相を反転する
+        on_lvl, off_lvl = self._level[True], self._level[False]
+        if on_lvl is not None and off_lvl is not None and on_lvl < off_lvl:
+            self.flip = not self.flip
+            self.resyncs += 1
+            self._level = {True: off_lvl, False: on_lvl}
+            is_on = not is_on
+            ok = False
+        return is_on, ok
+
+
+class RobustWindow:
+    """直近 capacity フレームのピクセルごとの中央値・MAD とフレーム合計の中央値・MAD
+
+    中央値の計算は (capacity, n_pixels) の配列に対する np.median 1 回だが、
+    毎フレームだと重いので update_every フレームごとに計算し直す (それまでは前の値を使う)。
+    """
+
+    def __init__(self, capacity: int, n_pixels: int, update_every: int = 8):
+        self.capacity = capacity
+        self.update_every = update_every
+        self.frames = np.zeros((capacity, n_pixels), np.float32)
+        self.energy = np.zeros(capacity)
+        self.count = 0               # 窓に入れたフレーム数
+        self.n_energy = 0            # 窓に入れたフレーム合計の数
+        self.med = self.sigma = None
+        self.e_med = self.e_sigma = None
+
+    def push(self, x, energy: float):
+        self.frames[self.count % self.capacity] = x
+        self.count += 1
+        self.push_energy(energy)
+        if self.count % self.update_every == 0:
+            filled = self.frames[:min(self.count, self.capacity)]
+            self.med = np.median(filled, axis=0)
+            self.sigma = 1.4826 * np.median(np.abs(filled - self.med), axis=0)
+
+    def push_energy(self, energy: float):
+        self.energy[self.n_energy % self.capacity] = energy
+        self.n_energy += 1
+        if self.n_energy % self.update_every == 0:
+            filled = self.energy[:min(self.n_energy, self.capacity)]
+            self.e_med = float(np.median(filled))
+            self.e_sigma = 1.4826 * float(np.median(np.abs(filled - self.e_med)))
+
+
+class ShotFilter:
+    """悪いショットを取得スレッドの中で 1 フレームずつ除外する
+
+    ON / OFF は明るさが違うので、それぞれ別の移動窓 (RobustWindow) と比べる。
+      1. 飽和   : sat_level 以上のピクセルは使わない
+      2. エネルギー : フレーム合計が窓の中央値から energy_k·σ 以上ずれたらフレームごと除外
+                      (レーザー落ち・ポンプの大きな揺らぎ)
+      3. スパイク : 窓の中央値から spike_k·σ 以上ずれたピクセル (宇宙線) は使わない
+    飽和・スパイクのピクセルが max_bad_frac を超えたフレームはフレームごと除外する。
+    窓が min_fill フレームたまるまでは飽和だけを調べる。
+    エネルギーで除外したフレームはピクセルの窓には入れない (合計の窓には入れるので、
+    レーザー出力が本当に変わったときは窓の半分ほどで新しいレベルに追従する)。
+    """
+
+    def __init__(self, n_pixels: int, window: int = 64, spike_k: float = 6.0,
+                 energy_k: float = 5.0, sat_level: float = 60000, noise_floor: float = 10.0,
+                 max_bad_frac: float = 0.02, min_fill: int = 32):
+        self.n_pixels = n_pixels
+        self.spike_k = spike_k
+        self.energy_k = energy_k
+        self.sat_level = sat_level
+        self.noise_floor = noise_floor
+        self.max_bad_frac = max_bad_frac
+        self.min_fill = min_fill
+        self.windows = {True: RobustWindow(window, n_pixels), False: RobustWindow(window, n_pixels)}
+        # 除外の集計 (測定 1 回分)
+        self.frames = 0
+        self.kept = 0
+        self.rejected = {"energy": 0, "saturation": 0, "spike": 0}
+        self.masked_pixels = {"saturation": 0, "spike": 0}   # 使ったフレームの中で除外したピクセル数
+
+    def check(self, intens, is_on: bool):
+        """(統計に使うか, 使うピクセルのマスク) を返す"""
+        x = np.asarray(intens, np.float64)
+        win = self.windows[is_on]
+        self.frames += 1
+        sat = x >= self.sat_level
+
+        if win.med is None or win.count < self.min_fill:
+            win.push(x, float(x.sum()))
+            return self._accept(sat, None)
+
+        limit = self.spike_k * np.maximum(win.sigma, self.noise_floor)
+        spike = (np.abs(x - win.med) > limit) & ~sat
+        # 合計は上側を切ってから取る (スパイク・飽和の数ピクセルでフレームごと捨てないように)
+        energy = float(np.where(sat, win.med, np.minimum(x, win.med + limit)).sum())
+        if win.e_med is not None:
+            e_sigma = max(win.e_sigma, self.noise_floor * np.sqrt(self.n_pixels))
+            if abs(energy - win.e_med) > self.energy_k * e_sigma:
+                win.push_energy(energy)
+                self.rejected["energy"] += 1
+                return False, None
+
+        win.push(x, energy)
+        n_sat, n_spike = int(sat.sum()), int(spike.sum())
+        if n_sat + n_spike > self.max_bad_frac * self.n_pixels:
+            self.rejected["saturation" if n_sat >= n_spike else "spike"] += 1
+            return False, None
+        return self._accept(sat, spike)
+
+    def _accept(self, sat, spike):
+        self.kept += 1
+        bad = sat if spike is None else sat | spike
+        self.masked_pixels["saturation"] += int(sat.sum())
+        if spike is not None:
+            self.masked_pixels["spike"] += int(spike.sum())
+        return True, (~bad if bad.any() else None)
+
+    def summary(self) -> dict:
+        return {"frames": self.frames, "kept": self.kept,
+                "rejected": dict(self.rejected), "masked_pixels": dict(self.masked_pixels)}
+
+    def format_summary(self) -> str:
+        r, m = self.rejected, self.masked_pixels
+        return (f"frames {self.frames}, kept {self.kept}, rejected: energy {r['energy']} / "
+                f"saturation {r['saturation']} / spike {r['spike']}, "
+                f"masked pixels: saturation {m['saturation']} / spike {m['spike']}")
+
+
+@dataclass
+class Live:
+    """取得スレッドと表示の間で共有する状態"""
+    wl:    np.ndarray = None
+    ring:  FrameRing  = None
+    stats: OnOffStats = None
+    parity: ShotParity = None
+    filt:  ShotFilter = None
+    ready: threading.Event = field(default_factory=threading.Event)
+
+# ─────────────────────────
+# 4. データ取得スレッド
 # ─────────────────────────
+INTERVAL = "frame_interval.usb4000"   # テレメトリの項目名
+
+
 def start_grabber(cfg: Config,
-                  ring: collections.deque,
+                  live: Live,
                   stop_evt: threading.Event):
-    """USB4000 を edge-trigger で連続取得し deque に push"""
+    """USB4000 を edge-trigger で連続取得し、リングと ON/OFF 統計に入れる"""
     def _worker():
         try:
             dev = Spectrometer.from_first_available()
@@ -71,73 +396,138 @@ def start_grabber(cfg: Config,
         dev.trigger_mode(2)  # External-edge
         dev.integration_time_micros(int(integ * 1000))
 
+        live.wl = dev.wavelengths()
+        live.ring = FrameRing(cfg.ring_len, len(live.wl))
+        live.stats = OnOffStats(len(live.wl))
+        band = None
+        if cfg.scatter_band:
+            band = (live.wl >= cfg.scatter_band[0]) & (live.wl <= cfg.scatter_band[1])
+        live.parity = ShotParity(1 / cfg.freq_hz, band, cfg.jitter_tol, cfg.resync_n)
+        live.filt = ShotFilter(len(live.wl), cfg.reject_window, cfg.spike_k, cfg.energy_k,
+                               cfg.sat_level, cfg.noise_floor, cfg.max_bad_frac)
+        live.ready.set()
+
         try:
-            for _ in tqdm(range(cfg.pair_n * 2),
-                          desc="Acquiring", ncols=80, colour="cyan"):
+            bar = tqdm(range(cfg.pair_n * 2), desc="Acquiring", ncols=80, colour="cyan")
+            for k in bar:
                 if stop_evt.is_set():
                     break
                 wl, intens = dev.spectrum(correct_dark_counts=True)
-                ring.append((time.perf_counter(), intens))
+                t_ns = time.perf_counter_ns()
+                t = t_ns / 1e9
+                telemetry.default().interval(INTERVAL, t_ns)
+                # ON/OFF は到着順ではなく到着時刻から決める (取りこぼしてもずれない)
+                shot, is_on, ok = live.parity.assign(t, intens)
+                live.ring.push(t, intens, is_on)
+                if ok:
+                    keep, mask = live.filt.check(intens, is_on)
+                    if keep:
+                        live.stats.add(intens, is_on, mask)
+                if k % 50 == 0:
+                    bar.set_postfix(drop=live.parity.dropped, resync=live.parity.resyncs,
+                                    reject=live.filt.frames - live.filt.kept)
         finally:
             dev.close()
             stop_evt.set()
+            tqdm.write("[REJECT] " + live.filt.format_summary())
+            tqdm.write("[TELEMETRY] " + telemetry.default().dump(cfg.log_dir))
 
     threading.Thread(target=_worker, daemon=True).start()
 
 # ─────────────────────────
-# 4. PyQt5 GUI
+# 5. PyQt5 GUI (取得中も refresh_ms ごとに更新)
 # ─────────────────────────
 class PlotWin(QWidget):
-    def __init__(self, cfg: Config, wl, dA, heat, deltas):
+    def __init__(self, cfg: Config, live: Live, stop_evt: threading.Event):
         super().__init__()
         self.setWindowTitle(cfg.title)
+        self.cfg, self.live, self.stop_evt = cfg, live, stop_evt
 
-        fig = Figure(figsize=(8, 9), tight_layout=True)
-        canvas = FigureCanvas(fig)
-        toolbar = NavigationToolbar(canvas, self)
+        self.fig = Figure(figsize=(8, 9), tight_layout=True)
+        self.canvas = FigureCanvas(self.fig)
+        toolbar = NavigationToolbar(self.canvas, self)
 
         layout = QVBoxLayout(self)
         layout.addWidget(toolbar)
-        layout.addWidget(canvas)
+        layout.addWidget(self.canvas)
+
+        self.ax1 = self.fig.add_subplot(3, 1, 1)
+        self.ax2 = self.fig.add_subplot(3, 1, 2)
+        self.ax3 = self.fig.add_subplot(3, 1, 3)
+        self.colorbar = None
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(cfg.refresh_ms)
 
-        # (1) 平均 ΔA
-        ax1 = fig.add_subplot(3, 1, 1)
+    def refresh(self):
+        if not self.live.ready.is_set():
+            return
+        if self.stop_evt.is_set():
+            self.timer.stop()        # 取得終了後は最後に 1 回だけ描く
+        cfg, wl = self.cfg, self.live.wl
+        ts, frames, is_on = self.live.ring.snapshot()
+        if len(ts) == 0:
+            return
+        dA, se, n_on, n_off = self.live.stats.delta_a()
+
+        # (1) 平均 ΔA ± 標準誤差 (全フレーム)
+        ax1 = self.ax1
+        ax1.clear()
         ax1.plot(wl, dA, lw=1.2)
+        ax1.fill_between(wl, dA - se, dA + se, alpha=.3, lw=0)
         ax1.set(xlabel="Wavelength / nm", ylabel="ΔA",
-                title="Averaged ΔA (ON / OFF)")
+                title=f"Averaged ΔA (ON {n_on} / OFF {n_off}, dropped {self.live.parity.dropped}, "
+                      f"resync {self.live.parity.resyncs}, skipped {self.live.parity.ambiguous}, "
+                      f"rejected {self.live.filt.frames - self.live.filt.kept})")
         ax1.grid(ls="--", alpha=.5)
 
-        # (2) ヒートマップ
-        ax2 = fig.add_subplot(3, 1, 2)
+        # (2) ヒートマップ (リング内の最新フレーム, OFF → ON の順)
+        off, on = frames[~is_on], frames[is_on]
+        heat = np.vstack((off, on))
+        ax2 = self.ax2
+        ax2.clear()
         im = ax2.imshow(
             heat, aspect="auto", origin="lower",
             extent=[wl.min(), wl.max(), 0, heat.shape[0]-1],
             cmap=cfg.cmap
         )
-        fig.colorbar(im, ax=ax2, label="Intensity (arb. u.)")
+        if self.colorbar is None:
+            self.colorbar = self.fig.colorbar(im, ax=ax2, label="Intensity (arb. u.)")
+        else:
+            self.colorbar.update_normal(im)
         ax2.set(
             xlabel="Wavelength / nm",
-            ylabel=f"Shot index\n(0–{cfg.pair_n-1}: OFF, {cfg.pair_n}–{cfg.pair_n*2-1}: ON)",
-            title="Raw intensity map"
+            ylabel=f"Shot index\n(0–{len(off)-1}: OFF, {len(off)}–{len(heat)-1}: ON)",
+            title="Raw intensity map (latest frames)"
         )
 
         # (3) 取り込み間隔ヒスト
+        deltas = np.diff(ts) * 1e3  # ms
         T_target = 1 / cfg.freq_hz * 1e3
-        ax3 = fig.add_subplot(3, 1, 3)
-        ax3.hist(deltas, bins=40, range=(0, T_target * 1.6), color="teal")
+        ax3 = self.ax3
+        ax3.clear()
+        if len(deltas):
+            ax3.hist(deltas, bins=40, range=(0, T_target * 1.6), color="teal")
+            mean, std = deltas.mean(), deltas.std()
+        else:
+            mean = std = float("nan")
+        # 測定開始からの全フレーム (テレメトリ)
+        run = telemetry.default().summary().get(INTERVAL)
+        run_text = f"  |  run p99 {run['p99_ms']:.2f} ms  max {run['max_ms']:.2f} ms" if run else ""
         ax3.axvline(T_target, color="crimson", ls="--",
                     label=f"{T_target:.0f} ms target")
-        mean, std = deltas.mean(), deltas.std()
         ax3.set(
             xlabel="Acquisition interval / ms",
             ylabel="Frequency",
-            title=f"Interval  |  Mean {mean:.2f} ms  Std {std:.2f} ms"
+            title=f"Interval  |  Mean {mean:.2f} ms  Std {std:.2f} ms{run_text}"
         )
         ax3.legend()
         ax3.grid(ls="--", alpha=.5)
+        self.canvas.draw_idle()
 
 # ─────────────────────────
-# 5. Main
+# 6. Main
 # ─────────────────────────
 def main():
     # -- CLI
@@ -147,35 +537,25 @@ def main():
 
     cfg = load_config_from_file(pathlib.Path(cli_args.cfg)) if cli_args.cfg else Config()
 
-    # -- Ring & Grabber
-    ring = collections.deque(maxlen=cfg.ring_len)
+    # -- Grabber (リングと ON/OFF 統計は分光器を開いたあとに確保)
+    live = Live()
     stop_evt = threading.Event()
-    start_grabber(cfg, ring, stop_evt)
+    start_grabber(cfg, live, stop_evt)
 
-    # -- 待機
-    while not stop_evt.is_set():
+    # -- 分光器が開くまで待機
+    while not (live.ready.is_set() or stop_evt.is_set()):
         time.sleep(0.1)
-    if not ring:
+    if not live.ready.is_set():
         print("[ERROR] no frames captured"); return
 
-    # -- データ整形
-    ts, frames = zip(*ring)
-    ts = np.asarray(ts)
-    frames = np.asarray(frames)
-
-    wl_axis = Spectrometer.from_first_available().wavelengths()
-    on, off = frames[0::2], frames[1::2]
-    dA = -np.log10(on.mean(0) / off.mean(0))
-    dA[~np.isfinite(dA)] = 0
-    heat = np.vstack((off, on))
-    intervals = np.diff(ts) * 1e3  # ms
-
-    # -- GUI
+    # -- GUI (取得中も更新)
     app = QApplication(sys.argv)
-    win = PlotWin(cfg, wl_axis, dA, heat, intervals)
+    win = PlotWin(cfg, live, stop_evt)
     win.resize(820, 920)   # ← resize は戻り値 None
     win.show()
-    sys.exit(app.exec_())
+    code = app.exec_()
+    stop_evt.set()
+    sys.exit(code)
 
 # ─────────────────────────
 if __name__ == "__main__":
@@ -1,20 +1,39 @@
-import os, io, time, configparser, logging, serial, datetime
-import pyautogui, clipboard, subprocess, json
-import pyvisa as visa 
+import os, sys, time, configparser, logging, serial, datetime
+import subprocess
 import matplotlib.pyplot as plt
-import pandas as pd
 import numpy as np
 
+# 01_Main の共通モジュールを読み込む
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '01_Main'))
+import spectrometer_backend
+import paired_acquisition
+import measurement_pipeline
+import measurement_journal
+import phase_profiler
+import run_writer
+import stage_motion
+import stage_params
+import telemetry
+import instrument_broker
+import instrument_discovery
+
+# '--simulate' を付けて起動すると疑似分光器で動かす
+SIMULATE = '--simulate' in sys.argv
+# '--resume <ジャーナル>' を付けて起動すると、止まった測定の続きから測定する
+RESUME_PATH = sys.argv[sys.argv.index('--resume') + 1] if '--resume' in sys.argv else None
+
 # 装置の初期化
 def instrument_initialized():
-    global ser, sta, config, FSpeed
+    global ser, sta, stage, params, config, FSpeed
 
     #シャッターの初期化
     print(">>   Connecting to SIGMA MARK-202...")
     logging.info("Connecting to SIGMA MARK-202...")
     time.sleep(1)
-    port, baudrate, timeout, parity, bytesize, stopbits, xonxoff, rtscts, dsrdtr = "COM1", 9600, 3, serial.PARITY_NONE, serial.EIGHTBITS, serial.STOPBITS_ONE, False, False, False
-    ser = serial.Serial(port, baudrate, timeout=timeout, parity=parity, bytesize=bytesize, stopbits=stopbits, xonxoff=xonxoff, rtscts=rtscts, dsrdtr=dsrdtr)
+    mark_port = instrument_discovery.find_port('MARK-202') or "COM1"  # 見つからなければ従来の COM1
+    port, baudrate, timeout, parity, bytesize, stopbits, xonxoff, rtscts, dsrdtr = mark_port, 9600, 3, serial.PARITY_NONE, serial.EIGHTBITS, serial.STOPBITS_ONE, False, False, False
+    # ポートはブローカーが持つ (シャッターの GUI と同時に使える)
+    ser = instrument_broker.open_serial(port, baudrate=baudrate, timeout=timeout, parity=parity, bytesize=bytesize, stopbits=stopbits, xonxoff=xonxoff, rtscts=rtscts, dsrdtr=dsrdtr)
     logging.info(f"port:{port}, baudrate{baudrate}, timeout={timeout}, parity={parity}, bytesize={bytesize}, stopbits={stopbits}, xonxoff={xonxoff}, rtscts={rtscts}, dsrdtr={dsrdtr}")
     time.sleep(1)
     print(">>   Successful connection to SIGMA MARK-202.")
@@ -28,34 +47,25 @@ def instrument_initialized():
     #ステージの初期化
     print(">>   Connecting to SURUGA D220...")
     logging.info("Connecting to SURUGA D220...")
-    rm = visa.ResourceManager()
+    rm = instrument_broker.resource_manager()  # D220 はブローカーが開いたものを共有する
     sta=rm.open_resource('GPIB1::7::INSTR')
-    time.sleep(1)
+    # 固定パラメータはコントローラごとのキャッシュから読み、確認の問い合わせは 1 回だけ
+    params = stage_params.StageParams.load(sta)
+    stage = stage_motion.SurugaStage(sta, params=params)  # 移動完了はステータス(SB1?)で待つ
     print(">>   Successful connection to SURUGA D220.")
     logging.info("Successful connection to SURUGA D220.")
-    time.sleep(1)
-    print(u"Driver ID: ", sta.query("*IDN?"))
-    logging.info(f"Driver ID: {sta.query('*IDN?')}")
-    time.sleep(0.5)
+    print(u"Driver ID: ", params.idn)
+    logging.info(f"Driver ID: {params.idn}")
     print("Initialising...")
-    sta.write("AXIs1:DRiverDIVision 1")
-    sta.write("AXIs1:Fspeed0 5000")#駆動速度
-    FSpeed=sta.query('AXIs1:Fspeed0?')
-    time.sleep(0.5)
+    params.set('division', 1)
+    params.set('speed', 5000)#駆動速度
+    FSpeed=params['speed']
 
     print('-------------------- ステージパラメータ--------------------')
-    print(f"1パルス移動量(um): {sta.query('AXis1:RESOLUTion?')}")
-    logging.info(f"1-pulse travel distance (um): {sta.query('AXis1:RESOLUTion?')}")
-    #print(f"定パルス移動量(um): {sta.query('AXis1:PULSe?')}")
-    logging.info(f"Constant pulse travel distance (um): {sta.query('AXis1:PULSe?')}")    
-    print(f"ドライバ分割数(FULL:0, HALF1):  {sta.query('AXis1:DRiverDIVision?')}")
-    logging.info(f"Number of driver divisions (FULL:0, HALF1):  {sta.query('AXis1:DRiverDIVision?')}")
-    print(f"分解能(pulse): {sta.query('AXis1:RESOLUTion?')}")
-    logging.info(f"Resolution (pulse): {sta.query('AXis1:RESOLUTion?')}")
-    print(f"駆動速度(pps): {sta.query('AXIs1:Fspeed0?')}")
-    logging.info(f"Drive speed (pps): {sta.query('AXIs1:Fspeed0?')}")
+    for label, value in params.table():
+        print(f"{label}: {value}")
+        logging.info(f"{label}: {value}")
     print('-----------------------------------------------------------')
-    time.sleep(1)
     script_directory = os.path.dirname(os.path.abspath(__file__))    # スクリプトのディレクトリの絶対パスを取得
     config_file_path = os.path.join(script_directory, 'config.ini') # config.ini ファイルへの完全なパスを構築
     config = configparser.ConfigParser() # iniファイルの読み込み
@@ -63,22 +73,21 @@ def instrument_initialized():
 
     #!!!!!!!!!!!!!!!!!!!!!!!!後で消去!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
     #原点復帰
-    sta.write("AXIs1:Fspeed0 1000")#駆動速度を1000pps設定
-    FSpeed=sta.query('AXIs1:Fspeed0?')
+    params.set('speed', 1000)#駆動速度を1000pps設定
+    FSpeed=params['speed']
     position=sta.query('AXIs1:POSition?') #現在位置を取得
     print(f"現在位置(pulse): {position}")
     print(">>原点復帰中...")
-    time_to_zero=int(int(position)/int(FSpeed)+1)
-    sta.write('AXIs1:Go ORG') #原点復帰
-    time.sleep(time_to_zero)
+    duration = stage.home() #原点復帰
+    logging.info(f"Homing time: {duration:.3f} s")
     position=sta.query('AXIs1:POSition?') #現在位置を取得
     print(f"現在位置(pulse): {position}")
 
     print("+1000 pulse")
-    sta.write("AXIs1:Fspeed0 5000")#駆動速度を設定
-    FSpeed=sta.query('AXIs1:Fspeed0?')
-    sta.write('AXIs1:PULS 1000:GO 0')#ステージを+1000pulseに移動
-    time.sleep(int(1000/int(FSpeed))+1)
+    params.set('speed', 5000)#駆動速度を設定
+    FSpeed=params['speed']
+    duration = stage.move_pulses(1000)#ステージを+1000pulseに移動
+    logging.info(f"Move time (+1000 pulse): {duration:.3f} s")
     position=sta.query('AXIs1:POSition?') #現在位置を取得
     print(f">>現在位置(pulse): {position}")
 
@@ -118,64 +127,16 @@ def setup_logging():
     if not os.path.exists(output_folder_path):
         os.makedirs(output_folder_path)
 
-# JSONファイルから変数の値を読み込む
-def load_config_from_json():
-    # JSONファイルの保存先ディレクトリを指定
-    save_dir = os.path.join(os.path.dirname(__file__), 'int')
-    json_file_path = os.path.join(save_dir, "config.json")
-    
-    # JSONファイルから変数の値を読み込む
-    logging.info("Get the value of a variable from a JSON file.")
-    global start_button_coordinates, profile0_coordinates, profile0_coordinates2, profile0_coordinates3, profile1_coordinates, profile1_coordinates2, profile1_coordinates3
-    if os.path.exists(json_file_path):
-        with open(json_file_path, "r") as json_file:
-            data = json.load(json_file)
-            start_button_coordinates = tuple(data["start_button_coordinates"])
-            print(start_button_coordinates)
-            profile0_coordinates = tuple(data["profile0_coordinates"])
-            print(profile0_coordinates)
-            profile1_coordinates = tuple(data["profile1_coordinates"])
-            print(profile1_coordinates)
-            # Calculate the other coordinates based on the loaded values
-            x, y = profile0_coordinates
-            profile0_coordinates2 = (x, y + 30)
-            profile0_coordinates3 = (x, y + 45)
-
-            x, y = profile1_coordinates
-            profile1_coordinates2 = (x, y + 30)
-            profile1_coordinates3 = (x, y + 45)
-        return start_button_coordinates, profile0_coordinates, profile1_coordinates
-
-# 各座標の登録
-def set_coordinates(target):
-    logging.info("Coordinate registration")
-    global start_button_coordinates, profile0_coordinates, profile0_coordinates2, profile0_coordinates3, profile1_coordinates, profile1_coordinates2, profile1_coordinates3
-
-    x = int(input(f"Enter X coordinate for {target}: "))
-    y = int(input(f"Enter Y coordinate for {target}: "))
-
-    if target == 'start':
-        global start_button_coordinates
-        start_button_coordinates = (x, y)
-        logging.info(f"start_button_coordinates: {str(start_button_coordinates)}")   
-    
-    elif target == 'profile0':
-        global profile0_coordinates, profile0_coordinates2, profile0_coordinates3
-        profile0_coordinates = (x, y)
-        profile0_coordinates2 = (x, y + 30)
-        profile0_coordinates3 = (x, y + 45)
-        logging.info(f"profile0_coordinates: {str(profile0_coordinates)}")
-        logging.info(f"profile0_coordinates2: {str(profile0_coordinates2)}")
-        logging.info(f"profile0_coordinates3: {str(profile0_coordinates3)}")
-
-    elif target == 'profile1':
-        global profile1_coordinates, profile1_coordinates2, profile1_coordinates3
-        profile1_coordinates = (x, y)
-        profile1_coordinates2 = (x, y + 30)
-        profile1_coordinates3 = (x, y + 45)
-        logging.info(f"profile1_coordinates: {str(profile1_coordinates)}")
-        logging.info(f"profile1_coordinates2: {str(profile1_coordinates2)}")
-        logging.info(f"profile1_coordinates3: {str(profile1_coordinates3)}")
+# 分光器の初期化
+def init_spectrometers(expoduretime, integration):
+    global specs
+    print(">>   Connecting to spectrometers...")
+    logging.info("Connecting to spectrometers...")
+    specs = spectrometer_backend.open_spectrometers(2, simulate=SIMULATE)  # [Profile0(Sample), Profile1(Reference)]
+    for spec in specs:
+        spec.configure(exposure_ms=expoduretime, scans=integration)
+        print(f">>   {spec.name}: {len(spec.wavelengths())} pixels")
+        logging.info(f"Spectrometer {spec.name}: exposure={expoduretime} ms, integration={integration}")
 
 #シャッター
 def shutter_rotation(ser, angle):
@@ -191,163 +152,174 @@ def shutter_rotation(ser, angle):
     time_rotation = int(abs(angle) / 5000) + 0.5
     time.sleep(time_rotation)
 
-#測定
-def start_measurement(loop_count, acquisitiontime):
-    global excel_data, delta_Abs_data
-
-    # 現在の日時を取得
+# 解析 (ワーカースレッド): 生スペクトルの列の作成とΔAbsの計算
+def analyze_point(i, raw):
+    position, position_to_time, (wl_sam, sam_excited, wl_ref, ref_excited, sam, ref) = raw
+
+    # ポンプ光あり・なしのデータ (シートの列)
+    raw_columns = [(f'I_Sam_Ex_{position}', wl_sam, sam_excited),
+                   (f'I_Ref_Ex_{position}', wl_ref, ref_excited),
+                   (f'I_Sam_{position}', wl_sam, sam),
+                   (f'I_Ref_{position}', wl_ref, ref)]
+
+    # delta_Absの計算
+    delta_Abs = np.log(sam * ref_excited / (ref * sam_excited))
+    return position, position_to_time, raw_columns, wl_ref, delta_Abs
+
+# 解析結果をブック用の配列に書き込む
+def add_to_workbook(writer, i, result):
+    position, position_to_time, raw_columns, wl_ref, delta_Abs = result
+    writer.append(i, position_to_time, wl_ref, delta_Abs,
+                  sheet=f'{position}_{position_to_time}ps', raw=raw_columns)
+
+# 積算回数分の組がそろわなかった取得を画面とログに出す (足りない分は平均に入っていない)
+def check_averaged(engine, integration, label):
+    if engine.averaged < integration:
+        print(f"!! {label}: sig/ref の組が {engine.averaged}/{integration} 回分しかそろいませんでした")
+        logging.warning(f"{label}: averaged {engine.averaged}/{integration} sig/ref pairs (unpaired frames: {engine.unpaired})")
+
+# 測定計画を書いたジャーナルを作る (各点のステップ幅は config.ini から)
+def new_journal(loop_count, expoduretime, integration):
     current_datetime = datetime.datetime.now().strftime('%Y%m%d%H%M%S')
-    logging.info(f"Measurement start time: {current_datetime}")
+    plan = {
+        'started': current_datetime,
+        'loop_count': loop_count,
+        'stepsizes': [int(config.get('PulseSettings', f'Loop_{i+1}_stepsize')) for i in range(loop_count)],
+        'exposure_ms': expoduretime,
+        'integration': integration,
+        'workbook': os.path.join(output_folder_path, f'{current_datetime}_TA.xlsx'),
+    }
+    journal_path = os.path.join(output_folder_path, f'{current_datetime}_TA.tasj')
+    logging.info(f"Journal: {journal_path}")
+    return measurement_journal.Journal.create(journal_path, plan)
 
-    # excel_dataとdelta_Abs_dataの初期化
+#測定
+def start_measurement(journal):
+    plan = journal.plan
+    loop_count = plan['loop_count']
+    stepsizes = plan['stepsizes']
+    logging.info(f"Measurement start time: {plan['started']}")
 
-    delta_Abs_data = pd.DataFrame()
-    
     #ここから測定時間の計測開始
     start = time.time()
-    with pd.ExcelWriter(os.path.join(output_folder_path, f'{current_datetime}_TA.xlsx'), engine='xlsxwriter') as writer:
-        for i in range(loop_count):
-
-            excel_data = pd.DataFrame([])  # データフレームを空にする
-            position = sta.query('AXIs1:POSition?')
-            position_to_time = round(int(position) / 15 * 0.1, 2)
-            print("----------------------------------------")
-            print(f">>POSITION:{str(position)} Pulse")
-            print(f">>TIME:{str(position_to_time)} ps")
-            logging.info(f"loop count: {i+1}")
-            logging.info(f"Measurement position(pulse): {position}")
-            pyautogui.click(*start_button_coordinates)
-
-            # ----------------------ポンプ光ありの測定----------------------------
-            print("Measuring with pumping ...")
-            #logging.info("Measuring with pumping ..")
-            clipboard.copy("")
-            time.sleep(acquisitiontime / 1000 + 0.2)
-            # --------------INTERVAL = DataGet + ShutterCLOSE -------------------
-            pyautogui.click(*profile0_coordinates)
-            time.sleep(0.1)
-            pyautogui.click(*profile0_coordinates2)
-            time.sleep(0.1)
-            pyautogui.click(*profile0_coordinates3)
-            time.sleep(0.1)
-            Data_Profile0_excited = clipboard.paste()
-            print("Get Data_Profile0_excited")
-            #print(f"-----Profile0[Loop {i+1}]-----\n{Data_Profile0_excited}")
-
-            clipboard.copy("")
-            pyautogui.click(*profile1_coordinates)
-            time.sleep(0.1)
-            pyautogui.click(*profile1_coordinates2)
-            time.sleep(0.1)
-            pyautogui.click(*profile1_coordinates3)
-            time.sleep(0.1)
-            Data_Profile1_excited = clipboard.paste()
-            print("GET Data_Profile1_excited")
-            #print(f"-----Profile1[Loop {i+1}]-----\n{Data_Profile1_excited}")
-            #logging.info("Measured with pumping!")
-
-            shutter_rotation(ser, 18000)  # Shutterを閉じる
-            print("Shutter CLOSED.")
-            #logging.info("Shutters closed.")
-            # ----------------------ポンプ光なしの測定---------------------------
-            pyautogui.click(*start_button_coordinates)
-            print("Measuring withOUT pumping ...")
-            #logging.info("Measuring withOUT pumping ...")
-            clipboard.copy("")
-            time.sleep(acquisitiontime / 1000 + 0.2)
-            # --------------INTERVAL = DataGet + ShutterOPEN ----------------
-            pyautogui.click(*profile0_coordinates)
-            time.sleep(0.1)
-            pyautogui.click(*profile0_coordinates2)
-            time.sleep(0.1)
-            pyautogui.click(*profile0_coordinates3)
-            time.sleep(0.1)
-            Data_Profile0 = clipboard.paste()
-            print("GER Data_Profile0")
-            #print(f"-----Profile0[Loop {i+1}]-----\n{Data_Profile0}")
-
-            clipboard.copy("")
-            pyautogui.click(*profile1_coordinates)
-            time.sleep(0.1)
-            pyautogui.click(*profile1_coordinates2)
-            time.sleep(0.1)
-            pyautogui.click(*profile1_coordinates3)
-            time.sleep(0.1)
-            Data_Profile1 = clipboard.paste()
-            print("GET Data_Profile1")
-            #logging.info("Measured withOUT pumping ...")
-
-            #print(f"-----Profile1[Loop {i+1}]-----\n{Data_Profile1}")
-
-            shutter_rotation(ser, -18000)  # Shutterを開ける
-            print("Shutters  OPENED.")
-            #logging.info("Shutters  opened.")
-
-            # ---------------INTERVAL= STAGE移動-------------------------------------------
-
-            # ポンプ光ありのデータをデータフレームに追加
-            df_excited = pd.read_csv(io.StringIO(Data_Profile0_excited), sep='\t', header=None,
-                                     names=['Wavelength/nm', f'I_Sam_Ex_{position}'])
-            excel_data = pd.concat([excel_data, df_excited.set_index('Wavelength/nm')], axis=1, sort=False)
-
-            df_excited = pd.read_csv(io.StringIO(Data_Profile1_excited), sep='\t', header=None,
-                                     names=['Wavelength/nm', f'I_Ref_Ex_{position}'])
-            excel_data = pd.concat([excel_data, df_excited.set_index('Wavelength/nm')], axis=1, sort=False)
-
-            # ポンプ光なしのデータをデータフレームに追加
-            df_normal = pd.read_csv(io.StringIO(Data_Profile0), sep='\t', header=None,
-                                    names=['Wavelength/nm', f'I_Sam_{position}'])
-            excel_data = pd.concat([excel_data, df_normal.set_index('Wavelength/nm')], axis=1, sort=False)
-
-            df_normal = pd.read_csv(io.StringIO(Data_Profile1), sep='\t', header=None,
-                                    names=['Wavelength/nm', f'I_Ref_{position}'])
-            excel_data = pd.concat([excel_data, df_normal.set_index('Wavelength/nm')], axis=1, sort=False)
-
-            # delta_Absの計算
-            profile1 = np.loadtxt(io.StringIO(Data_Profile1), delimiter='\t')
-            profile1_excited = np.loadtxt(io.StringIO(Data_Profile1_excited), delimiter='\t')
-            profile0 = np.loadtxt(io.StringIO(Data_Profile0), delimiter='\t')
-            profile0_excited = np.loadtxt(io.StringIO(Data_Profile0_excited), delimiter='\t')   
-            delta_Abs = np.log(profile0[:, 1] * profile1_excited[:, 1] / (profile1[:, 1] * profile0_excited[:, 1]))
-
-            # delta_Absを新しいデータフレームに追加
-            delta_Abs_df = pd.DataFrame({'Wavelength/nm': profile1[:, 0], f'{position_to_time}': delta_Abs})
-            delta_Abs_data = pd.concat([delta_Abs_data, delta_Abs_df.set_index('Wavelength/nm')], axis=1, sort=False)
-
-
-            # エクセルファイルに保存
+    profiler = phase_profiler.PhaseProfiler()  # 区間ごとの時間 (TA_LOG に記録)
+    phase = profiler.phase
+    engine = paired_acquisition.PairedAcquisition(specs)  # 2台の分光器をそろえて取得する (常駐スレッド)
+    # ΔAbs は点ごとに 1 列ずつ追加し、エクセルファイルは最後に 1 回だけ書き出す
+    # 途中で例外が出ても、抜けるときに取得スレッド (engine) を止めてから分光器を閉じる
+    with specs[0], specs[1], engine, journal, run_writer.RunWriter(plan['workbook'], loop_count) as writer:
+
+        # 解析 (ワーカースレッド): ジャーナル用に生データも渡す
+        def analyze(i, raw):
+            with phase('analyze', i):
+                result = raw, analyze_point(i, raw)
+            profiler.log_point(i)
+            return result
+
+        # 保存 (保存用スレッド, 測定順): 先にジャーナルへ書き込み (fsync), それからブック用の配列へ
+        def persist_point(i, item):
+            (position, position_to_time, channels), result = item
+            with phase('journal', i):
+                journal.append_point(i, position, position_to_time, channels)
+            with phase('workbook', i):
+                add_to_workbook(writer, i, result)
+            logging.info(f"Saved loop {i+1}")
+            profiler.log_point(i)
+
+        # 再開のとき: 測定済みの点をブックに入れ、次の点の位置へステージを動かす
+        first = journal.next_index()
+        for i in journal.completed():
+            point = journal.points[i]
+            add_to_workbook(writer, i, analyze_point(i, (point.position, point.position_to_time, point.channels)))
+        if 0 < first < loop_count:
+            last = journal.points[first - 1]
+            target = last.position + stepsizes[first - 1]
+            print(f">>{first} 点は測定済みです。{target} pulse から再開します")
+            logging.info(f"Resume from loop {first + 1}, target position(pulse): {target}")
+            stage.start_move(target - int(sta.query('AXIs1:POSition?')))
+
+        # 解析と保存は測定と並行して行い、測定ループは取得が終わったらすぐ次の点へ進む
+        with measurement_pipeline.MeasurementPipeline(analyze, persist_point) as pipeline:
+            for i in range(first, loop_count):
+
+                # 前の点で始めたステージ移動の完了を待つ (止まったらすぐ次へ)
+                with phase('stage_wait', i):
+                    logging.info(f"Stage move time: {stage.wait():.3f} s")
+                with phase('position', i):
+                    position = sta.query('AXIs1:POSition?')
+                position_to_time = round(int(position) / 15 * 0.1, 2)
+                print("----------------------------------------")
+                print(f">>POSITION:{str(position)} Pulse")
+                print(f">>TIME:{str(position_to_time)} ps")
+                logging.info(f"loop count: {i+1}")
+                logging.info(f"Measurement position(pulse): {position}")
+
+                # ----------------------ポンプ光ありの測定----------------------------
+                print("Measuring with pumping ...")
+                #logging.info("Measuring with pumping ..")
+                with phase('acquire_pumped', i):
+                    (wl_sam, sam_excited), (wl_ref, ref_excited) = engine.acquire()
+                check_averaged(engine, plan['integration'], f"loop {i+1} pumped")
+                print("Get Data_Profile0_excited, Data_Profile1_excited")
+
+                with phase('shutter_close', i):
+                    shutter_rotation(ser, 18000)  # Shutterを閉じる
+                print("Shutter CLOSED.")
+                #logging.info("Shutters closed.")
+                # ----------------------ポンプ光なしの測定---------------------------
+                print("Measuring withOUT pumping ...")
+                #logging.info("Measuring withOUT pumping ...")
+                with phase('acquire_unpumped', i):
+                    (_, sam), (_, ref) = engine.acquire()
+                check_averaged(engine, plan['integration'], f"loop {i+1} unpumped")
+                print("GET Data_Profile0, Data_Profile1")
+                #logging.info("Measured withOUT pumping ...")
+
+                # ---------------INTERVAL= STAGE移動-------------------------------------------
+                # 取得が終わったらすぐにステージを動かす (シャッターを開ける間も移動する)
+                with phase('stage_start', i):
+                    stage.start_move(stepsizes[i])
+                print(f"Stage Moving...")
+
+                # 解析と保存はワーカースレッドへ (待ちがいっぱいのときはここで待つ)
+                with phase('submit', i):
+                    pipeline.submit(i, (position, position_to_time, (wl_sam, sam_excited, wl_ref, ref_excited, sam, ref)))
+
+                with phase('shutter_open', i):
+                    shutter_rotation(ser, -18000)  # Shutterを開ける
+                print("Shutters  OPENED.")
+                #logging.info("Shutters  opened.")
+
+                # グラフの作成(OPTIONAL)
+                graph_timing=int(i+1)
+                # ループ数が1５の倍数の場合にグラフ化
+                if (graph_timing % 15 == 0) and (graph_timing >= 80):
+                    with phase('plot', i):
+                        # ここまでの点の保存を待ってから、最新の15個のデータを取得
+                        pipeline.drain()
+                        wavelength, recent_data, labels = writer.recent(15)
+
+                        # グラフの作成
+                        plt.figure(figsize=(10, 6))
+                        for col, label in enumerate(labels):
+                            plt.plot(wavelength, recent_data[:, col], label=label)
+
+                        plt.xlabel('Wavelength/nm')
+                        plt.ylabel('Delta Abs')
+                        plt.title('Recent Delta Abs Data')
+                        plt.legend()
+                        plt.grid(True)
+                        plt.show()
+                profiler.log_point(i)
+
+            with phase('stage_wait'):
+                stage.wait()  # 最後の移動の完了を待つ
             print("Save to Excel file")
-            print(f"Stage Moving...")
-            #logging.info("Save to Excel file\n")
-            delta_Abs_data.reset_index().to_excel(writer, sheet_name='delta ABS', index=False)
-            excel_data.reset_index().to_excel(writer, sheet_name=f'{position}_{position_to_time}ps', index=False)
-            
-            # グラフの作成(OPTIONAL)
-            graph_timing=int(i+1)
-            # ループ数が1５の倍数の場合にグラフ化
-            if (graph_timing % 15 == 0) and (graph_timing >= 80):
-                # 最新の５つのデータを取得
-                recent_data = delta_Abs_data.iloc[:, -15:]
-
-                # グラフの作成
-                plt.figure(figsize=(10, 6))
-                for col in recent_data.columns:
-                    plt.plot(recent_data.index, recent_data[col], label=col)
-
-                plt.xlabel('Wavelength/nm')
-                plt.ylabel('Delta Abs')
-                plt.title('Recent Delta Abs Data')
-                plt.legend()
-                plt.grid(True)
-                plt.show()
-
-            #ステージ移動
-            stepsize = int(config.get('PulseSettings', f'Loop_{i+1}_stepsize'))
-            sta.write(f'AXIs1:PULS {stepsize}:GO 0')
-            #logging.info(f"STAGE in operation...")
-            time.sleep(stepsize/int(FSpeed)+1)
+        journal.finish({'elapsed_s': time.time() - start})
+
+    if engine.unpaired:
+        logging.info(f"Unpaired frames (sig/ref): {engine.unpaired}")
 
-    
     #測定時間の計測終了
     elapsed_time = time.time() - start
 
@@ -355,6 +327,9 @@ def start_measurement(loop_count, acquisitiontime):
     m, s = divmod(elapsed_time, 60)
     h, m = divmod(m, 60)
     logging.info(f"Measurement time:{h:.0f}h {m:.0f} min {s:.0f} sec")
+    profiler.log_summary()  # 区間ごとの時間のまとめ
+    # フレーム間隔・sig/ref のずれ・コマンドの往復時間のヒストグラムを TA_LOG へ
+    telemetry.default().dump(os.path.join(os.path.dirname(__file__), 'TA_LOG'))
     logging.info(f"Normal Termination")# main関数とプログラムの実行部分
     print("\n")
     print("----------------------------------------")
@@ -373,56 +348,39 @@ def main():
     # ログの設定
     setup_logging()
 
-    # 装置の初期化
-    #instrument_initialized()
-    #input("装置の設定がよければ'Enter'を押してください。")
+    # 終わっている測定は再開しない (END を重ねて書いたり、ブックを書き直したりしない)
+    if RESUME_PATH is not None:
+        plan, points, finished, _ = measurement_journal.Journal.read(RESUME_PATH)
+        if finished is not None:
+            print(f">>{RESUME_PATH} の測定は終わっています ({len(points)}/{plan['loop_count']} 点)。ブック: {plan['workbook']}")
+            logging.info(f"Resume journal already finished: {RESUME_PATH}")
+            input("終了するには'Enter'を押してください。")
+            return
+
+    # 装置の初期化 (新規・再開どちらも)
+    # シャッターとステージを開き、原点復帰して位置を -150 に合わせる (再開位置もこの座標で決める)
+    instrument_initialized()
+    input("装置の設定がよければ'Enter'を押してください。")
 
     # WindowSpyの起動
     #file_path = r'C:\Users\USER\Desktop\Laser_Program\03_TA\Measurement\operation_test\WindowSpy.ahk'
     #subprocess.Popen(file_path, shell=True)
 
-    # jsonファイルの読み込み
-    load_config_from_json()
-
-    # ターゲットの座標を設定
-    while True:
-        command = input("Enter a target (start, profile0, profile1), and then, command 'check'")
-        if command == 'exit':
-            break
-        elif command == 'check':
-            print(f"StartButton coordinates: {start_button_coordinates}")
-            print(f"Profile0 coordinates: {profile0_coordinates}")
-            print(f"Profile1 coordinates: {profile1_coordinates}")
-            change_coords = input("Do you want to change the coordinates? (Yes/No): ")
-            if change_coords.lower() == 'yes':
-                target_to_change = input("Enter the target you want to change (Start, Profile0, Profile1): ")
-                if target_to_change in ['start', 'profile0', 'profile1']:
-                    set_coordinates(target_to_change)
-                else:
-                    print("Invalid target. Please enter 'Start', 'Profile0', or 'Profile1'.")
-            else:
-                break
-        elif command in ['start', 'profile0', 'profile1']:
-            set_coordinates(command)
-        else:
-            print("Invalid target. Please enter 'start', 'profile0', 'profile1', or 'check'.")
-
-    data = {                                                   
-        "start_button_coordinates": start_button_coordinates,
-        "profile0_coordinates": profile0_coordinates,
-        "profile1_coordinates": profile1_coordinates
-        }
-    save_dir = os.path.join(os.path.dirname(__file__), 'int') # dataをJSONファイルに保存
-    json_file_path = os.path.join(save_dir, "config.json")
-    os.makedirs(save_dir, exist_ok=True)
-    with open(json_file_path, "w") as json_file:
-        json.dump(data, json_file)
+    # 止まった測定の再開 (測定条件はジャーナルの測定計画から読む)
+    if RESUME_PATH is not None:
+        journal = measurement_journal.Journal.open(RESUME_PATH)
+        print(f">>再開: {RESUME_PATH} ({len(journal.points)}/{plan['loop_count']} 点測定済み)")
+        logging.info(f"Resume journal: {RESUME_PATH}")
+        init_spectrometers(plan['exposure_ms'], plan['integration'])
+        input("測定を再開するには'Enter'を押してください。")
+        start_measurement(journal)
+        input("終了するには'Enter'を押してください。")
+        return
 
     #測定条件の設定（露光時間と積算回数）
     while True:
         expoduretime = float(input("Enter Expodure time (in milliseconds): "))
-        integration = float(input("Enter integration: "))
-        acquisitiontime = expoduretime * integration
+        integration = int(input("Enter integration: "))
         user_input = input("ループ回数(): ").strip()
         try:
             loop_count = int(user_input)
@@ -433,11 +391,14 @@ def main():
         except ValueError:
             print("０以上の値を入力してください")
 
+    # 分光器の初期化 (露光時間と積算回数を設定)
+    init_spectrometers(expoduretime, integration)
+
     #測定開始
     while True:
         user_input = input("測定の準備ができたら'start'と入力してください: ").strip().lower()
         if user_input == "start":
-            start_measurement(loop_count, acquisitiontime)
+            start_measurement(new_journal(loop_count, expoduretime, integration))
             break
         else:
             print("有効な文字列を入力してください (start).")